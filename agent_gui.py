@@ -1,16 +1,26 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk, scrolledtext
 import webbrowser
+import difflib
 import json
 import os
-import shutil
 import subprocess
 
 import threading
+import time
 import queue
 from datetime import datetime
 import sys
 
+import config_store
+import key_health
+import log_store
+import model_bench
+import pipe_mux
+import providers
+import supervisor
+import task_pool
+
 # Configuration Paths
 USER_PROFILE = os.environ.get('USERPROFILE')
 OPENCLAW_CONFIG_PATH = os.path.join(USER_PROFILE, '.openclaw', 'openclaw.json')
@@ -21,6 +31,35 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 VENV_PYTHON = os.path.join(CURRENT_DIR, '.venv', 'Scripts', 'python.exe')
 BRIDGE_SCRIPT = os.path.join(CURRENT_DIR, 'bridge_server.py')
 
+# Chat tab: UI refresh interval while replies stream in, and turns of context sent per agent
+CHAT_TICK_MS = 50
+CHAT_HISTORY_MESSAGES = 20
+
+# Network calls from the GUI (chat, key tests) run on a small bounded pool
+NET_WORKERS = 4
+NET_MAX_PENDING = 16
+CHAT_TIMEOUT = 300  # seconds for a whole chat reply; the Stop button ends it sooner
+KEY_TEST_TIMEOUT = 10
+KEY_HEALTH_TTL = 300  # seconds a "Check All Keys" result is reused before probing again
+
+# Bridge Control log pane: lines kept in the widget, lines rendered per tick
+LOG_MAX_LINES = int(os.environ.get("OPENCLAW_GUI_LOG_LINES", 5000))
+LOG_BATCH_LINES = 500
+LOG_TICK_MS = 50
+LOG_WAKE_MAX_MS = 1000  # idle poll interval cap where Tk cannot watch a wake pipe (Windows)
+LOG_PAGE_LINES = 200  # lines shown per page when browsing the log files
+LOG_INDEX_BUDGET = 8 * 1024 * 1024  # bytes indexed per tick when opening a big log
+LOG_LEVEL_CHOICES = {"All": 0, "INFO+": 20, "WARNING+": 30, "ERROR+": 40}
+
+# Bridge supervisor: crashed bridges restart after 2, 4, 8... seconds (capped)
+SUPERVISOR_POLL_MS = 1000
+RESTART_BACKOFF_BASE = 2.0
+RESTART_BACKOFF_MAX = 120.0
+
+# Config writes: rapid edits (adding/removing bots) are written once, this long after the last one
+SAVE_DEBOUNCE_MS = 500
+CONFIG_POLL_MS = 1000  # how often the config files are checked for edits by other programs
+
 class AgentConfigApp:
     def __init__(self, root):
         self.root = root
@@ -32,15 +71,56 @@ class AgentConfigApp:
         self.auth_data = {}
         
         # Bridge State
-        self.bridge_processes = {} # Map bot_name -> subprocess
+        # bot_name -> supervised bridge process (restarted with backoff if it crashes)
+        self.supervisor = supervisor.Supervisor(on_start=self._on_bridge_started,
+                                                backoff_base=RESTART_BACKOFF_BASE, backoff_max=RESTART_BACKOFF_MAX)
+        self._proc_sort = ("bot", False)
         self.log_queue = queue.Queue()
+        # Every bot's output also goes to its own rotating file under logs/
+        self.log_store = log_store.LogStore()
+        self.log_reader = None
+        self._log_view = (0, 0)  # first/last line numbers shown while browsing
+        self._log_hit = None
+        # One thread relays the stdout/stderr of every bridge into the log files and log_queue
+        self.pipe_mux = pipe_mux.PipeMux(self._log_put_many)
         # self.is_bridge_running = False # Deprecated
 
+        # Network calls (chat, key tests) never run on the Tk thread
+        self.net_pool = task_pool.TaskPool(workers=NET_WORKERS, max_pending=NET_MAX_PENDING)
+        self.key_health = key_health.KeyHealth(ttl=KEY_HEALTH_TTL, timeout=KEY_TEST_TIMEOUT)
+        self.key_health_win = None
+
+        # Atomic, debounced writes of both config files; replaced versions go to the backup store
+        self.backups = config_store.BackupStore(BACKUP_DIR)
+        self.saver = config_store.ConfigSaver(
+            self.backups, delay=SAVE_DEBOUNCE_MS / 1000.0,
+            schedule=lambda seconds, fn: self.root.after(int(seconds * 1000), fn),
+            cancel=self.root.after_cancel,
+            on_error=lambda path, e: messagebox.showerror("Save Error", f"Could not save {path}: {e}"),
+            before_flush=self._check_config_files, on_saved=self._on_config_saved)
+        # Edits by add-agent.js & co. are merged in; _disk_base is the last version seen on disk
+        self.config_watcher = config_store.FileWatcher([OPENCLAW_CONFIG_PATH, AUTH_PROFILES_PATH])
+        self._disk_base = {}
+
         self.setup_ui()
         self.load_data()
         
-        # Start checking for logs
+        # Producers (pipe readers, pool workers) only set _log_wake; Tk is touched from its own thread
+        self._log_wake = threading.Event()
+        self._log_after = None
+        self._log_wake_r = self._log_wake_w = None
+        self._log_wake_ms = LOG_TICK_MS
         self.check_log_queue()
+        if not self._open_log_wake_pipe():
+            self._poll_log_wake()
+        try:
+            if self.backups.import_legacy():  # openclaw_<timestamp>.json copies from older versions
+                self.backups.prune()
+        except OSError as e:
+            self.log_message(f"Could not import old backups: {e}")
+        self._poll_bridges()
+        self._poll_net_tasks()
+        self._poll_config_files()
 
     def setup_ui(self):
         # Create Notebook (Tabs)
@@ -260,6 +340,7 @@ class AgentConfigApp:
         
         tk.Entry(key_frame, textvariable=self.apikey_var, width=40, show="*").pack(side=tk.LEFT, padx=5)
         tk.Button(key_frame, text="Test Key ✅", command=self.test_api_key).pack(side=tk.LEFT, padx=5)
+        tk.Button(key_frame, text="Check All Keys 🩺", command=self.open_key_health).pack(side=tk.LEFT)
 
         # Set default provider
         self.provider_combo.current(0)
@@ -328,93 +409,254 @@ class AgentConfigApp:
 
         provider_id = getattr(self, '_current_provider_id', 'google')
 
-        # ── Google / Gemini ───────────────────────────────────────
-        if provider_id == "google":
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=key)
-                list(genai.list_models(page_size=1))
-                messagebox.showinfo("✅ Thành công", "API Key hợp lệ!\nĐã kết nối Google Gemini.")
-            except ImportError:
-                messagebox.showerror("Lỗi", "Thiếu thư viện google-generativeai.\nChạy: pip install google-generativeai")
-            except Exception as e:
-                messagebox.showerror("❌ Lỗi API Key", f"Kết nối thất bại!\n\n{e}")
-
-        # ── Groq ──────────────────────────────────────────────────
-        elif provider_id == "groq":
-            try:
-                import urllib.request, urllib.error, json as _json
-                req = urllib.request.Request(
-                    "https://api.groq.com/openai/v1/models",
-                    headers={
-                        "Authorization": f"Bearer {key}",
-                        "Content-Type": "application/json",
-                        "Accept": "application/json",
-                        "User-Agent": "Mozilla/5.0",
-                    }
-                )
-                with urllib.request.urlopen(req, timeout=10) as r:
-                    data = _json.loads(r.read())
-                count = len(data.get("data", []))
-                messagebox.showinfo("✅ Thành công", f"Groq API Key hợp lệ!\n{count} models khả dụng.")
-            except urllib.error.HTTPError as e:
-                if e.code == 401:
-                    messagebox.showerror("❌ Key Sai", "Key không hợp lệ (401 Unauthorized).\nKiểm tra lại key tại console.groq.com/keys")
-                else:
-                    messagebox.showerror("❌ Lỗi Groq Key", f"HTTP {e.code}: {e.reason}")
-            except Exception as e:
-                messagebox.showerror("❌ Lỗi Groq Key", f"Kết nối thất bại!\n\n{e}")
-
-        # ── OpenRouter ────────────────────────────────────────────
-        elif provider_id == "openrouter":
-            try:
-                import urllib.request, urllib.error, json as _json
-                req = urllib.request.Request(
-                    "https://openrouter.ai/api/v1/auth/key",
-                    headers={
-                        "Authorization": f"Bearer {key}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "https://github.com",
-                        "User-Agent": "Mozilla/5.0",
-                    }
-                )
-                with urllib.request.urlopen(req, timeout=10) as r:
-                    data = _json.loads(r.read())
-                label = data.get("data", {}).get("label", "unknown")
-                messagebox.showinfo("✅ Thành công", f"OpenRouter API Key hợp lệ!\nAccount: {label}")
-            except urllib.error.HTTPError as e:
-                if e.code == 401:
-                    messagebox.showerror("❌ Key Sai", "Key không hợp lệ (401 Unauthorized).\nKiểm tra lại key tại openrouter.ai/keys")
-                else:
-                    messagebox.showerror("❌ Lỗi OpenRouter Key", f"HTTP {e.code}: {e.reason}")
-            except Exception as e:
-                messagebox.showerror("❌ Lỗi OpenRouter Key", f"Kết nối thất bại!\n\n{e}")
-
+        # ── Provider có endpoint kiểm tra key: gọi API thật (chạy nền, không đóng băng UI) ──
+        if provider_id in providers.KEY_CHECK_ENDPOINTS:
+            task = self.net_pool.submit(
+                lambda token, p, k: providers.check_key(p, k, timeout=KEY_TEST_TIMEOUT),
+                provider_id, key, name=f"key:{provider_id}", group="keys",
+                timeout=KEY_TEST_TIMEOUT + 5, on_done=self._on_key_tested,
+            )
+            if task is None:
+                messagebox.showwarning("Đang bận", "Có quá nhiều yêu cầu mạng đang chờ, hãy thử lại sau.")
+            return
 
         # ── Các provider khác: kiểm tra format ───────────────────
+        prefix_map = {
+            "huggingface": "hf_",
+        }
+        expected = prefix_map.get(provider_id, "")
+        if expected and not key.startswith(expected):
+            messagebox.showwarning(
+                "⚠ Format Key Sai",
+                f"Key {provider_id.title()} thường bắt đầu bằng '{expected}'\n"
+                f"Key bạn nhập: {key[:8]}...\n\nVẫn lưu được, nhưng hãy kiểm tra lại."
+            )
         else:
-            prefix_map = {
-                "openai": "sk-",
-                "anthropic": "sk-ant-",
-                "deepseek": "sk-",
-                "mistral": "",
-                "xai": "xai-",
-                "huggingface": "hf_",
-            }
-            expected = prefix_map.get(provider_id, "")
-            if expected and not key.startswith(expected):
-                messagebox.showwarning(
-                    "⚠ Format Key Sai",
-                    f"Key {provider_id.title()} thường bắt đầu bằng '{expected}'\n"
-                    f"Key bạn nhập: {key[:8]}...\n\nVẫn lưu được, nhưng hãy kiểm tra lại."
-                )
+            messagebox.showinfo(
+                "✅ Format OK",
+                f"Format key {provider_id.title()} có vẻ đúng.\n"
+                f"(Không thể test trực tiếp — cần gọi API thực tế)"
+            )
+
+    def _on_key_tested(self, task, check, error):
+        """Kết quả Test Key (UI thread)."""
+        provider_id = task.name.split(":", 1)[1]
+        label = {"google": "Google Gemini", "groq": "Groq", "openrouter": "OpenRouter", "openai": "OpenAI",
+                 "anthropic": "Anthropic", "deepseek": "DeepSeek", "mistral": "Mistral", "xai": "xAI"}[provider_id]
+        key_pages = {"groq": "console.groq.com/keys", "openrouter": "openrouter.ai/keys",
+                     "openai": "platform.openai.com/api-keys", "anthropic": "console.anthropic.com/settings/keys",
+                     "deepseek": "platform.deepseek.com/api_keys", "mistral": "console.mistral.ai/api-keys",
+                     "xai": "console.x.ai"}
+        if error is None:
+            if provider_id in ("google", "anthropic"):
+                messagebox.showinfo("✅ Thành công", f"API Key hợp lệ!\nĐã kết nối {label}.")
+            elif provider_id == "openrouter":
+                account = (check.data.get("data") or {}).get("label", "unknown")
+                messagebox.showinfo("✅ Thành công", f"OpenRouter API Key hợp lệ!\nAccount: {account}")
             else:
-                messagebox.showinfo(
-                    "✅ Format OK",
-                    f"Format key {provider_id.title()} có vẻ đúng.\n"
-                    f"(Không thể test trực tiếp — cần gọi API thực tế)"
-                )
+                count = len(check.data.get("data", []))
+                messagebox.showinfo("✅ Thành công", f"{label} API Key hợp lệ!\n{count} models khả dụng.")
+        elif isinstance(error, task_pool.Cancelled):
+            if str(error) == "timeout":
+                messagebox.showerror(f"❌ Lỗi {label} Key", "Hết thời gian chờ phản hồi.")
+        elif isinstance(error, providers.AuthError) and provider_id in key_pages:
+            messagebox.showerror("❌ Key Sai", f"Key không hợp lệ (HTTP {error.status}).\n"
+                                              f"Kiểm tra lại key tại {key_pages[provider_id]}")
+        elif isinstance(error, providers.ProviderError) and error.status:
+            messagebox.showerror(f"❌ Lỗi {label} Key", str(error))
+        else:
+            messagebox.showerror(f"❌ Lỗi {label} Key", f"Kết nối thất bại!\n\n{error}")
+
+    # ── Check All Keys ──
+    def open_key_health(self):
+        """Bảng sức khỏe của mọi key trong auth-profiles.json (kiểm tra song song, có cache)."""
+        if self.key_health_win is not None and self.key_health_win.winfo_exists():
+            self.key_health_win.lift()
+            return
+        win = self.key_health_win = tk.Toplevel(self.root)
+        win.title("🩺 API Keys Health")
+        win.geometry("820x320")
+
+        bar = tk.Frame(win)
+        bar.pack(fill=tk.X, padx=8, pady=5)
+        tk.Button(bar, text="🔄 Kiểm tra lại", command=lambda: self._run_key_health(force=True)).pack(side=tk.LEFT)
+        self.key_health_status = tk.StringVar()
+        tk.Label(bar, textvariable=self.key_health_status, fg="gray").pack(side=tk.LEFT, padx=8)
+
+        columns = {"profile": ("Profile", 150), "provider": ("Provider", 80), "state": ("Trạng thái", 80),
+                   "latency": ("Latency (ms)", 85), "quota": ("Quota / Rate limit", 220),
+                   "detail": ("Chi tiết", 160), "checked": ("Lúc kiểm tra", 80)}
+        tree = self.key_health_tree = ttk.Treeview(win, columns=list(columns), show="headings")
+        for col, (title, width) in columns.items():
+            tree.heading(col, text=title, command=lambda c=col: self._sort_key_health(c))
+            tree.column(col, width=width, anchor=tk.E if col == "latency" else tk.W)
+        tree.tag_configure("bad", foreground="#c00000")
+        tree.tag_configure("slow", foreground="#c07000")
+        tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
+        self._key_health_rows = []
+        self._key_health_sort = ("state", False)
+        self._run_key_health(force=False)
+
+    def _run_key_health(self, force):
+        auth = json.loads(json.dumps(self.auth_data))  # snapshot: the Agents tab may edit it meanwhile
+        task = self.net_pool.submit(lambda token: self.key_health.check_all(auth, force=force),
+                                    name="keys:all", group="keys", timeout=KEY_TEST_TIMEOUT * 3,
+                                    on_done=self._on_key_health)
+        if task is None:
+            self.key_health_status.set("Đang bận, thử lại sau.")
+        else:
+            self.key_health_status.set("Đang kiểm tra..." if force else "Đang kiểm tra (dùng cache nếu còn hạn)...")
+
+    def _on_key_health(self, task, rows, error):
+        if self.key_health_win is None or not self.key_health_win.winfo_exists():
+            return
+        if error is not None:
+            self.key_health_status.set(f"Lỗi: {error}")
+            return
+        self._key_health_rows = rows
+        bad = sum(r.state in (key_health.INVALID, key_health.ERROR) for r in rows)
+        slow = sum(r.state == key_health.OK and r.latency > key_health.SLOW_SECONDS for r in rows)
+        self.key_health_status.set(f"{len(rows)} profiles · {bad} lỗi · {slow} chậm")
+        self._fill_key_health()
+
+    def _sort_key_health(self, column):
+        col, descending = self._key_health_sort
+        self._key_health_sort = (column, not descending if col == column else False)
+        self._fill_key_health()
+
+    def _fill_key_health(self):
+        # Broken keys first by default: invalid/error, then missing, then working ones by latency
+        rank = {key_health.INVALID: 0, key_health.ERROR: 1, key_health.MISSING: 2, key_health.OK: 3,
+                key_health.UNCHECKED: 4}
+        keys = {"profile": lambda r: r.profile, "provider": lambda r: r.provider,
+                "state": lambda r: (rank.get(r.state, 5), -(r.latency or 0)),
+                "latency": lambda r: r.latency if r.latency is not None else float("inf"),
+                "quota": lambda r: str(r.quota), "detail": lambda r: r.detail, "checked": lambda r: r.checked_at or 0}
+        column, descending = self._key_health_sort
+        tree = self.key_health_tree
+        tree.delete(*tree.get_children())
+        for r in sorted(self._key_health_rows, key=keys[column], reverse=descending):
+            tag = ()
+            if r.state in (key_health.INVALID, key_health.ERROR):
+                tag = ("bad",)
+            elif r.state == key_health.OK and r.latency > key_health.SLOW_SECONDS:
+                tag = ("slow",)
+            quota = ", ".join(f"{k.replace('x-ratelimit-', '')}={v}" for k, v in r.quota.items())
+            tree.insert("", tk.END, tags=tag, values=(
+                r.profile, r.provider, r.state,
+                f"{r.latency * 1000:.0f}" if r.latency is not None else "",
+                quota, r.detail,
+                datetime.fromtimestamp(r.checked_at).strftime("%H:%M:%S") if r.checked_at else ""))
+
+    # ── Model benchmark ──
+    def open_model_bench(self):
+        """Đo TTFT / tốc độ / độ trễ của các agent hoặc model đã chọn (model_bench.py)."""
+        win = tk.Toplevel(self.root)
+        win.title("⏱ Model Benchmark")
+        win.geometry("860x480")
+
+        left = tk.Frame(win)
+        left.pack(side=tk.LEFT, fill=tk.Y, padx=8, pady=8)
+        tk.Label(left, text="Chọn agent / model (nhiều):").pack(anchor=tk.W)
+        choices = [("agent", name) for name in self.agents]
+        for pdata in self.PROVIDER_MODELS.values():
+            choices += [("model", m) for m in pdata["models"] if ("model", m) not in choices]
+        listbox = tk.Listbox(left, selectmode=tk.EXTENDED, width=38, exportselection=False)
+        for kind, value in choices:
+            listbox.insert(tk.END, f"🤖 {value}" if kind == "agent" else f"    {value}")
+        listbox.pack(fill=tk.Y, expand=True)
+
+        opts = tk.Frame(left)
+        opts.pack(fill=tk.X, pady=4)
+        tk.Label(opts, text="Số lần:").pack(side=tk.LEFT)
+        runs_var = tk.IntVar(value=3)
+        tk.Spinbox(opts, from_=1, to=50, textvariable=runs_var, width=4).pack(side=tk.LEFT, padx=(2, 8))
+        tk.Label(opts, text="Song song:").pack(side=tk.LEFT)
+        conc_var = tk.IntVar(value=1)
+        tk.Spinbox(opts, from_=1, to=16, textvariable=conc_var, width=4).pack(side=tk.LEFT, padx=2)
+
+        right = tk.Frame(win)
+        right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 8), pady=8)
+        bar = tk.Frame(right)
+        bar.pack(fill=tk.X)
+        run_btn = tk.Button(bar, text="▶ Chạy", bg="#ddffdd")
+        run_btn.pack(side=tk.LEFT)
+        stop_btn = tk.Button(bar, text="⏹ Dừng", state=tk.DISABLED)
+        stop_btn.pack(side=tk.LEFT, padx=4)
+        status_var = tk.StringVar(value=f"Mỗi lần gửi {len(model_bench.PROMPTS)} prompt chuẩn (streaming).")
+        tk.Label(bar, textvariable=status_var, fg="gray").pack(side=tk.LEFT, padx=6)
+
+        columns = [("target", "Target", 190)] + [(key, title, 62) for key, title in model_bench.COLUMNS]
+        tree = ttk.Treeview(right, columns=[c[0] for c in columns], show="headings")
+        for key, title, width in columns:
+            tree.heading(key, text=title)
+            tree.column(key, width=width, anchor=tk.W if key == "target" else tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, pady=(6, 0))
+
+        samples = queue.Queue()
+        state = {"task": None, "done": 0, "total": 0}
+
+        def _tick():
+            while True:
+                try:
+                    label, sample = samples.get_nowait()
+                except queue.Empty:
+                    break
+                state["done"] += 1
+                status_var.set(f"{state['done']}/{state['total']} · {label} [{sample['prompt']}] "
+                               + (f"{sample['latency_s']:.2f}s" if sample["ok"] else "lỗi"))
+            if state["task"] is not None and win.winfo_exists():
+                win.after(200, _tick)
+
+        def _on_done(task, report, error):
+            state["task"] = None
+            if not win.winfo_exists():
+                return
+            run_btn.config(state=tk.NORMAL)
+            stop_btn.config(state=tk.DISABLED)
+            if error is not None:
+                status_var.set("Đã dừng." if isinstance(error, task_pool.Cancelled) else f"Lỗi: {error}")
+                return
+            tree.delete(*tree.get_children())
+            for r in report["results"]:
+                cells = ["-" if r[key] is None else f"{r[key]:.0%}" if key == "error_rate" else f"{r[key]:.0f}"
+                         for key, _ in model_bench.COLUMNS]
+                tree.insert("", tk.END, values=[r["label"]] + cells)
+            try:
+                path = model_bench.save_report(report)
+                status_var.set(f"Xong · báo cáo: {os.path.basename(path)}")
+            except OSError as e:
+                status_var.set(f"Xong · không lưu được báo cáo: {e}")
+
+        def _run():
+            picked = [choices[i] for i in listbox.curselection()]
+            if not picked:
+                messagebox.showwarning("Benchmark", "Hãy chọn ít nhất một agent hoặc model.", parent=win)
+                return
+            runs, concurrency = max(1, runs_var.get()), max(1, conc_var.get())
+
+            def _work(token):
+                targets = model_bench.build_targets(
+                    [v for k, v in picked if k == "agent"], [v for k, v in picked if k == "model"],
+                    model_bench.load_json(OPENCLAW_CONFIG_PATH), model_bench.load_json(AUTH_PROFILES_PATH))
+                return model_bench.run_benchmark(targets, runs, concurrency,
+                                                 on_sample=lambda label, s: samples.put((label, s)),
+                                                 should_stop=lambda: token.cancelled)
+
+            task = self.net_pool.submit(_work, name="bench", group="bench", on_done=_on_done)
+            if task is None:
+                status_var.set("Đang bận, thử lại sau.")
+                return
+            state.update(task=task, done=0, total=len(picked) * runs * len(model_bench.PROMPTS))
+            run_btn.config(state=tk.DISABLED)
+            stop_btn.config(state=tk.NORMAL)
+            status_var.set("Đang chạy...")
+            _tick()
 
+        run_btn.config(command=_run)
+        stop_btn.config(command=lambda: state["task"] and self.net_pool.cancel(state["task"], "stopped"))
+        win.protocol("WM_DELETE_WINDOW", lambda: (state["task"] and self.net_pool.cancel(state["task"]),
+                                                  win.destroy()))
 
     def setup_bridge_tab(self):
         # Split into PanedWindow
@@ -473,12 +715,51 @@ class AgentConfigApp:
         self.bot_stop_btn = tk.Button(ctrl_frame, text="Stop This Bridge", command=self.stop_selected_bridge, state=tk.DISABLED, bg="#ffdddd")
         self.bot_stop_btn.pack(side=tk.LEFT, padx=5)
         
-        # Log Area
+        # Process table: every bot, not just the selected one
+        proc_frame = tk.LabelFrame(right_frame, text="Processes (All Bots)", padx=5, pady=5)
+        proc_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        columns = {"bot": ("Bot", 120), "state": ("State", 90), "pid": ("PID", 60), "rss": ("RSS (MB)", 70),
+                   "cpu": ("CPU %", 55), "uptime": ("Uptime", 70), "restarts": ("Restarts", 60)}
+        self.proc_tree = ttk.Treeview(proc_frame, columns=list(columns), show="headings", height=4)
+        for col, (title, width) in columns.items():
+            self.proc_tree.heading(col, text=title, command=lambda c=col: self._sort_process_table(c))
+            self.proc_tree.column(col, width=width, anchor=tk.W if col in ("bot", "state") else tk.E)
+        self.proc_tree.pack(fill=tk.X)
+
+        # Log Area: live tail of the selected bot, or pages of its log files
         log_frame = tk.LabelFrame(right_frame, text="Live Logs (Selected Bot)", padx=5, pady=5)
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
+
+        log_bar = tk.Frame(log_frame)
+        log_bar.pack(fill=tk.X, pady=(0, 3))
+        self.log_bot_var = tk.StringVar()
+        self.log_bot_combo = ttk.Combobox(log_bar, textvariable=self.log_bot_var, state="readonly", width=14,
+                                          postcommand=self._log_bot_choices)
+        self.log_bot_combo.pack(side=tk.LEFT)
+        self.log_bot_combo.bind("<<ComboboxSelected>>", lambda e: self._log_open(self.log_bot_var.get()))
+        self.log_level_var = tk.StringVar(value="All")
+        level_combo = ttk.Combobox(log_bar, textvariable=self.log_level_var, state="readonly", width=9,
+                                   values=list(LOG_LEVEL_CHOICES))
+        level_combo.pack(side=tk.LEFT, padx=3)
+        level_combo.bind("<<ComboboxSelected>>", lambda e: self._log_show_tail() if self.log_follow_var.get()
+                         else self._log_page(self._log_view[0], forward=True))
+        self.log_search_var = tk.StringVar()
+        search_entry = tk.Entry(log_bar, textvariable=self.log_search_var, width=14)
+        search_entry.pack(side=tk.LEFT, padx=3)
+        search_entry.bind("<Return>", lambda e: self._log_search(backwards=True))
+        tk.Button(log_bar, text="◀ Tìm", command=lambda: self._log_search(backwards=True)).pack(side=tk.LEFT)
+        tk.Button(log_bar, text="Tìm ▶", command=lambda: self._log_search(backwards=False)).pack(side=tk.LEFT)
+        tk.Button(log_bar, text="⏫", command=self._log_older).pack(side=tk.LEFT, padx=(6, 0))
+        tk.Button(log_bar, text="⏬", command=self._log_newer).pack(side=tk.LEFT)
+        self.log_follow_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(log_bar, text="Follow", variable=self.log_follow_var,
+                       command=self._log_follow_toggled).pack(side=tk.LEFT, padx=3)
+        self.log_pos_var = tk.StringVar()
+        tk.Label(log_bar, textvariable=self.log_pos_var, fg="gray").pack(side=tk.RIGHT)
+
         self.log_text = scrolledtext.ScrolledText(log_frame, state='disabled', height=15)
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_text.tag_config("search_hit", background="#ffff99")
 
     def setup_chat_tab(self):
         """Tab chat để gửi/nhận tin nhắn với agent."""
@@ -494,13 +775,25 @@ class AgentConfigApp:
         )
         self.chat_agent_combo.pack(side=tk.LEFT, padx=8)
 
+        # TTFT / tốc độ của phản hồi gần nhất
+        self.chat_stats_var = tk.StringVar(value="")
+        tk.Label(top_bar, textvariable=self.chat_stats_var,
+                 font=("Consolas", 9), fg="#555555").pack(side=tk.LEFT, padx=4)
+
         tk.Button(top_bar, text="🗑 Xóa lịch sử",
                   command=self.clear_chat).pack(side=tk.RIGHT)
+        self.chat_stop_btn = tk.Button(top_bar, text="⏹ Dừng", command=self.stop_chat,
+                                       state=tk.DISABLED)
+        self.chat_stop_btn.pack(side=tk.RIGHT, padx=4)
+        self.chat_pending_var = tk.StringVar(value="")
+        tk.Label(top_bar, textvariable=self.chat_pending_var,
+                 font=("Arial", 9), fg="#E65100").pack(side=tk.RIGHT, padx=4)
         tk.Button(top_bar, text="🆓 API Key Free",
                   command=self.show_free_api_keys,
                   bg="#4CAF50", fg="white",
                   font=("Arial", 9, "bold"),
                   relief=tk.FLAT, padx=8).pack(side=tk.RIGHT, padx=6)
+        tk.Button(top_bar, text="⏱ Benchmark", command=self.open_model_bench).pack(side=tk.RIGHT)
 
         # Khung hiển thị tin nhắn
         msg_frame = tk.Frame(self.chat_tab)
@@ -567,22 +860,25 @@ class AgentConfigApp:
         self.chat_input.bind("<Return>", self.on_chat_enter)
         self.chat_input.bind("<Shift-Return>", lambda e: None)  # Shift+Enter = xuống dòng
 
-        send_btn = tk.Button(
+        self.chat_send_btn = tk.Button(
             input_frame, text="Gửi ▶",
             command=self.send_chat_message,
             bg="#128C7E", fg="white",
             font=("Arial", 10, "bold"),
             relief=tk.FLAT, padx=12
         )
-        send_btn.pack(side=tk.RIGHT)
+        self.chat_send_btn.pack(side=tk.RIGHT)
 
         # Hint
         tk.Label(self.chat_tab,
                  text="Enter = Gửi  |  Shift+Enter = Xuống dòng",
                  font=("Arial", 8), fg="gray").pack()
 
-        # Queue cho phản hồi chat
+        # Queue cho phản hồi chat (worker thread → UI thread)
         self.chat_queue = queue.Queue()
+        self.chat_histories = {}  # agent -> [{"role", "content"}], hội thoại nhiều lượt
+        self._chat_requests = {}  # req_id -> trạng thái của phản hồi đang stream
+        self._chat_req_seq = 0
         self._check_chat_queue()
 
     def _append_chat(self, sender, message, tag):
@@ -607,6 +903,12 @@ class AgentConfigApp:
         self.chat_display.config(state='normal')
         self.chat_display.delete(1.0, tk.END)
         self.chat_display.config(state='disabled')
+        # Phản hồi còn đang chạy sẽ bị bỏ qua khi về tới
+        self.net_pool.cancel_group("chat")
+        self._chat_requests.clear()
+        self._update_send_state()
+        self.chat_histories.clear()
+        self.chat_stats_var.set("")
         self._append_system_msg("Lịch sử đã được xóa")
 
     def on_chat_enter(self, event):
@@ -616,9 +918,9 @@ class AgentConfigApp:
             return "break"  # Ngăn xuống dòng
 
     def send_chat_message(self):
-        """Gửi tin nhắn từ ô input tới agent."""
+        """Gửi tin nhắn từ ô input tới agent (kèm các lượt trước của cùng agent)."""
         message = self.chat_input.get("1.0", tk.END).strip()
-        if not message:
+        if not message or self._chat_requests:  # một lượt mỗi lần: không xen hai phản hồi vào lịch sử
             return
 
         # Hiện tin nhắn người dùng
@@ -626,210 +928,85 @@ class AgentConfigApp:
         self.chat_input.delete("1.0", tk.END)
 
         agent_name = self.chat_agent_var.get()
+        history = self.chat_histories.setdefault(agent_name, [])
+        user_msg = {"role": "user", "content": message}
+        history.append(user_msg)
+        messages = history[-CHAT_HISTORY_MESSAGES:]
+        while messages and messages[0]["role"] != "user":  # context must start with a user turn
+            messages = messages[1:]
+
+        self._chat_req_seq += 1
+        req_id = self._chat_req_seq
+        # Gửi qua pool nền để không đóng băng UI; Dừng / timeout sẽ hủy yêu cầu
+        task = self.net_pool.submit(
+            self._call_agent_thread, req_id, agent_name, list(messages),
+            name=f"chat:{agent_name}", group="chat", timeout=CHAT_TIMEOUT,
+            on_done=lambda task, result, error: self._on_chat_task_done(req_id, error),
+        )
+        if task is None:
+            history.remove(user_msg)
+            self._append_system_msg("Quá nhiều yêu cầu đang chờ — hãy đợi hoặc bấm Dừng")
+            return
+        self._chat_requests[req_id] = {"agent": agent_name, "user_msg": user_msg, "sent": time.monotonic(),
+                                       "mark": None, "first": None, "deltas": 0}
+        self._update_send_state()
         self._append_system_msg(f"Đang gửi tới {agent_name}...")
+        self._update_pending()
 
-        # Gửi trong thread riêng để không đóng băng UI
-        threading.Thread(
-            target=self._call_agent_thread,
-            args=(message, agent_name),
-            daemon=True
-        ).start()
+    def _update_send_state(self):
+        """Nút Gửi bị khóa khi còn phản hồi đang stream (Dừng để hủy)."""
+        self.chat_send_btn.config(state=tk.DISABLED if self._chat_requests else tk.NORMAL)
 
-    def _call_agent_thread(self, message, agent_name):
-        """Gọi agent trực tiếp qua Gemini API (đọc key từ NullClaw config)."""
-        try:
-            import google.generativeai as genai
+    def stop_chat(self):
+        """Hủy mọi yêu cầu chat đang chờ hoặc đang chạy."""
+        self.net_pool.cancel_group("chat")
 
-            # --- 1. Đọc config ---
-            def _load_json(p):
-                try:
-                    with open(p, 'r', encoding='utf-8-sig') as f:
-                        return json.load(f)
-                except Exception:
-                    return {}
-
-            oc_cfg   = _load_json(OPENCLAW_CONFIG_PATH)
-            auth_cfg = _load_json(AUTH_PROFILES_PATH)
-
-            # --- 2. Xác định agent thực (Auto-Router → defaults) ---
-            actual_agent = "defaults" if agent_name == "Auto-Router" else agent_name
-            agent_conf = oc_cfg.get("agents", {}).get(actual_agent, {})
-            if not agent_conf:
-                agent_conf = oc_cfg.get("agents", {}).get("defaults", {})
-
-            # --- 3. Lấy model và dọn dẹp tên model ---
-            model_id = agent_conf.get("model", {}).get(
-                "primary", "gemini-2.0-flash-thinking-exp-1219"
-            )
-            # Remove (Free) if it somehow got saved
-            clean_model = model_id.replace(" (Free)", "").strip()
-            
-            # --- 4. Xác định provider từ auth profile ─────────
-            # Đầu tiên detect từ model name chưa cắt prefix
-            provider = self._detect_provider(clean_model)
-            
-            # Khử tiền tố provider cho API gọi trực tiếp (Groq, OpenAI, Anthropic, DeepSeek, Mistral, xAI không cần tiền tố)
-            if provider in ["google", "groq", "openai", "anthropic", "deepseek", "mistral", "xai", "ollama"]:
-                if "/" in clean_model and clean_model.startswith(provider + "/"):
-                    clean_model = clean_model.split("/", 1)[1]
-            
-            # Tìm profile theo thứ tự ưu tiên nhất: <provider>:<agent_name>
-            api_key = None
-            profiles = auth_cfg.get("profiles", {})
-            
-            # 1. Tìm chính xác cho agent và provider này
-            specific_keys = [
-                f"{provider}:{actual_agent}",
-                f"{provider}:{agent_name}",
-                f"{provider}:defaults"
-            ]
-            
-            for candidate in specific_keys:
-                if candidate in profiles:
-                    api_key = profiles[candidate].get("key") or profiles[candidate].get("apiKey")
-                    if api_key: break
-            
-            # 2. Nếu không tìm thấy, quét tất cả profile để xem có cái nào map với provider không
-            if not api_key:
-                for k, v in profiles.items():
-                    if isinstance(v, dict):
-                        # Khóa có thể lưu kiểu `groq:agentName` hoặc `type`: `api_key` `provider`: `groq`
-                        p_name = v.get("provider")
-                        if p_name == provider or (":" in k and k.split(":")[0] == provider):
-                            api_key = v.get("key") or v.get("apiKey")
-                            if api_key:
-                                break
-                                
-            # 3. Fallback cuối: quét đại một API key bất kỳ (rủi ro sai model cao)
-            if not api_key and provider == "google":
-                for k, v in profiles.items():
-                    if isinstance(v, dict):
-                        candidate_key = v.get("key") or v.get("apiKey")
-                        if candidate_key:
-                            api_key = candidate_key
-                            break
-                            
-
-
-            if provider == "ollama":
-                # Ollama không cần api_key thực
-                pass
-            elif not api_key:
-                self.chat_queue.put(("error", agent_name,
-                    "❌ Chưa cấu hình API Key!\n"
-                    "Vào tab Agents → chọn agent → nhập API Key → Save Changes."
-                ))
-                return
+    def _on_chat_task_done(self, req_id, error):
+        if isinstance(error, task_pool.Cancelled) and req_id in self._chat_requests:
+            self._stream_cancelled(req_id, str(error))
 
-            # --- 5. Gọi API dựa trên Provider ---
+    def _call_agent_thread(self, token, req_id, agent_name, messages):
+        """Stream phản hồi của agent qua provider engine (đọc key từ NullClaw config)."""
+        def _load_json(p):
             try:
-                if provider == "google":
-                    import google.generativeai as genai
-                    genai.configure(api_key=api_key)
-                    model_obj = genai.GenerativeModel(
-                        model_name=clean_model,
-                        generation_config={"temperature": 0.7, "top_p": 0.95, "max_output_tokens": 8192}
-                    )
-                    chat_session = model_obj.start_chat(history=[])
-                    response = chat_session.send_message(message)
-                    self.chat_queue.put(("bot", agent_name, response.text))
-                    
-                elif provider in ["openai", "groq", "openrouter", "deepseek", "mistral", "xai"]:
-                    import urllib.request
-                    import urllib.error
-                    import json as _json
-
-                    endpoints = {
-                        "openai": "https://api.openai.com/v1/chat/completions",
-                        "groq": "https://api.groq.com/openai/v1/chat/completions",
-                        "openrouter": "https://openrouter.ai/api/v1/chat/completions",
-                        "deepseek": "https://api.deepseek.com/chat/completions",
-                        "mistral": "https://api.mistral.ai/v1/chat/completions",
-                        "xai": "https://api.x.ai/v1/chat/completions"
-                    }
-                    url = endpoints[provider]
-                    
-                    data = {
-                        "model": clean_model,
-                        "messages": [{"role": "user", "content": message}],
-                        "temperature": 0.7
-                    }
-                    
-                    headers = {
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                        "User-Agent": "OpenClawManager/1.0"
-                    }
-                    if provider == "openrouter":
-                        headers["HTTP-Referer"] = "https://github.com/hoang"
-
-                    req = urllib.request.Request(url, data=_json.dumps(data).encode('utf-8'), headers=headers)
-                    with urllib.request.urlopen(req, timeout=30) as r:
-                        resp_data = _json.loads(r.read())
-                        reply = resp_data["choices"][0]["message"]["content"]
-                        self.chat_queue.put(("bot", agent_name, reply))
-
-                elif provider == "anthropic":
-                    import urllib.request
-                    import urllib.error
-                    import json as _json
-                    
-                    url = "https://api.anthropic.com/v1/messages"
-                    data = {
-                        "model": clean_model,
-                        "max_tokens": 4096,
-                        "messages": [{"role": "user", "content": message}],
-                        "temperature": 0.7
-                    }
-                    headers = {
-                        "x-api-key": api_key,
-                        "anthropic-version": "2023-06-01",
-                        "content-type": "application/json",
-                        "User-Agent": "OpenClawManager/1.0"
-                    }
-                    req = urllib.request.Request(url, data=_json.dumps(data).encode('utf-8'), headers=headers)
-                    with urllib.request.urlopen(req, timeout=30) as r:
-                        resp_data = _json.loads(r.read())
-                        reply = resp_data["content"][0]["text"]
-                        self.chat_queue.put(("bot", agent_name, reply))
-                        
-                elif provider == "ollama":
-                    import urllib.request
-                    import urllib.error
-                    import json as _json
-                    
-                    url = "http://127.0.0.1:11434/api/chat"
-                    data = {
-                        "model": clean_model,
-                        "messages": [{"role": "user", "content": message}],
-                        "stream": False
-                    }
-                    req = urllib.request.Request(url, data=_json.dumps(data).encode('utf-8'), headers={"Content-Type": "application/json"})
-                    with urllib.request.urlopen(req, timeout=120) as r:
-                        resp_data = _json.loads(r.read())
-                        reply = resp_data["message"]["content"]
-                        self.chat_queue.put(("bot", agent_name, reply))
-                        
-                else:
-                    self.chat_queue.put(("error", agent_name, f"❌ Provider '{provider}' chưa được hỗ trợ chat trực tiếp trong GUI."))
-                
-            except Exception as e:
-                err_str = str(e)
-                if "429" in err_str or "quota" in err_str.lower() or "RESOURCE_EXHAUSTED" in err_str:
-                    self.chat_queue.put(("error", agent_name, f"⚠ Hết quota (Rate Limit) cho provider {provider.title()}!"))
-                elif "401" in err_str or "API_KEY_INVALID" in err_str or "Unauthorized" in err_str:
-                    self.chat_queue.put(("error", agent_name, f"❌ API Key không hợp lệ cho {provider.title()}!\nKiểm tra lại khóa."))
-                elif "404" in err_str:
-                    self.chat_queue.put(("error", agent_name, f"❌ Model '{clean_model}' không tồn tại hoặc không hỗ trợ bởi {provider.title()}."))
-                else:
-                    self.chat_queue.put(("error", agent_name, f"❌ Lỗi kết nối {provider.title()}: {e}"))
-        except ImportError:
-            self.chat_queue.put(("error", agent_name,
-                "❌ Thiếu thư viện google-generativeai.\n"
-                "Chạy: pip install google-generativeai"
-            ))
+                with open(p, 'r', encoding='utf-8-sig') as f:
+                    return json.load(f)
+            except Exception:
+                return {}
+
+        # Auto-Router → defaults
+        actual_agent = "defaults" if agent_name == "Auto-Router" else agent_name
+        target = providers.resolve(actual_agent, _load_json(OPENCLAW_CONFIG_PATH), _load_json(AUTH_PROFILES_PATH))
+        stream = providers.Stream(target, messages)
+        token.on_cancel(stream.abort)  # Dừng / timeout cắt kết nối ngay
+        try:
+            for delta in stream:
+                self.chat_queue.put(("delta", req_id, agent_name, delta))
+            self.chat_queue.put(("done", req_id, agent_name, stream))
         except Exception as e:
-            self.chat_queue.put(("error", agent_name, f"❌ Lỗi: {e}"))
+            if not token.cancelled:  # cancellation is reported by _on_chat_task_done
+                self.chat_queue.put(("error", req_id, agent_name, self._chat_error_text(e, target)))
+
+    def _chat_error_text(self, error, target):
+        """Thông báo lỗi cho người dùng từ lỗi của provider engine."""
+        provider = target.provider.title()
+        if isinstance(error, providers.MissingKeyError):
+            return ("❌ Chưa cấu hình API Key!\n"
+                    "Vào tab Agents → chọn agent → nhập API Key → Save Changes.")
+        if isinstance(error, providers.UnsupportedProviderError):
+            return f"❌ Provider '{target.provider}' chưa được hỗ trợ chat trực tiếp trong GUI."
+        if isinstance(error, providers.RateLimitError):
+            return f"⚠ Hết quota (Rate Limit) cho provider {provider}!"
+        if isinstance(error, providers.AuthError):
+            return f"❌ API Key không hợp lệ cho {provider}!\nKiểm tra lại khóa."
+        if isinstance(error, providers.NotFoundError):
+            return f"❌ Model '{target.model}' không tồn tại hoặc không hỗ trợ bởi {provider}."
+        if isinstance(error, providers.ProviderError):
+            return f"❌ Lỗi kết nối {provider}: {error}"
+        if isinstance(error, ImportError):
+            return ("❌ Thiếu thư viện google-generativeai.\n"
+                    "Chạy: pip install google-generativeai")
+        return f"❌ Lỗi: {error}"
 
     def show_free_api_keys(self):
         """Hiển thị cửa sổ popup danh sách API key miễn phí."""
@@ -1041,18 +1218,111 @@ class AgentConfigApp:
                   font=("Arial", 9), padx=20).pack(pady=4)
 
     def _check_chat_queue(self):
-        """Kiểm tra queue chat và hiển thị phản hồi từ agent."""
-        while not self.chat_queue.empty():
+        """Kiểm tra queue chat; các token về trong cùng một tick được chèn một lần."""
+        pending = {}  # req_id -> [delta, ...]
+        while True:
             try:
-                item = self.chat_queue.get_nowait()
-                msg_type, sender, content = item
-                if msg_type == "bot":
-                    self._append_chat(f"🤖 {sender}", content, "bot")
-                elif msg_type == "error":
-                    self._append_chat(f"⚠ {sender}", content, "bot")
+                kind, req_id, sender, content = self.chat_queue.get_nowait()
             except queue.Empty:
                 break
-        self.root.after(200, self._check_chat_queue)
+            if req_id not in self._chat_requests:  # đã xóa lịch sử
+                continue
+            if kind == "delta":
+                pending.setdefault(req_id, []).append(content)
+                continue
+            if req_id in pending:
+                self._stream_insert(req_id, "".join(pending.pop(req_id)))
+            if kind == "done":
+                self._stream_done(req_id, content)
+            else:
+                self._stream_error(req_id, content)
+        for req_id, parts in pending.items():
+            self._stream_insert(req_id, "".join(parts), len(parts))
+        self.root.after(CHAT_TICK_MS, self._check_chat_queue)
+
+    def _stream_insert(self, req_id, text, count=1):
+        """Chèn token mới vào cuối phản hồi đang stream (tạo khung tin nhắn ở token đầu)."""
+        req = self._chat_requests[req_id]
+        self.chat_display.config(state='normal')
+        if req["mark"] is None:
+            timestamp = datetime.now().strftime("%H:%M")
+            self.chat_display.insert(tk.END, f"🤖 {req['agent']} ({timestamp})\n", "sender_bot")
+            self.chat_display.insert(tk.END, "\n\n", "bot")
+            # Mark trước "\n\n": tin nhắn khác chèn sau không xen vào phản hồi này
+            req["mark"] = f"stream{req_id}"
+            self.chat_display.mark_set(req["mark"], "end-3c")
+            self.chat_display.mark_gravity(req["mark"], tk.RIGHT)
+            req["first"] = time.monotonic()
+            text = text.lstrip()
+        self.chat_display.insert(req["mark"], text, "bot")
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state='disabled')
+
+        req["deltas"] += count
+        elapsed = time.monotonic() - req["first"]
+        rate = f"{req['deltas'] / elapsed:.1f}" if elapsed > 0.2 else "…"
+        # Provider gửi từng đoạn (chunk), không phải từng token: số token thật chỉ có khi xong
+        self.chat_stats_var.set(f"⏱ TTFT {req['first'] - req['sent']:.2f}s · {rate} chunks/s")
+
+    def _stream_done(self, req_id, stream):
+        req = self._chat_requests.pop(req_id)
+        self._update_send_state()
+        if req["mark"] is None:  # phản hồi rỗng
+            self._append_chat(f"🤖 {req['agent']}", stream.text or "(không có nội dung)", "bot")
+        else:
+            self.chat_display.mark_unset(req["mark"])
+
+        # Lưu lượt trả lời ngay sau câu hỏi của nó (có thể đã có câu hỏi mới gửi tiếp)
+        history = self.chat_histories.get(req["agent"], [])
+        for i, msg in enumerate(history):
+            if msg is req["user_msg"]:
+                history.insert(i + 1, {"role": "assistant", "content": stream.text})
+                break
+
+        # Token theo usage của provider; không có usage thì chỉ đếm được chunk
+        if stream.usage["completion"]:
+            count, unit, rate_unit = stream.usage["completion"], "tokens", "tok/s"
+        else:
+            count, unit, rate_unit = len(stream.parts), "chunks", "chunks/s"
+        ttft = stream.ttft or 0.0
+        generating = stream.latency - ttft
+        rate = count / generating if generating > 0 else 0.0
+        self.chat_stats_var.set(f"⏱ TTFT {ttft:.2f}s · {rate:.1f} {rate_unit} · {count} {unit} · {stream.latency:.1f}s")
+
+    def _stream_error(self, req_id, message):
+        req = self._chat_requests.pop(req_id)
+        self._update_send_state()
+        if req["mark"] is not None:
+            self.chat_display.mark_unset(req["mark"])
+        # Bỏ câu hỏi lỗi khỏi ngữ cảnh để lượt sau không bị lệch vai
+        history = self.chat_histories.get(req["agent"], [])
+        if any(msg is req["user_msg"] for msg in history):
+            history[:] = [msg for msg in history if msg is not req["user_msg"]]
+        self._append_chat(f"⚠ {req['agent']}", message, "bot")
+
+    def _stream_cancelled(self, req_id, reason):
+        req = self._chat_requests.pop(req_id)
+        self._update_send_state()
+        if req["mark"] is not None:
+            self.chat_display.mark_unset(req["mark"])
+        history = self.chat_histories.get(req["agent"], [])
+        history[:] = [msg for msg in history if msg is not req["user_msg"]]
+        if reason == "timeout":
+            self._append_system_msg(f"{req['agent']}: hết thời gian chờ ({CHAT_TIMEOUT}s)")
+        else:
+            self._append_system_msg(f"{req['agent']}: đã dừng")
+
+    def _update_pending(self):
+        """Chỉ báo số yêu cầu chat đang chờ/đang chạy."""
+        n = self.net_pool.pending("chat")
+        self.chat_pending_var.set(f"⏳ {n} đang chạy" if n else "")
+        self.chat_stop_btn.config(state=tk.NORMAL if n else tk.DISABLED)
+
+    def _poll_net_tasks(self):
+        """Giao kết quả của các tác vụ mạng nền cho UI thread."""
+        self.net_pool.poll()
+        self._update_pending()
+        self.root.after(100, self._poll_net_tasks)
 
     def on_select(self, event):
         selection = self.agent_listbox.curselection()
@@ -1111,32 +1381,8 @@ class AgentConfigApp:
         self.save_btn.config(state=tk.DISABLED)
     
     def _detect_provider(self, model):
-        """Auto-detect provider from model name (prefix-first matching)."""
-        m = model.lower().replace(" (free)", "").strip()
-        # Kiểm tra prefix chính xác trước
-        if m.startswith("google/") or "gemini" in m:
-            return "google"
-        elif m.startswith("groq/") or "groq" in m or "llama" in m or "mixtral" in m:
-            return "groq"
-        elif m.startswith("openrouter/"):
-            return "openrouter"
-        elif m.startswith("openai/") or "gpt" in m:
-            return "openai"
-        elif m.startswith("anthropic/") or "claude" in m:
-            return "anthropic"
-        elif m.startswith("deepseek/") or "deepseek" in m:
-            return "deepseek"
-        elif m.startswith("mistral/") or "mistral" in m or "codestral" in m:
-            return "mistral"
-        elif m.startswith("xai/") or "grok" in m:
-            return "xai"
-        elif m.startswith("huggingface/"):
-            return "huggingface"
-        elif m.startswith("ollama/"):
-            return "ollama"
-        return "google"  # default
-
-
+        """Auto-detect provider from model name (same rules as the bridge)."""
+        return providers.detect_provider(model)
 
     def _auto_detect_provider(self, *args):
         """Called when model changes - auto set provider dropdown."""
@@ -1361,11 +1607,7 @@ class AgentConfigApp:
 
     def load_data(self):
         try:
-            if os.path.exists(OPENCLAW_CONFIG_PATH):
-                with open(OPENCLAW_CONFIG_PATH, 'r', encoding='utf-8-sig') as f:
-                    self.openclaw_data = json.load(f)
-            else:
-                self.openclaw_data = {"agents": {"defaults": {}}}
+            self.openclaw_data = self._read_config(OPENCLAW_CONFIG_PATH, {"agents": {"defaults": {}}})
             
             # Load Telegram Bots
             telegram_conf = self.openclaw_data.get('channels', {}).get('telegram', {})
@@ -1380,11 +1622,7 @@ class AgentConfigApp:
             # Refresh Bot List
             self.refresh_bot_list()
 
-            if os.path.exists(AUTH_PROFILES_PATH):
-                with open(AUTH_PROFILES_PATH, 'r', encoding='utf-8-sig') as f:
-                    self.auth_data = json.load(f)
-            else:
-                self.auth_data = {"version": 1, "profiles": {}}
+            self.auth_data = self._read_config(AUTH_PROFILES_PATH, {"version": 1, "profiles": {}})
             
             # --- Update Model Combo Values ---
             # Extract models directly from PROVIDER_MODELS to ensure consistency
@@ -1417,28 +1655,120 @@ class AgentConfigApp:
             messagebox.showerror("Error", f"Failed to load config: {e}")
 
     def refresh_list(self):
-        self.agent_listbox.delete(0, tk.END)
         self.agents = self.openclaw_data.get('agents', {})
-        agent_names = []
-        for name in self.agents:
-            if name == 'defaults': continue
-            self.agent_listbox.insert(tk.END, name)
-            agent_names.append(name)
+        agent_names = [name for name in self.agents if name != 'defaults']
+        self._sync_listbox(self.agent_listbox, agent_names)
         
-        all_agents = ["Auto-Router"] + sorted(agent_names)
-
-        # Update Bridge Tab Agent Combo
-        if hasattr(self, 'target_agent_combo'):
-            self.target_agent_combo['values'] = all_agents
+        all_agents = ("Auto-Router",) + tuple(sorted(agent_names))
 
-        # Update Chat Tab Agent Combo
-        if hasattr(self, 'chat_agent_combo'):
-            self.chat_agent_combo['values'] = all_agents
+        # Update Bridge Tab / Chat Tab Agent Combos (only when the list really changed)
+        for combo in (getattr(self, 'target_agent_combo', None), getattr(self, 'chat_agent_combo', None)):
+            if combo is not None and tuple(combo['values']) != all_agents:
+                combo['values'] = all_agents
 
     def refresh_bot_list(self):
-         self.bot_listbox.delete(0, tk.END)
-         for name in self.bot_configs:
-             self.bot_listbox.insert(tk.END, name)
+        self._sync_listbox(self.bot_listbox, list(self.bot_configs))
+
+    def _sync_listbox(self, listbox, names):
+        """Makes a listbox show `names` by inserting/deleting only the rows that differ."""
+        current = listbox.get(0, tk.END)
+        if list(current) == names:
+            return
+        selected = [current[i] for i in listbox.curselection()]
+        ops = difflib.SequenceMatcher(None, current, names, autojunk=False).get_opcodes()
+        for tag, i1, i2, j1, j2 in reversed(ops):  # back to front: earlier indexes stay valid
+            if tag in ('replace', 'delete'):
+                listbox.delete(i1, i2 - 1)
+            if tag in ('replace', 'insert'):
+                listbox.insert(i1, *names[j1:j2])
+        for name in selected:
+            if name in names and not listbox.selection_includes(names.index(name)):
+                listbox.selection_set(names.index(name))
+
+    # --- External config changes ---
+    def _read_config(self, path, default):
+        """Loads a config file and records it as the version on disk."""
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            self.config_watcher.remember(path, None)
+            self._disk_base[path] = None
+            return default
+        self._on_config_saved(path, content)
+        return json.loads(content.decode('utf-8-sig'))
+
+    def _on_config_saved(self, path, content):
+        self.config_watcher.remember(path, content)
+        self._disk_base[path] = json.loads(content.decode('utf-8-sig'))  # own copy: never edited in place
+
+    def _poll_config_files(self):
+        try:
+            self._check_config_files()
+        except Exception as e:
+            self.log_message(f"Config watcher error: {e}")
+        self.root.after(CONFIG_POLL_MS, self._poll_config_files)
+
+    def _check_config_files(self):
+        """Merges edits other programs made to the config files (also run right before every save)."""
+        for path, content in self.config_watcher.changed():
+            if content is None:
+                continue  # deleted: the next save writes it again
+            try:
+                theirs = json.loads(content.decode('utf-8-sig'))
+            except ValueError:
+                continue  # caught mid-write: the finished file is a new change
+            self._merge_external(path, theirs, content)
+
+    def _form_slice(self, path, data, name):
+        """The part of a config file shown in the agent form for agent `name`."""
+        data = data or {}
+        if path == OPENCLAW_CONFIG_PATH:
+            return data.get('agents', {}).get(name)
+        return {k: v for k, v in data.get('profiles', {}).items() if k.endswith(f":{name}")}
+
+    def _merge_external(self, path, theirs, content):
+        is_config = path == OPENCLAW_CONFIG_PATH
+        base = self._disk_base.get(path)
+        mine = self.openclaw_data if is_config else self.auth_data
+        selection = self.agent_listbox.curselection()
+        selected = self.agent_listbox.get(selection[0]) if selection else None
+        form_changed = selected and self._form_slice(path, base, selected) != self._form_slice(path, theirs, selected)
+        form_dirty = str(self.save_btn['state']) == tk.NORMAL
+
+        merged, conflicts = config_store.merge(base, mine, theirs)
+        labels = [".".join(map(str, p)) or "(whole file)" for p, _, _ in conflicts]
+        if form_changed and form_dirty and not any(p[:2] == ('agents', selected) for p, _, _ in conflicts):
+            labels.append(f"agents.{selected} (unsaved form)")
+        self._apply_config(path, merged, content)
+        self.log_message(f"{os.path.basename(path)} changed on disk: merged"
+                         + (f", {len(labels)} conflict(s): {', '.join(labels[:5])}" if labels else ""))
+
+        keep_mine = True
+        if labels:
+            shown = "\n".join(f"• {label}" for label in labels[:10])
+            more = f"\n… và {len(labels) - 10} mục khác" if len(labels) > 10 else ""
+            keep_mine = messagebox.askyesno(
+                "Config changed on disk",
+                f"{os.path.basename(path)} vừa bị chương trình khác sửa, trùng với thay đổi chưa lưu của bạn:\n\n"
+                f"{shown}{more}\n\nGiữ thay đổi của bạn? (No = dùng bản trên đĩa)")
+            if not keep_mine:
+                merged, _ = config_store.merge(base, mine, theirs, prefer_mine=False)
+                self._apply_config(path, merged, content)
+        if form_changed and (not form_dirty or not keep_mine) and selected in self.agents:
+            self.on_select(None)  # show the new values (also clears the Save button)
+
+    def _apply_config(self, path, merged, content):
+        self._on_config_saved(path, content)
+        if path != OPENCLAW_CONFIG_PATH:
+            self.auth_data = merged
+            return
+        self.openclaw_data = merged
+        bots = merged.get('channels', {}).get('telegram', {}).get('bots')
+        if bots is not None:
+            self.bot_configs = bots
+        self.refresh_list()
+        self.refresh_bot_list()
 
 
 
@@ -1485,30 +1815,18 @@ class AgentConfigApp:
 
         # (Telegram token is saved separately via Bridge tab > Save Bot Config)
 
-        if not os.path.exists(BACKUP_DIR):
-            os.makedirs(BACKUP_DIR)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # An explicit Save is written now, not after the debounce; files whose content did not
+        # change are neither rewritten nor backed up again
+        self.saver.save(OPENCLAW_CONFIG_PATH, lambda: self.openclaw_data)
+        self.saver.save(AUTH_PROFILES_PATH, lambda: self.auth_data)
         try:
-            if os.path.exists(OPENCLAW_CONFIG_PATH):
-                shutil.copy(OPENCLAW_CONFIG_PATH, os.path.join(BACKUP_DIR, f"openclaw_{timestamp}.json"))
-            if os.path.exists(AUTH_PROFILES_PATH):
-                shutil.copy(AUTH_PROFILES_PATH, os.path.join(BACKUP_DIR, f"auth-profiles_{timestamp}.json"))
+            self.saver.flush()
         except Exception as e:
-            messagebox.showerror("Backup Error", f"Could not create backup: {e}")
+            messagebox.showerror("Save Error", f"Configuration was not saved: {e}")
             return
-        
-        try:
-            with open(OPENCLAW_CONFIG_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.openclaw_data, f, indent=2)
-            
-            with open(AUTH_PROFILES_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.auth_data, f, indent=2)
 
-            messagebox.showinfo("Success", f"Configuration saved!\nBackups created in {BACKUP_DIR}")
-            self.save_btn.config(state=tk.DISABLED)
-        except Exception as e:
-            messagebox.showerror("Save Error", f"Could not save config: {e}")
+        messagebox.showinfo("Success", f"Configuration saved!\nPrevious versions kept in {BACKUP_DIR}")
+        self.save_btn.config(state=tk.DISABLED)
 
     # --- Bot Management ---
     def add_bot_dialog(self):
@@ -1527,12 +1845,13 @@ class AgentConfigApp:
         if not selection: return
         name = self.bot_listbox.get(selection[0])
         
-        if name in self.bridge_processes and self.bridge_processes[name]:
+        if self.supervisor.active(name):
              messagebox.showwarning("Running", "Stop the bridge before removing.")
              return
 
         if messagebox.askyesno("Confirm", f"Remove bot '{name}'?"):
             del self.bot_configs[name]
+            self.supervisor.remove(name)
             self.refresh_bot_list()
             self.save_bot_config_data()
             
@@ -1552,6 +1871,8 @@ class AgentConfigApp:
         self.target_agent_var.set(conf.get('agent', 'Auto-Router'))
         
         self.update_bot_control_ui(name)
+        if name != self.log_bot_var.get():
+            self._log_open(name)
 
     def save_bot_config(self):
         name = self.bot_name_var.get()
@@ -1572,19 +1893,15 @@ class AgentConfigApp:
         # Remove old single token to avoid confusion? 
         # self.openclaw_data['channels']['telegram'].pop('botToken', None) 
         
-        try:
-            with open(OPENCLAW_CONFIG_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.openclaw_data, f, indent=2)
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not save config: {e}")
+        self.saver.save(OPENCLAW_CONFIG_PATH, lambda: self.openclaw_data)
 
     # --- Bridge Process Logic ---
     def start_selected_bridge(self):
         name = self.bot_name_var.get()
         if not name: return
         
-        if name in self.bridge_processes and self.bridge_processes[name]:
-            return # Already running
+        if self.supervisor.active(name):
+            return # Already running (or waiting to restart)
 
         token = self.bot_token_var.get().strip()
         if not token:
@@ -1618,26 +1935,24 @@ class AgentConfigApp:
         
         self.log_message(f"[{name}] Requesting start...", name)
         try:
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            popen_kwargs = {}
+            if hasattr(subprocess, "STARTUPINFO"):  # Windows only
+                startupinfo = subprocess.STARTUPINFO()
+                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+                popen_kwargs["startupinfo"] = startupinfo
             
-            # Start Process
-            proc = subprocess.Popen(
+            # Start Process (the supervisor restarts it with the same command if it crashes)
+            self.supervisor.start(
+                name,
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
+                bufsize=0,  # binary, unbuffered: pipe_mux decodes and splits lines itself
                 cwd=os.path.dirname(bridge_exe) if is_frozen else CURRENT_DIR, # Set CWD to exe dir
-                startupinfo=startupinfo
+                **popen_kwargs
             )
-            
-            self.bridge_processes[name] = proc
             self.update_bot_control_ui(name)
             
-            threading.Thread(target=self.reader_thread, args=(proc.stdout, name), daemon=True).start()
-            threading.Thread(target=self.reader_thread, args=(proc.stderr, name), daemon=True).start()
-            
             self.log_message(f"[{name}] Started.", name)
             
         except Exception as e:
@@ -1647,13 +1962,11 @@ class AgentConfigApp:
         name = self.bot_name_var.get()
         if not name: return
         
-        proc = self.bridge_processes.get(name)
-        if not proc: return
+        if not self.supervisor.active(name): return
         
         self.log_message(f"[{name}] Requesting stop...", name)
         try:
-            proc.terminate()
-            self.bridge_processes[name] = None
+            self.supervisor.stop(name)
             self.update_bot_control_ui(name)
             self.log_message(f"[{name}] Terminated.", name)
         except Exception as e:
@@ -1663,78 +1976,333 @@ class AgentConfigApp:
         # Only update if the selected bot matches 'name'
         if self.bot_name_var.get() != name: return
         
-        is_running = False
-        if name in self.bridge_processes and self.bridge_processes[name]:
-            if self.bridge_processes[name].poll() is None:
-                is_running = True
-            else:
-                self.bridge_processes[name] = None # Clean up if dead
-        
-        if is_running:
+        if self.supervisor.running(name):
             self.bot_status_lbl.config(text="Status: RUNNING", fg="green")
             self.bot_start_btn.config(state=tk.DISABLED)
             self.bot_stop_btn.config(state=tk.NORMAL)
+        elif self.supervisor.active(name):
+            # Crashed, restart pending: Stop cancels it
+            self.bot_status_lbl.config(text="Status: RESTARTING", fg="orange")
+            self.bot_start_btn.config(state=tk.DISABLED)
+            self.bot_stop_btn.config(state=tk.NORMAL)
         else:
             self.bot_status_lbl.config(text="Status: STOPPED", fg="red")
             self.bot_start_btn.config(state=tk.NORMAL)
             self.bot_stop_btn.config(state=tk.DISABLED)
 
-    def reader_thread(self, pipe, bot_name):
+    def _on_bridge_started(self, entry):
+        self.pipe_mux.add(entry.name, entry.proc.stdout)
+        self.pipe_mux.add(entry.name, entry.proc.stderr)
+
+    def _log_put(self, bot_name, line):
+        self._log_put_many([(bot_name, line)])
+
+    def _log_put_many(self, items):
+        """Writes [(bot_name, line)] to the log files and queues them for the UI (safe from any thread)."""
+        per_bot = {}
+        for bot_name, line in items:
+            per_bot.setdefault(bot_name, []).append(line)
+        for bot_name, lines in per_bot.items():
+            try:
+                self.log_store.write(bot_name, "".join(lines))
+            except OSError:
+                pass  # disk full / no permission: the live view still gets the lines
+        for item in items:
+            self.log_queue.put(item)
+        if self._log_wake.is_set():
+            return  # Tk was already woken and drains until the queue is empty
+        self._log_wake.set()
+        if self._log_wake_w is not None:  # Tk is not thread-safe: it reads the pipe on its own thread
+            try:
+                os.write(self._log_wake_w, b"x")
+            except (BlockingIOError, OSError):  # already signalled / closed
+                pass
+
+    def _open_log_wake_pipe(self):
+        """Lets producers wake the Tk loop through a pipe it watches; False where Tk has no file handlers."""
+        if not hasattr(self.root.tk, "createfilehandler"):  # Windows
+            return False
+        self._log_wake_r, self._log_wake_w = os.pipe()
+        os.set_blocking(self._log_wake_r, False)
+        os.set_blocking(self._log_wake_w, False)
+        self.root.tk.createfilehandler(self._log_wake_r, tk.READABLE, self._on_log_wake_pipe)
+        return True
+
+    def _close_log_wake_pipe(self):
+        if self._log_wake_r is None:
+            return
+        self.root.tk.deletefilehandler(self._log_wake_r)
+        wake_r, wake_w = self._log_wake_r, self._log_wake_w
+        self._log_wake_r = self._log_wake_w = None
+        os.close(wake_w)
+        os.close(wake_r)
+
+    def _on_log_wake_pipe(self, fd, mask):
         try:
-            with pipe:
-                for line in iter(pipe.readline, ''):
-                    self.log_queue.put((bot_name, line))
-        except Exception:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
             pass
-        finally:
-             pass # Polling handles cleanup
+        if self._log_after is None:
+            self.check_log_queue()
+
+    def _poll_log_wake(self):
+        """Fallback without a wake pipe: polls the flag, backing off up to LOG_WAKE_MAX_MS while the log is idle."""
+        if self._log_wake.is_set():
+            self._log_wake_ms = LOG_TICK_MS
+            if self._log_after is None:
+                self.check_log_queue()
+        else:
+            self._log_wake_ms = min(self._log_wake_ms * 2, LOG_WAKE_MAX_MS)
+        self.root.after(self._log_wake_ms, self._poll_log_wake)
 
     def check_log_queue(self):
-        while not self.log_queue.empty():
+        """Renders up to LOG_BATCH_LINES queued lines of the viewed bot with a single insert.
+
+        Lines are already on disk; while browsing (Follow off) they only update the line count.
+        """
+        following = self.log_follow_var.get()
+        viewed = self.log_bot_var.get()
+        min_level = LOG_LEVEL_CHOICES.get(self.log_level_var.get(), 0)
+        lines, taken = [], 0
+        while taken < LOG_BATCH_LINES:
             try:
-                item = self.log_queue.get_nowait()
-                if isinstance(item, tuple):
-                    bot_name, msg = item
-                    # Append Log
-                    self.log_append(f"[{bot_name}] {msg}")
-                    
-                    # Check status update if this bot is selected
-                    if self.bot_name_var.get() == bot_name:
-                         # We can't easily poll process here efficiently without map lookup
-                         # Let's just rely on periodic UI update or user interaction?
-                         # Or just auto-check current selected bot status
-                         pass
-                else:
-                    # Legacy or system message
-                    self.log_append(str(item))
+                bot_name, msg = self.log_queue.get_nowait()
             except queue.Empty:
                 break
-        
-        # Periodic check for the currently selected bot's status (to detect unexpected crashes)
+            taken += 1
+            if not following or (min_level and log_store.line_level(msg) < min_level):
+                continue
+            if not viewed:  # no bot picked yet: show everyone, tagged
+                lines.append(f"[{bot_name}] {msg}")
+            elif bot_name == viewed:
+                lines.append(msg)
+        if lines:
+            self.log_append("".join(lines))
+        if taken and not following and self.log_reader:
+            self._log_update_position()
+
+        if self._log_after is not None:  # called directly while a tick was scheduled
+            self.root.after_cancel(self._log_after)
+            self._log_after = None
+        if self.log_queue.empty():
+            self._log_wake.clear()
+            if self.log_queue.empty():
+                return
+            self._log_wake.set()  # a line raced in after the last get
+        # Backlog: continue next tick so the window stays responsive
+        self._log_after = self.root.after(LOG_TICK_MS, self._log_tick)
+
+    def _log_tick(self):
+        self._log_after = None
+        self.check_log_queue()
+
+    def _poll_bridges(self):
+        # Reap crashes / run due restarts for every bot, then refresh status and the process table
+        for kind, entry, info in self.supervisor.poll():
+            if kind == "exited" and info is None:
+                self.log_message(f"[{entry.name}] Exited with code {entry.last_exit}, giving up.", entry.name)
+            elif kind == "exited":
+                self.log_message(f"[{entry.name}] Exited with code {entry.last_exit}, restarting in {info:.0f}s...",
+                                 entry.name)
+            elif kind == "restarted":
+                self.log_message(f"[{entry.name}] Restarted (#{entry.restarts}).", entry.name)
+            else:
+                self.log_message(f"[{entry.name}] Restart failed: {info}", entry.name)
         selected = self.bot_name_var.get()
         if selected:
             self.update_bot_control_ui(selected)
-             
-        self.root.after(100, self.check_log_queue)
+        self._refresh_process_table()
+        self.root.after(SUPERVISOR_POLL_MS, self._poll_bridges)
+
+    def _process_rows(self):
+        rows = {row["name"]: row for row in self.supervisor.rows()}
+        for name in self.bot_configs:
+            rows.setdefault(name, {"name": name, "state": supervisor.STOPPED, "pid": None, "rss": None,
+                                   "cpu_percent": None, "uptime": None, "restarts": 0, "restart_in": None})
+        return list(rows.values())
+
+    def _sort_process_table(self, column):
+        col, descending = self._proc_sort
+        self._proc_sort = (column, not descending if col == column else column != "bot")
+        self._refresh_process_table()
+
+    def _refresh_process_table(self):
+        keys = {"bot": lambda r: r["name"].lower(), "state": lambda r: r["state"], "pid": lambda r: r["pid"] or 0,
+                "rss": lambda r: r["rss"] or 0, "cpu": lambda r: r["cpu_percent"] or 0,
+                "uptime": lambda r: r["uptime"] or 0, "restarts": lambda r: r["restarts"]}
+        column, descending = self._proc_sort
+        rows = sorted(self._process_rows(), key=keys[column], reverse=descending)
+        for row in rows:
+            state = row["state"]
+            if row["restart_in"] is not None:
+                state = f"restart in {row['restart_in']:.0f}s"
+            uptime = row["uptime"]
+            values = (row["name"], state, row["pid"] or "",
+                      f"{row['rss'] / 1048576:.1f}" if row["rss"] is not None else "",
+                      f"{row['cpu_percent']:.1f}" if row["cpu_percent"] is not None else "",
+                      f"{int(uptime // 3600)}h{int(uptime % 3600 // 60):02d}m{int(uptime % 60):02d}s" if uptime else "",
+                      row["restarts"])
+            if self.proc_tree.exists(row["name"]):
+                self.proc_tree.item(row["name"], values=values)
+            else:
+                self.proc_tree.insert("", tk.END, iid=row["name"], values=values)
+        names = [row["name"] for row in rows]
+        for iid in self.proc_tree.get_children():
+            if iid not in names:
+                self.proc_tree.delete(iid)
+        for i, name in enumerate(names):
+            self.proc_tree.move(name, "", i)
 
     def log_append(self, msg):
+        at_bottom = self.log_text.yview()[1] >= 0.999
         self.log_text.config(state='normal')
         self.log_text.insert(tk.END, msg)
-        self.log_text.see(tk.END)
+        # Cap the widget: drop the oldest lines
+        excess = int(self.log_text.index('end-1c').split('.')[0]) - LOG_MAX_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+        if at_bottom:  # don't yank the view while the user reads older lines
+            self.log_text.see(tk.END)
         self.log_text.config(state='disabled')
 
     def log_message(self, msg, bot_name="System"):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_queue.put((bot_name, f"[{timestamp}] {msg}\n"))
+        self._log_put(bot_name, f"[{timestamp}] {msg}\n")
+
+    # ── log file viewer ──
+    def _log_bot_choices(self):
+        names = list(self.bot_configs)
+        # Files of removed bots (and "System") stay browsable
+        known = {os.path.basename(self.log_store.path(n))[:-4] for n in names}
+        names += [stem for stem in self.log_store.bots() if stem not in known]
+        self.log_bot_combo['values'] = names
+
+    def _log_open(self, bot_name):
+        """Switches the pane to a bot; big files are indexed a slice per tick."""
+        self.log_bot_var.set(bot_name)
+        self.log_reader = log_store.LogReader(self.log_store, bot_name)
+        self._log_hit = None
+        self._log_index_step(self.log_reader)
+
+    def _log_index_step(self, reader):
+        if reader is not self.log_reader:  # another bot was opened meanwhile
+            return
+        if not reader.refresh(LOG_INDEX_BUDGET):
+            self.log_pos_var.set(f"Đang lập chỉ mục... {reader.total:,} dòng")
+            self.root.after(LOG_TICK_MS, self._log_index_step, reader)
+            return
+        if self.log_follow_var.get():
+            self._log_show_tail()
+        else:
+            self._log_page(reader.total, forward=False)
+
+    def _log_min_level(self):
+        return LOG_LEVEL_CHOICES.get(self.log_level_var.get(), 0)
+
+    def _log_render(self, rows, hit=None):
+        self.log_text.config(state='normal')
+        self.log_text.delete("1.0", tk.END)
+        self.log_text.insert(tk.END, "".join(text + "\n" for _, text in rows))
+        if hit is not None:
+            for i, (n, _) in enumerate(rows, 1):
+                if n == hit:
+                    self.log_text.tag_add("search_hit", f"{i}.0", f"{i}.end")
+                    self.log_text.see(f"{i}.0")
+                    break
+        else:
+            self.log_text.see(tk.END)
+        self.log_text.config(state='disabled')
+        if rows:
+            self._log_view = (rows[0][0], rows[-1][0])
+        self._log_hit = hit
+        self._log_update_position()
+
+    def _log_update_position(self):
+        reader = self.log_reader
+        if self.log_follow_var.get():
+            self.log_pos_var.set("")
+        elif reader and reader.total:
+            first, last = self._log_view
+            self.log_pos_var.set(f"{first + 1:,}–{last + 1:,} / {reader.total:,}")
+
+    def _log_show_tail(self):
+        if not self.log_reader:
+            return
+        self.log_reader.refresh(LOG_INDEX_BUDGET)
+        self._log_render(self.log_reader.lines_before(self.log_reader.total, LOG_PAGE_LINES, self._log_min_level()))
+
+    def _log_page(self, line, forward):
+        """Shows a page starting at `line` (forward) or ending before it."""
+        reader = self.log_reader
+        if not reader:
+            return
+        reader.refresh(LOG_INDEX_BUDGET)
+        if forward:
+            rows = reader.lines(line, LOG_PAGE_LINES, self._log_min_level())
+        else:
+            rows = reader.lines_before(line, LOG_PAGE_LINES, self._log_min_level())
+        if rows:
+            self._log_render(rows)
+
+    def _log_stop_following(self):
+        if self.log_follow_var.get():
+            self.log_follow_var.set(False)
+            self._log_anchor_end()
+
+    def _log_anchor_end(self):
+        # The live pane holds no line numbers: browsing starts from the end of the files
+        self.log_reader.refresh(LOG_INDEX_BUDGET)
+        self._log_view = (self.log_reader.total, self.log_reader.total)
+
+    def _log_older(self):
+        if self.log_reader:
+            self._log_stop_following()
+            self._log_page(self._log_view[0], forward=False)
+
+    def _log_newer(self):
+        if self.log_reader and not self.log_follow_var.get():
+            self._log_page(self._log_view[1] + 1, forward=True)
+
+    def _log_follow_toggled(self):
+        if self.log_follow_var.get():
+            self._log_show_tail()
+        elif self.log_reader:
+            self._log_anchor_end()
+            self._log_page(self._log_view[0], forward=False)
+
+    def _log_search(self, backwards):
+        needle = self.log_search_var.get().strip()
+        if not needle or not self.log_reader:
+            return
+        self._log_stop_following()
+        if self._log_hit is not None:
+            start = self._log_hit
+        else:  # search from the page on screen
+            start = self._log_view[1] + 1 if backwards else self._log_view[0] - 1
+        hit = self.log_reader.search(needle, start, backwards, self._log_min_level())
+        if hit is None:
+            self.log_pos_var.set(f"Không tìm thấy '{needle}'")
+            return
+        level = self._log_min_level()
+        rows = self.log_reader.lines_before(hit, LOG_PAGE_LINES // 2, level) + \
+            self.log_reader.lines(hit, LOG_PAGE_LINES // 2, level)
+        self._log_render(rows, hit=hit)
 
     def cleanup(self):
         """Stops all running bridges."""
-        for name, proc in self.bridge_processes.items():
-            if proc:
-                try:
-                    proc.terminate()
-                except:
-                    pass
+        try:
+            self.saver.flush()  # debounced edits not written yet
+        except Exception as e:
+            messagebox.showerror("Save Error", f"Could not save pending changes: {e}")
+        self.net_pool.shutdown()
+        self.pipe_mux.close()
+        self.log_store.close()
+        try:
+            self.supervisor.shutdown()
+        except:
+            pass
+        self._close_log_wake_pipe()
         self.root.destroy()
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+"""Headless batch inference over the configured agents.
+
+    python batch_runner.py prompts.jsonl -o results.jsonl
+    python batch_runner.py prompts.csv -o results.jsonl --agent coder --concurrency 4 --rpm 60
+    python batch_runner.py prompts.jsonl -o results.jsonl --provider-limit google=2:15 --provider-limit ollama=1
+
+Input is JSONL ({"id", "prompt" or "text", "agent", "context"}; only the
+prompt is required) or CSV with the same columns. Items without an agent go
+to --agent if given, otherwise they are routed like a Telegram message
+(bridge_server.route_message). Models and keys are resolved exactly as the
+bridge does (bridge_server.resolve_agent over openclaw.json and
+auth-profiles.json).
+
+Calls run with bounded concurrency and a request-per-minute spacing per
+provider; 429 and 5xx answers are retried with backoff (honouring
+Retry-After), which also pauses the rest of that provider's queue.
+
+The output JSONL is the checkpoint: every finished item is appended and
+flushed as one line with its latency and token usage. Re-running with the
+same output skips ids already there; --retry-errors runs failed ones again
+(the last line for an id wins).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+import bridge_server
+import providers
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def load_items(path):
+    """Yields {"id", "prompt", "agent", "context"} from a JSONL or CSV file."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for n, row in enumerate(rows, 1):
+            prompt = row.get("prompt") or row.get("text") or ""
+            if not prompt.strip():
+                logger.warning(f"Skipping item {n}: empty prompt")
+                continue
+            yield {
+                "id": str(row.get("id") or n),
+                "prompt": prompt,
+                "agent": row.get("agent") or None,
+                "context": row.get("context") or "",
+            }
+
+
+def load_checkpoint(path, retry_errors=False):
+    """Ids already finished in an existing output file."""
+    done = {}
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:  # line cut short by an interrupted run
+                continue
+            done[str(rec.get("id"))] = rec.get("status")
+    return {i for i, status in done.items() if status == "ok" or not retry_errors}
+
+
+class ProviderLimit:
+    """At most `concurrency` calls in flight and one call start per 60/rpm seconds."""
+
+    def __init__(self, concurrency, rpm=0):
+        self.concurrency = concurrency
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._sem = asyncio.Semaphore(concurrency)
+        self._next = 0.0
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._next <= now:
+                self._next = now + self.interval
+                return self
+            await asyncio.sleep(self._next - now)  # re-check: a backoff may have moved _next
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+
+    def pause(self, seconds):
+        """Holds back new calls to this provider (after a rate-limit answer)."""
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+
+def parse_provider_limits(specs):
+    """{"google": (2, 15.0)} from ["google=2:15"]; rpm is optional."""
+    limits = {}
+    for spec in specs:
+        name, _, value = spec.partition("=")
+        concurrency, _, rpm = value.partition(":")
+        if not name or not concurrency.isdigit():
+            raise ValueError(f"bad --provider-limit '{spec}' (expected provider=N or provider=N:RPM)")
+        limits[name.strip()] = (int(concurrency), float(rpm or 0))
+    return limits
+
+
+def _retry_delay(error, attempt, base=1.0):
+    """Seconds to wait before retrying `error`, or None if it is not retryable."""
+    if isinstance(error, providers.ConfigError):
+        return None
+    if error.status is not None and error.status not in RETRY_STATUSES:
+        return None
+    if error.retry_after is not None:
+        return error.retry_after
+    return base * 2 ** (attempt - 1)
+
+
+class BatchRunner:
+    def __init__(self, out, agent=None, concurrency=4, rpm=0, provider_limits=None,
+                 max_inflight=32, max_retries=3, timeout=None, backoff=1.0):
+        self.out = out  # text file opened for appending
+        self.agent = agent
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.provider_limits = provider_limits or {}
+        self.max_inflight = max_inflight
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self._limits = {}
+        self._resolved = {}
+        self.config = bridge_server.load_json_config(bridge_server.OPENCLAW_CONFIG_PATH)
+        self.auth_profiles = bridge_server.load_json_config(bridge_server.AUTH_PROFILES_PATH)
+        self.stats = {"ok": 0, "error": 0, "retries": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                      "completion_tokens": 0}
+
+    def _limit(self, provider):
+        if provider not in self._limits:
+            concurrency, rpm = self.provider_limits.get(provider, (self.concurrency, self.rpm))
+            self._limits[provider] = ProviderLimit(concurrency, rpm)
+        return self._limits[provider]
+
+    def _resolve(self, agent):
+        if agent not in self._resolved:
+            self._resolved[agent] = bridge_server.resolve_agent(agent, self.config, self.auth_profiles)
+        return self._resolved[agent]
+
+    async def run_item(self, item):
+        agent = item["agent"] or self.agent or bridge_server.route_message(item["prompt"])
+        model, _, provider = resolved = self._resolve(agent)
+        record = {"id": item["id"], "agent": agent, "provider": provider, "model": model}
+        limit = self._limit(provider)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with limit:
+                    result = await bridge_server.call_agent(agent, item["prompt"], item["context"],
+                                                            resolved=resolved, timeout=self.timeout)
+                record.update(status="ok", output=result.text, error=None, latency_s=round(result.latency, 3),
+                              usage=result.usage)
+                break
+            except providers.ProviderError as e:
+                delay = _retry_delay(e, attempt, self.backoff)
+                if delay is None or attempt > self.max_retries:
+                    record.update(status="error", output=None, error=f"{type(e).__name__}: {e}", latency_s=None,
+                                  usage=None)
+                    break
+                self.stats["retries"] += 1
+                logger.warning(f"{provider}: item {item['id']} failed ({e}), retry {attempt} in {delay:.1f}s")
+                limit.pause(delay)
+            except Exception as e:  # e.g. a missing provider SDK: fail the item, not the run
+                record.update(status="error", output=None, error=f"{type(e).__name__}: {e}", latency_s=None,
+                              usage=None)
+                break
+        record["attempts"] = attempt
+        record["elapsed_s"] = round(time.monotonic() - started, 3)
+        self._write(record)
+        return record
+
+    def _write(self, record):
+        self.stats[record["status"]] += 1
+        if record["usage"]:
+            for key in ("prompt", "cached", "completion"):
+                self.stats[f"{key}_tokens"] += record["usage"][key]
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+    async def run(self, items, skip=()):
+        """Runs every item not in `skip`; returns the number run."""
+        inflight = asyncio.Semaphore(self.max_inflight)  # bounds tasks, not just calls, for huge inputs
+        tasks = set()
+        count = 0
+
+        async def _one(item):
+            try:
+                await self.run_item(item)
+            finally:
+                inflight.release()
+
+        for item in items:
+            if item["id"] in skip:
+                continue
+            await inflight.acquire()
+            task = asyncio.create_task(_one(item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            count += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+        return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a file of prompts through the configured agents")
+    parser.add_argument("input", help="Prompts as JSONL or CSV (columns: id, prompt/text, agent, context)")
+    parser.add_argument("-o", "--output", required=True, help="Results JSONL (also the resume checkpoint)")
+    parser.add_argument("--agent", help="Agent for items that do not name one (default: keyword routing)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Calls in flight per provider")
+    parser.add_argument("--rpm", type=float, default=0, help="Requests per minute per provider (0 = unlimited)")
+    parser.add_argument("--provider-limit", action="append", default=[], metavar="PROVIDER=N[:RPM]",
+                        help="Override concurrency/rpm for one provider (repeatable)")
+    parser.add_argument("--max-inflight", type=int, default=32, help="Items in progress across all providers")
+    parser.add_argument("--max-retries", type=int, default=3, help="Retries for 429/5xx/network errors")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-call timeout in seconds")
+    parser.add_argument("--retry-errors", action="store_true", help="Run items that failed in a previous run again")
+    parser.add_argument("--verbose", action="store_true", help="Log every call")
+    args = parser.parse_args(argv)
+
+    try:
+        provider_limits = parse_provider_limits(args.provider_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.verbose:
+        logging.getLogger(bridge_server.__name__).setLevel(logging.WARNING)
+
+    skip = load_checkpoint(args.output, args.retry_errors)
+    if skip:
+        print(f"Resuming: {len(skip)} items already done in {args.output}", file=sys.stderr)
+    # Start on a fresh line if the previous run was cut off mid-write
+    if os.path.exists(args.output) and os.path.getsize(args.output):
+        with open(args.output, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    started = time.monotonic()
+    with open(args.output, "a", encoding="utf-8") as out:
+        if needs_newline:
+            out.write("\n")
+        runner = BatchRunner(out, agent=args.agent, concurrency=args.concurrency, rpm=args.rpm,
+                             provider_limits=provider_limits, max_inflight=args.max_inflight,
+                             max_retries=args.max_retries, timeout=args.timeout)
+        count = asyncio.run(runner.run(load_items(args.input), skip))
+
+    elapsed = time.monotonic() - started
+    stats = runner.stats
+    print(f"Ran {count} items in {elapsed:.1f}s: {stats['ok']} ok, {stats['error']} errors, "
+          f"{stats['retries']} retries; tokens prompt={stats['prompt_tokens']} "
+          f"cached={stats['cached_tokens']} completion={stats['completion_tokens']}", file=sys.stderr)
+    return 1 if stats["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
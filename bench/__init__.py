@@ -0,0 +1 @@
+"""Offline benchmarks and local stand-in servers for the bridge."""
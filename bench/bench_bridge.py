@@ -0,0 +1,371 @@
+"""Offline benchmark suite for the Telegram bridge.
+
+Drives the real bridge handlers (python-telegram-bot polling against a fake
+Bot API server) with fake provider endpoints, and times the hot helpers.
+
+    python -m bench.bench_bridge                 # all configurations + micro
+    python -m bench.bench_bridge --quick         # smaller runs
+    python -m bench.bench_bridge --only micro --json bench_output.json
+
+CPU time is measured for the whole benchmark process, which includes the
+in-process stand-in servers; compare numbers between runs, not absolutely.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:BENCH")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bridge_server  # noqa: E402
+import providers  # noqa: E402
+from bench.fake_servers import MARKER_RE, FakeProviderServer, FakeTelegramServer  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_TOKEN = "123456:BENCH"
+
+# name, provider model, fake latency (s), tokens/sec, bridge concurrency (update handlers and
+# scheduler workers)
+CONFIGS = [
+    {"name": "openai-fast", "model": "openai/gpt-4o-mini", "latency": 0.005, "tokens_per_sec": 0, "concurrency": 1},
+    {"name": "openai-slow", "model": "openai/gpt-4o-mini", "latency": 0.2, "tokens_per_sec": 400, "concurrency": 1},
+    {"name": "openai-slow-c16", "model": "openai/gpt-4o-mini", "latency": 0.2, "tokens_per_sec": 400, "concurrency": 16},
+    {"name": "anthropic", "model": "anthropic/claude-3-5-haiku-20241022", "latency": 0.05, "tokens_per_sec": 0, "concurrency": 8},
+    {"name": "gemini", "model": "google/gemini-2.0-flash", "latency": 0.05, "tokens_per_sec": 0, "concurrency": 8},
+    {"name": "ollama", "model": "ollama/llama3", "latency": 0.05, "tokens_per_sec": 0, "concurrency": 8},
+]
+
+
+# ── Helpers ───────────────────────────────────────────────────────
+
+def percentile(values, p):
+    """Nearest-rank percentile (p in 0..100) of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def latency_summary(values):
+    """p50/p90/p99/max/mean in milliseconds."""
+    ms = [v * 1000.0 for v in values]
+    return {
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p90_ms": round(percentile(ms, 90), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+        "mean_ms": round(statistics.fmean(ms), 2) if ms else 0.0,
+    }
+
+
+def rss_bytes():
+    """Current resident set size of this process (0 if unknown)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+class BridgeSandbox:
+    """Points bridge_server at temporary config/history files and fake endpoints.
+
+    `gate` defaults to "all" so throughput runs call the model for every message.
+    `debounce` (seconds) and `workers` override the coalescer window and the
+    scheduler pool; None keeps the bridge's settings.
+    """
+
+    def __init__(self, model, provider_server=None, forced_agent=None, agents=None, gate="all",
+                 debounce=None, workers=None):
+        self.model = model
+        self.provider_server = provider_server
+        self.forced_agent = forced_agent
+        self.agents = agents or {}
+        self.gate = gate
+        self.debounce = debounce
+        self.workers = workers
+        self._saved = {}
+
+    def __enter__(self):
+        self.dir = tempfile.mkdtemp(prefix="openclaw-bench-")
+        agents = {"defaults": {"model": {"primary": self.model}}}
+        for name in list(bridge_server.AGENT_ROUTING) + list(self.agents):
+            agents[name] = {"model": {"primary": self.agents.get(name, self.model)}}
+        config_path = os.path.join(self.dir, "openclaw.json")
+        auth_path = os.path.join(self.dir, "auth-profiles.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump({"agents": agents}, f)
+        profiles = {
+            f"{p}:defaults": {"type": "api_key", "provider": p, "key": "bench-key"}
+            for p in ("openai", "groq", "openrouter", "deepseek", "mistral", "xai", "anthropic", "google")
+        }
+        with open(auth_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "profiles": profiles}, f)
+        history_dir = os.path.join(self.dir, "history")
+        os.makedirs(history_dir)
+
+        patches = {
+            "OPENCLAW_CONFIG_PATH": config_path,
+            "AUTH_PROFILES_PATH": auth_path,
+            "HISTORY_DIR": history_dir,
+            "FORCED_AGENT": self.forced_agent,
+            "HISTORY_BUS_PORT": 0,
+            "GROUP_GATE": self.gate,
+        }
+        if self.debounce is not None:
+            patches["DEBOUNCE_SECONDS"] = self.debounce
+        if self.workers is not None:
+            patches["SCHEDULER_SETTINGS"] = dict(bridge_server.SCHEDULER_SETTINGS, workers=self.workers)
+        for k, v in patches.items():
+            self._saved[k] = getattr(bridge_server, k)
+            setattr(bridge_server, k, v)
+        if self.provider_server:
+            self._saved_endpoints = providers.ENDPOINTS, providers.GOOGLE_API_ENDPOINT
+            providers.ENDPOINTS = dict(providers.ENDPOINTS, **self.provider_server.endpoints())
+            providers.GOOGLE_API_ENDPOINT = self.provider_server.google_endpoint
+        return self
+
+    def __exit__(self, *exc):
+        for k, v in self._saved.items():
+            setattr(bridge_server, k, v)
+        if self.provider_server:
+            providers.ENDPOINTS, providers.GOOGLE_API_ENDPOINT = self._saved_endpoints
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+async def start_polling_app(tg, concurrency):
+    """Builds and starts the real bridge application against a fake Bot API."""
+    app = bridge_server.build_application(BENCH_TOKEN, base_url=tg.base_url, concurrent_updates=concurrency)
+    await app.initialize()
+    if app.post_init:  # run_polling() would call these hooks; we drive the app manually
+        await app.post_init(app)
+    await app.start()
+    await app.updater.start_polling(poll_interval=0.0, timeout=1, drop_pending_updates=False)
+    return app
+
+
+async def stop_polling_app(app):
+    await app.updater.stop()
+    await app.stop()
+    await app.shutdown()
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+
+
+async def wait_for_answers(tg, count, timeout):
+    """Waits until every pushed message got a marked reply, was shed or was gated out.
+
+    Returns (complete, shed). Call before stop_polling_app(), which drops the scheduler.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        # A coalesced reply answers every message whose marker it carries
+        answered = len({m for s in list(tg.sent) for m in MARKER_RE.findall(s["text"] or "")})
+        shed = sum(bridge_server.SCHEDULER.shed.values()) if bridge_server.SCHEDULER else 0
+        if answered + shed + bridge_server.GATE_COUNTS["skipped"] >= count:
+            return True, shed
+        if time.monotonic() >= deadline:
+            return False, shed
+        await asyncio.sleep(0.02)
+
+
+# ── End-to-end ────────────────────────────────────────────────────
+
+async def run_e2e(cfg, messages=200, chats=10, rate=0.0):
+    """Pushes `messages` through the bridge and measures replies.
+
+    rate=0 pushes everything at once (burst); otherwise messages/sec. The
+    coalescer does not wait (its window would dominate the latency) and the
+    scheduler gets `concurrency` workers, so configurations differ only in
+    what they are meant to compare. RSS is process-wide: compare rss_delta_mb.
+    """
+    gc.collect()
+    rss_before = rss_bytes()
+    provider = FakeProviderServer(latency=cfg["latency"], tokens_per_sec=cfg["tokens_per_sec"]).start()
+    tg = FakeTelegramServer().start()
+    try:
+        with BridgeSandbox(cfg["model"], provider, debounce=0.0, workers=cfg["concurrency"]):
+            app = await start_polling_app(tg, cfg["concurrency"])
+            cpu_before = time.process_time()
+            started = time.perf_counter()
+            pushed = {}
+            for i in range(messages):
+                chat_id = -(1000 + i % chats)
+                pushed[i] = tg.push_message(chat_id, f"hello there [bench:{i}]", user_id=1 + i % 7)
+                if rate:
+                    await asyncio.sleep(1.0 / rate)
+            ok, shed = await wait_for_answers(tg, messages, 60 + messages * cfg["latency"])
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_before
+            rss_after = rss_bytes()
+            await stop_polling_app(app)
+    finally:
+        tg.stop()
+        provider.stop()
+
+    latencies, queueing, errors, busy = [], [], 0, 0
+    for sent in tg.sent:
+        found = [int(m) for m in MARKER_RE.findall(sent["text"] or "")]
+        if sent["text"] == bridge_server.BUSY_MESSAGE:
+            busy += 1
+            continue
+        if not found:
+            errors += 1
+            continue
+        for marker in found:
+            update_id = pushed.get(marker)
+            if update_id is None:
+                continue
+            latencies.append(sent["time"] - tg.pushed[update_id])
+            if update_id in tg.delivered:
+                queueing.append(tg.delivered[update_id] - tg.pushed[update_id])
+    return {
+        "config": cfg["name"],
+        "messages": messages,
+        "replies": len(latencies),
+        "errors": errors,
+        "shed": shed,
+        "busy_notices": busy,
+        "complete": ok,
+        "msgs_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": latency_summary(latencies),
+        "intake_delay": latency_summary(queueing),
+        "rss_mb": round(rss_after / 1e6, 1),
+        "rss_delta_mb": round((rss_after - rss_before) / 1e6, 1),
+        "cpu_s": round(cpu, 3),
+        "provider_requests": len(provider.requests),
+    }
+
+
+# ── Microbenchmarks ───────────────────────────────────────────────
+
+def _time_per_op(fn, number):
+    total = min(timeit.repeat(fn, number=number, repeat=3))
+    return total / number
+
+
+def micro_route_message(number=20000):
+    samples = [
+        "Please write a python function for me",
+        "can you review this pull request",
+        "Hello current world, how are you today?",
+        "viết bài blog về du lịch",
+        "x" * 2000,
+    ]
+    return {
+        name: round(_time_per_op(lambda s=s: bridge_server.route_message(s), number) * 1e6, 3)
+        for name, s in zip(["coder", "reviewer", "default", "writer", "long_default"], samples)
+    }
+
+
+def micro_get_history(sizes_mb=(1, 20)):
+    """get_history() latency (ms) on history files of the given sizes, cold (disk) and hot (cache)."""
+    results = {}
+    with BridgeSandbox("openai/gpt-4o-mini"):
+        for size in sizes_mb:
+            chat_id = f"bench{size}"
+            path = os.path.join(bridge_server.HISTORY_DIR, f"{chat_id}.txt")
+            line = "[User]: " + "lorem ipsum dolor sit amet " * 3 + "\n"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(line * max(1, int(size * 1e6 / len(line))))
+            number = 5 if size >= 10 else 50
+
+            def _cold(c=chat_id):
+                bridge_server.HISTORY_CACHE.invalidate(bridge_server.HISTORY_DIR, c)
+                return bridge_server.get_history(c)
+            results[f"{size}MB_cold"] = round(_time_per_op(_cold, number) * 1e3, 3)
+            results[f"{size}MB_hot"] = round(_time_per_op(lambda c=chat_id: bridge_server.get_history(c), number * 100) * 1e3, 4)
+    return results
+
+
+def micro_load_config(agent_counts=(10, 1000)):
+    """load_json_config() latency (ms) for openclaw.json with N agents."""
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="openclaw-bench-")
+    try:
+        for n in agent_counts:
+            path = os.path.join(tmp, f"openclaw_{n}.json")
+            agents = {f"agent{i}": {"model": {"primary": "openai/gpt-4o-mini"}, "identity": {"name": f"A{i}"}}
+                      for i in range(n)}
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"agents": agents, "channels": {"telegram": {"bots": {}}}}, f, indent=2)
+            results[f"{n}_agents"] = round(_time_per_op(lambda p=path: bridge_server.load_json_config(p), 50) * 1e3, 3)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def run_micro(quick=False):
+    return {
+        "route_message_us": micro_route_message(2000 if quick else 20000),
+        "get_history_ms": micro_get_history((1,) if quick else (1, 20)),
+        "load_json_config_ms": micro_load_config((10, 200) if quick else (10, 1000)),
+    }
+
+
+# ── CLI ───────────────────────────────────────────────────────────
+
+def print_report(report):
+    for r in report.get("e2e", []):
+        lat = r["latency"]
+        print(f"{r['config']:<18} {r['msgs_per_sec']:>8} msg/s  p50 {lat['p50_ms']:>8}ms  "
+              f"p90 {lat['p90_ms']:>8}ms  p99 {lat['p99_ms']:>8}ms  "
+              f"rss +{r['rss_delta_mb']}MB  cpu {r['cpu_s']}s  errors {r['errors']}")
+    for group, values in report.get("micro", {}).items():
+        print(f"{group}: " + ", ".join(f"{k}={v}" for k, v in values.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenClaw bridge offline benchmark")
+    parser.add_argument("--only", choices=["e2e", "micro"], default=None)
+    parser.add_argument("--config", action="append", help="Run only these configuration names")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=0.0, help="Messages/sec (0 = burst)")
+    parser.add_argument("--quick", action="store_true", help="Smaller runs for smoke testing")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    args = parser.parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    messages = min(args.messages, 40) if args.quick else args.messages
+    report = {}
+    if args.only in (None, "e2e"):
+        configs = [c for c in CONFIGS if not args.config or c["name"] in args.config]
+        report["e2e"] = [asyncio.run(run_e2e(c, messages, args.chats, args.rate)) for c in configs]
+    if args.only in (None, "micro"):
+        report["micro"] = run_micro(args.quick)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Train and evaluate the local learned router (learned_router.py) offline.
+
+    python -m bench.eval_router train --data labeled.jsonl --history        # -> router_model.npz
+    python -m bench.eval_router eval --data test.jsonl                       # uses the saved model
+    python -m bench.eval_router eval --data labeled.jsonl --holdout 0.2      # train/test split
+
+Labeled data is JSONL ({"text": ..., "agent": ...}) or CSV with text,agent
+columns. `eval` reports accuracy of the raw classifier, of the bridge's
+learned routing (classifier + keyword fallback under the threshold) and of
+the keyword rules alone, plus per-message inference latency.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bridge_server  # noqa: E402
+from bench.bench_bridge import percentile  # noqa: E402
+from learned_router import DEFAULT_THRESHOLD, LinearRouter, examples_from_history, load_examples  # noqa: E402
+
+HISTORY_WEIGHT = 0.5  # past decisions came from the keyword rules, so trust them less
+
+
+def keyword_seeds():
+    return [(k, agent) for agent, keywords in bridge_server.AGENT_ROUTING.items() for k in keywords]
+
+
+def build_training_set(data_paths=(), history_dir=None, seeds=True):
+    """(texts, labels, weights) from labeled files, keyword seeds and history decisions."""
+    rows = []
+    for path in data_paths:
+        rows += [(t, a, 1.0) for t, a in load_examples(path)]
+    if seeds:
+        rows += [(t, a, 1.0) for t, a in keyword_seeds()]
+    if history_dir:
+        agents = list(bridge_server.AGENT_ROUTING) + [bridge_server.DEFAULT_AGENT]
+        rows += [(t, a, HISTORY_WEIGHT) for t, a in examples_from_history(history_dir, agents)]
+    texts, labels, weights = zip(*rows) if rows else ((), (), ())
+    return list(texts), list(labels), list(weights)
+
+
+def evaluate(model, examples, threshold):
+    texts = [t for t, _ in examples]
+    gold = [a for _, a in examples]
+
+    latencies = []
+    raw, confidences = [], []
+    for text in texts:
+        start = time.perf_counter()
+        agent, confidence = model.predict(text)
+        latencies.append(time.perf_counter() - start)
+        raw.append(agent)
+        confidences.append(confidence)
+    routed = [a if c >= threshold else bridge_server.route_by_keywords(t) for t, a, c in zip(texts, raw, confidences)]
+    keywords = [bridge_server.route_by_keywords(t) for t in texts]
+
+    start = time.perf_counter()
+    model.predict_batch(texts)
+    batch_s = time.perf_counter() - start
+
+    def accuracy(pred):
+        return round(sum(p == g for p, g in zip(pred, gold)) / len(gold), 4) if gold else 0.0
+
+    per_class = {}
+    for agent in sorted(set(gold)):
+        idx = [i for i, g in enumerate(gold) if g == agent]
+        per_class[agent] = {
+            "n": len(idx),
+            "learned": round(sum(routed[i] == agent for i in idx) / len(idx), 4),
+            "keywords": round(sum(keywords[i] == agent for i in idx) / len(idx), 4),
+        }
+    us = [x * 1e6 for x in latencies]
+    return {
+        "examples": len(examples),
+        "threshold": threshold,
+        "accuracy_classifier": accuracy(raw),
+        "accuracy_learned": accuracy(routed),
+        "accuracy_keywords": accuracy(keywords),
+        "fallback_rate": round(sum(c < threshold for c in confidences) / len(texts), 4) if texts else 0.0,
+        "per_class": per_class,
+        "latency_us": {
+            "p50": round(percentile(us, 50), 1), "p99": round(percentile(us, 99), 1), "max": round(max(us, default=0), 1),
+        },
+        "batch_us_per_msg": round(batch_s / len(texts) * 1e6, 2) if texts else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train / evaluate the learned agent router")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train", help="Train and save a router model")
+    train.add_argument("--data", action="append", default=[], help="Labeled JSONL/CSV (repeatable)")
+    train.add_argument("--history", nargs="?", const=bridge_server.HISTORY_DIR, default=None,
+                       help="Also learn from routing decisions in the shared history (default dir if no value)")
+    train.add_argument("--no-seeds", action="store_true", help="Do not add the routing keywords as examples")
+    train.add_argument("--epochs", type=int, default=300)
+    train.add_argument("-o", "--output", default=bridge_server.ROUTER_MODEL_PATH)
+
+    ev = sub.add_parser("eval", help="Report accuracy and latency on a labeled corpus")
+    ev.add_argument("--data", required=True, help="Labeled JSONL/CSV")
+    ev.add_argument("--model", default=bridge_server.ROUTER_MODEL_PATH)
+    ev.add_argument("--holdout", type=float, default=0.0,
+                    help="Train on the rest of --data and evaluate on this fraction instead of loading --model")
+    ev.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD if bridge_server.ROUTER_THRESHOLD is None
+                    else bridge_server.ROUTER_THRESHOLD)
+    ev.add_argument("--seed", type=int, default=1)
+    ev.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        texts, labels, weights = build_training_set(args.data, args.history, seeds=not args.no_seeds)
+        if len(set(labels)) < 2:
+            parser.error("need labeled examples for at least two agents")
+        start = time.perf_counter()
+        model = LinearRouter.fit(texts, labels, weights, epochs=args.epochs)
+        model.save(args.output)
+        print(f"Trained on {len(texts)} examples ({', '.join(model.classes)}) in "
+              f"{time.perf_counter() - start:.2f}s -> {args.output}")
+        return model
+
+    examples = load_examples(args.data)
+    if args.holdout:
+        random.Random(args.seed).shuffle(examples)
+        cut = int(len(examples) * (1 - args.holdout))
+        train_set, examples = examples[:cut], examples[cut:]
+        texts = [t for t, _ in train_set] + [t for t, _ in keyword_seeds()]
+        labels = [a for _, a in train_set] + [a for _, a in keyword_seeds()]
+        model = LinearRouter.fit(texts, labels)
+    else:
+        model = LinearRouter.load(args.model)
+    report = evaluate(model, examples, args.threshold)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""Local stand-ins for the Telegram Bot API and the LLM providers.
+
+Everything runs on 127.0.0.1 in background threads so the bridge can be
+driven end-to-end without network access or real keys.
+"""
+import json
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MARKER_RE = re.compile(r"\[bench:(\d+)\]")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (long polls at shutdown) are expected.
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _BaseFake:
+    """Starts a ThreadingHTTPServer in a daemon thread."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self._httpd = None
+        self._thread = None
+
+    def _handler_class(self):
+        raise NotImplementedError
+
+    def start(self):
+        self._httpd = _Server((self.host, self.port), self._handler_class())
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ── Telegram Bot API ──────────────────────────────────────────────
+
+class FakeTelegramServer(_BaseFake):
+    """Serves getUpdates/sendMessage for one bot.
+
+    Messages pushed with push_message() are handed out via long polling;
+    every sendMessage is recorded in `sent` with its arrival time.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, username="bench_bot", long_poll_cap=1.0):
+        super().__init__(host, port)
+        self.username = username
+        self.long_poll_cap = long_poll_cap
+        self._cond = threading.Condition()
+        self._pending = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self.pushed = {}  # update_id -> push time
+        self.delivered = {}  # update_id -> time handed to the bot via getUpdates
+        self.sent = []
+        self.api_calls = {}
+
+    @property
+    def base_url(self):
+        """Value for ApplicationBuilder.base_url()."""
+        return f"{self.url}/bot"
+
+    def push_message(self, chat_id, text, user_id=None, first_name="User", chat_type=None,
+                     message_id=None, reply_to=None):
+        """Queues an incoming text message and returns its update_id."""
+        with self._cond:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            if message_id is None:
+                message_id = self._next_message_id
+                self._next_message_id += 1
+            if chat_type is None:
+                chat_type = "private" if int(chat_id) > 0 else "group"
+            message = {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": chat_type, "title": f"chat {chat_id}"},
+                "from": {"id": int(user_id or abs(int(chat_id))), "is_bot": False, "first_name": first_name},
+                "text": text,
+            }
+            if reply_to:
+                message["reply_to_message"] = reply_to
+            self._pending.append({"update_id": update_id, "message": message})
+            self.pushed[update_id] = time.perf_counter()
+            self._cond.notify_all()
+            return update_id
+
+    def wait_for_sent(self, count, timeout=30.0):
+        """Blocks until at least `count` sendMessage calls were received."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self.sent) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _get_me(self):
+        return {"id": 1, "is_bot": True, "first_name": "Bench", "username": self.username}
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = min(float(params.get("timeout") or 0), self.long_poll_cap)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if offset:
+                self._pending = [u for u in self._pending if u["update_id"] >= offset]
+            while not self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+            limit = int(params.get("limit") or 100)
+            batch = self._pending[:limit]
+            now = time.perf_counter()
+            for u in batch:
+                self.delivered.setdefault(u["update_id"], now)
+            return batch
+
+    def _send_message(self, params):
+        now = time.perf_counter()
+        chat_id = int(params.get("chat_id"))
+        with self._cond:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            self.sent.append({"chat_id": chat_id, "text": str(params.get("text", "")), "time": now})
+            self._cond.notify_all()
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": self._get_me(),
+            "text": str(params.get("text", "")),
+        }
+
+    def _dispatch(self, method, params):
+        self.api_calls[method] = self.api_calls.get(method, 0) + 1
+        if method == "getMe":
+            return self._get_me()
+        if method == "getUpdates":
+            return self._get_updates(params)
+        if method == "sendMessage":
+            return self._send_message(params)
+        # deleteWebhook, sendChatAction, setMyCommands, ...
+        return True
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _params(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode("utf-8") if length else ""
+                ctype = self.headers.get("Content-Type", "")
+                if "json" in ctype:
+                    return json.loads(raw or "{}")
+                params = {}
+                for k, v in urllib.parse.parse_qsl(raw):
+                    try:
+                        params[k] = json.loads(v)
+                    except ValueError:
+                        params[k] = v
+                return params
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                result = fake._dispatch(method, self._params())
+                body = json.dumps({"ok": True, "result": result}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST
+
+        return Handler
+
+
+# ── LLM providers ─────────────────────────────────────────────────
+
+class FakeProviderServer(_BaseFake):
+    """One server answering the OpenAI-compatible, Anthropic, Gemini and Ollama APIs.
+
+    `latency` is the delay before the first token, `tokens_per_sec` the
+    generation rate (0 = instant) and `reply_tokens` the reply length.
+    Replies echo the `[bench:N]` markers of the prompt's final "User:" part
+    (several when the bridge coalesced messages) so the benchmark can match
+    answers to requests.
+
+    Prompt caching is simulated: usage reports as cached the longest word
+    prefix shared with a recent prompt (Anthropic: the prefix up to the last
+    `cache_control` block, if that exact prefix was sent before).
+
+    With `keep_alive` the non-streaming answers use HTTP/1.1 persistent
+    connections; `connections` counts the TCP connections accepted.
+    `streams_cut` counts streamed replies the client hung up on before the end.
+
+    Requests carrying a field listed in `reject_fields` are answered with 400,
+    like OpenAI-compatible servers that do not know an optional parameter.
+
+    The key-check endpoints (model lists, OpenRouter's /auth/key) answer
+    after `latency` with rate-limit headers, and reject with 401 any key
+    starting with "bad".
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, tokens_per_sec=0.0,
+                 reply_tokens=20, fail_status=None, keep_alive=False, reject_fields=()):
+        super().__init__(host, port)
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.fail_status = fail_status
+        self.reject_fields = set(reject_fields)
+        self.keep_alive = keep_alive
+        self.connections = 0
+        self.streams_cut = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._prefixes = deque(maxlen=64)
+        self._breakpoints = set()
+
+    def endpoints(self):
+        """Endpoint table in the shape of providers.ENDPOINTS."""
+        chat = f"{self.url}/v1/chat/completions"
+        return {
+            "openai": chat, "groq": chat, "openrouter": chat,
+            "deepseek": chat, "mistral": chat, "xai": chat,
+            "anthropic": f"{self.url}/v1/messages",
+            "ollama": f"{self.url}/api/chat",
+        }
+
+    def key_check_endpoints(self):
+        """Key-check table in the shape of providers.KEY_CHECK_ENDPOINTS."""
+        models = f"{self.url}/v1/models"
+        return {
+            "google": f"{self.url}/v1beta/models?pageSize=1",
+            "groq": models, "openai": models, "deepseek": models, "mistral": models, "xai": models,
+            "anthropic": f"{models}?limit=1",
+            "openrouter": f"{self.url}/api/v1/auth/key",
+        }
+
+    @property
+    def google_endpoint(self):
+        """Value for providers.GOOGLE_API_ENDPOINT (REST transport)."""
+        return self.url
+
+    def _tokens(self, prompt):
+        found = MARKER_RE.findall((prompt or "").rsplit("User:", 1)[-1]) or MARKER_RE.findall(prompt or "")[-1:]
+        head = " ".join(f"[bench:{m}]" for m in found) if found else "[bench]"
+        return [head] + ["tok"] * max(self.reply_tokens - 1, 0)
+
+    def _cached_words(self, words):
+        """Longest common word prefix with a recent prompt (automatic prefix caching)."""
+        with self._lock:
+            best = 0
+            for prev in self._prefixes:
+                n = 0
+                for a, b in zip(prev, words):
+                    if a != b:
+                        break
+                    n += 1
+                best = max(best, n)
+            self._prefixes.append(words)
+        return best
+
+    def _breakpoint_cached(self, words):
+        """Anthropic-style explicit cache: (read, created) word counts for this breakpoint prefix."""
+        key = " ".join(words)
+        with self._lock:
+            if key in self._breakpoints:
+                return len(words), 0
+            self._breakpoints.add(key)
+        return 0, len(words)
+
+    def _record(self, path, body):
+        with self._lock:
+            self.requests.append({"path": path, "body": body, "time": time.perf_counter()})
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" if fake.keep_alive else "HTTP/1.0"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, obj, extra_headers=None):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (extra_headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, ctype, chunks):
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Connection", "close")  # no Content-Length: the end of the body is the close
+                self.close_connection = True
+                self.end_headers()
+                delay = 1.0 / fake.tokens_per_sec if fake.tokens_per_sec else 0.0
+                for chunk in chunks:
+                    try:
+                        self.wfile.write(chunk.encode("utf-8"))
+                        self.wfile.flush()
+                    except ConnectionError:  # the client aborted: stop generating
+                        with fake._lock:
+                            fake.streams_cut += 1
+                        return
+                    if delay:
+                        time.sleep(delay)
+
+            def _wait_full(self, n_tokens):
+                if fake.tokens_per_sec:
+                    time.sleep(n_tokens / fake.tokens_per_sec)
+
+            def do_GET(self):
+                fake._record(self.path, None)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                key = (self.headers.get("Authorization", "").replace("Bearer ", "")
+                       or self.headers.get("x-api-key") or self.headers.get("x-goog-api-key") or "")
+                if key.startswith("bad"):
+                    self._json(401, {"error": {"message": "invalid api key"}})
+                elif self.path.endswith("/models") or "/models?" in self.path:
+                    self._json(200, {"data": [{"id": "fake-model"}], "models": [{"name": "models/fake-model"}]},
+                               {"x-ratelimit-remaining-requests": "999"})
+                elif self.path.endswith("/auth/key"):
+                    self._json(200, {"data": {"label": "fake", "limit_remaining": 42.0}})
+                elif self.path.endswith("/api/tags"):
+                    self._json(200, {"models": [{"name": "fake-model"}]})
+                else:
+                    self._json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path
+                fake._record(path, body)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.fail_status:
+                    self._json(fake.fail_status, {"error": {"message": f"HTTP {fake.fail_status}"}})
+                    return
+                rejected = fake.reject_fields.intersection(body)
+                if rejected:
+                    self._json(400, {"error": {"message": f"Unrecognized request argument: {rejected.pop()}"}})
+                    return
+
+                if path.startswith("/v1/chat/completions"):
+                    self._openai(body)
+                elif path.startswith("/v1/messages"):
+                    self._anthropic(body)
+                elif ":generateContent" in path or ":streamGenerateContent" in path:
+                    self._gemini(body, ":streamGenerateContent" in path)
+                elif path.startswith("/api/chat"):
+                    self._ollama(body)
+                else:
+                    self._json(404, {"error": {"message": f"unknown path {path}"}})
+
+            # -- per-API shapes --
+            def _openai(self, body):
+                prompt = " ".join(_text_of(m.get("content")) for m in body.get("messages", []))
+                tokens = fake._tokens(prompt)
+                words = prompt.split()
+                usage = {"prompt_tokens": len(words), "completion_tokens": len(tokens),
+                         "total_tokens": len(words) + len(tokens),
+                         "prompt_tokens_details": {"cached_tokens": fake._cached_words(words)}}
+                if body.get("stream"):
+                    chunks = [
+                        "data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": t + " "}}]}) + "\n\n"
+                        for t in tokens
+                    ]
+                    chunks.append("data: " + json.dumps({"choices": [], "usage": usage}) + "\n\n")
+                    chunks.append("data: [DONE]\n\n")
+                    self._stream("text/event-stream", chunks)
+                    return
+                self._wait_full(len(tokens))
+                self._json(200, {
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(tokens)},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+            def _anthropic(self, body):
+                parts = [_text_of(body.get("system"))]
+                parts += [_text_of(m.get("content")) for m in body.get("messages", [])]
+                prompt = " ".join(parts)
+                tokens = fake._tokens(prompt)
+                # Prefix up to the last block marked with cache_control
+                prefix, cut = [_text_of(body.get("system"))], None
+                for m in body.get("messages", []):
+                    for block in m.get("content") if isinstance(m.get("content"), list) else [m.get("content")]:
+                        prefix.append(_text_of(block.get("text") if isinstance(block, dict) else block))
+                        if isinstance(block, dict) and block.get("cache_control"):
+                            cut = len(prefix)
+                read, created = fake._breakpoint_cached(" ".join(prefix[:cut]).split()) if cut else (0, 0)
+                usage = {"input_tokens": len(prompt.split()) - read - created, "output_tokens": len(tokens),
+                         "cache_read_input_tokens": read, "cache_creation_input_tokens": created}
+                if body.get("stream"):
+                    chunks = ["event: message_start\ndata: " + json.dumps(
+                        {"type": "message_start", "message": {"usage": usage}}) + "\n\n"]
+                    chunks += ["event: content_block_delta\ndata: " + json.dumps(
+                        {"type": "content_block_delta", "index": 0,
+                         "delta": {"type": "text_delta", "text": t + " "}}) + "\n\n" for t in tokens]
+                    chunks.append("event: message_stop\ndata: " + json.dumps({"type": "message_stop"}) + "\n\n")
+                    self._stream("text/event-stream", chunks)
+                    return
+                self._wait_full(len(tokens))
+                self._json(200, {"content": [{"type": "text", "text": " ".join(tokens)}], "usage": usage})
+
+            def _gemini(self, body, stream):
+                system = body.get("systemInstruction") or body.get("system_instruction") or {}
+                texts = [_text_of(p.get("text")) for p in system.get("parts", [])]
+                texts += [_text_of(p.get("text")) for c in body.get("contents", []) for p in c.get("parts", [])]
+                prompt = " ".join(texts)
+                tokens = fake._tokens(prompt)
+                words = prompt.split()
+                usage = {"promptTokenCount": len(words), "candidatesTokenCount": len(tokens),
+                         "cachedContentTokenCount": fake._cached_words(words)}
+
+                def _candidate(text):
+                    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                            "finishReason": "STOP", "index": 0}],
+                            "usageMetadata": usage}
+                if stream and "alt=sse" in self.path:
+                    self._stream("text/event-stream",
+                                 ["data: " + json.dumps(_candidate(t + " ")) + "\n\n" for t in tokens])
+                    return
+                if stream:  # the SDK's REST transport reads one JSON array, element by element
+                    chunks = [("[" if i == 0 else ",") + json.dumps(_candidate(t + " ")) for i, t in enumerate(tokens)]
+                    self._stream("application/json", chunks + ["]"])
+                    return
+                self._wait_full(len(tokens))
+                self._json(200, _candidate(" ".join(tokens)))
+
+            def _ollama(self, body):
+                prompt = " ".join(_text_of(m.get("content")) for m in body.get("messages", []))
+                tokens = fake._tokens(prompt)
+                if body.get("stream", True):
+                    chunks = [json.dumps({"message": {"role": "assistant", "content": t + " "}, "done": False}) + "\n"
+                              for t in tokens]
+                    chunks.append(json.dumps({"message": {"role": "assistant", "content": ""}, "done": True,
+                                              "eval_count": len(tokens)}) + "\n")
+                    self._stream("application/x-ndjson", chunks)
+                    return
+                self._wait_full(len(tokens))
+                words = prompt.split()
+                # Ollama only evaluates the part of the prompt not already in its KV cache
+                self._json(200, {"message": {"role": "assistant", "content": " ".join(tokens)}, "done": True,
+                                 "prompt_eval_count": len(words) - fake._cached_words(words), "eval_count": len(tokens)})
+
+        return Handler
+
+
+def _text_of(content):
+    """Flattens string / content-block list payloads into plain text."""
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(_text_of(c.get("text") if isinstance(c, dict) else c) for c in content)
+    return str(content)
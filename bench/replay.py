@@ -0,0 +1,188 @@
+"""Replays recorded Telegram traffic through the bridge against local stand-ins.
+
+Recordings come from `bridge_server.py --record traffic.jsonl` (see
+traffic_recorder.py). Timing modes:
+
+    python -m bench.replay traffic.jsonl                  # real time
+    python -m bench.replay traffic.jsonl --speed 20       # 20x accelerated
+    python -m bench.replay traffic.jsonl --rate 50        # fixed 50 msg/s, ignore timestamps
+    python -m bench.replay --synthesize-burst 300 -o spike.jsonl   # make a 300-member spike
+
+Reported per run: generator lag (push later than scheduled), intake delay
+(push -> getUpdates), dispatch delay (push -> provider request, i.e. time
+spent queued inside the bridge), end-to-end latency (push -> sendMessage),
+the peak number of messages in flight, how many were shed with a busy reply
+and how many the group gate skipped (`--gate relevant` to measure it).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.bench_bridge import (  # noqa: E402
+    BridgeSandbox, latency_summary, rss_bytes, start_polling_app, stop_polling_app, wait_for_answers,
+)
+import bridge_server  # noqa: E402  (after bench_bridge, which sets a placeholder token)
+from bench.fake_servers import MARKER_RE, FakeProviderServer, FakeTelegramServer  # noqa: E402
+from traffic_recorder import load_recording  # noqa: E402
+
+
+def schedule(records, speed=1.0, rate=0.0):
+    """Offsets (seconds from start) at which each record is pushed."""
+    if rate:
+        return [i / rate for i in range(len(records))]
+    if not records:
+        return []
+    t0 = records[0]["t"]
+    return [(r["t"] - t0) / (speed or 1.0) for r in records]
+
+
+def synthesize_burst(members=300, window=30.0, chat_id=-100500, seed=1):
+    """A group spike: every member posts once, front-loaded (exponential arrivals)."""
+    rng = random.Random(seed)
+    t = time.time()
+    records = []
+    for i in range(members):
+        offset = min(rng.expovariate(4.0 / window), window)
+        words = " ".join("x" * rng.randint(2, 8) for _ in range(rng.randint(2, 15)))
+        records.append({
+            "t": round(t + offset, 3), "update_id": i + 1, "chat_id": chat_id, "chat_type": "supergroup",
+            "user_id": 1000 + i, "message_id": i + 1, "text": words, "reply_to_bot": False,
+        })
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+async def replay(records, model="openai/gpt-4o-mini", speed=1.0, rate=0.0, latency=0.5,
+                 tokens_per_sec=0.0, concurrency=1, forced_agent=None, drain_timeout=60.0, gate="all"):
+    """Pushes `records` into a fake Bot API feeding the real bridge and measures the result."""
+    offsets = schedule(records, speed, rate)
+    provider = FakeProviderServer(latency=latency, tokens_per_sec=tokens_per_sec).start()
+    tg = FakeTelegramServer().start()
+    scheduled, pushed_at = {}, {}
+    try:
+        with BridgeSandbox(model, provider, forced_agent=forced_agent, gate=gate):
+            app = await start_polling_app(tg, concurrency)
+            cpu_before = time.process_time()
+            start = time.perf_counter()
+            for i, (rec, offset) in enumerate(zip(records, offsets)):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                reply_to = None
+                if rec.get("reply_to_bot"):
+                    reply_to = {"message_id": 1, "date": int(time.time()),
+                                "chat": {"id": rec["chat_id"], "type": rec["chat_type"]},
+                                "from": tg._get_me(), "text": "..."}
+                update_id = tg.push_message(
+                    rec["chat_id"], f"{rec['text']} [bench:{i}]", user_id=abs(rec.get("user_id") or 1),
+                    chat_type=rec.get("chat_type"), message_id=rec.get("message_id"), reply_to=reply_to,
+                )
+                scheduled[i] = start + offset
+                pushed_at[i] = (update_id, tg.pushed[update_id])
+            _, shed = await wait_for_answers(tg, len(records), drain_timeout)
+            gated = bridge_server.GATE_COUNTS["skipped"]
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu_before
+            await stop_polling_app(app)
+    finally:
+        tg.stop()
+        provider.stop()
+
+    dispatched = {}
+    for req in provider.requests:
+        # The prompt also carries earlier markers through the shared history; the
+        # "User:" part comes last and may hold several coalesced messages
+        body = json.dumps(req["body"]) if req["body"] else ""
+        for marker in MARKER_RE.findall(body.rsplit("User:", 1)[-1]):
+            dispatched.setdefault(int(marker), req["time"])
+    replied = {}
+    for sent in tg.sent:
+        for marker in MARKER_RE.findall(sent["text"] or ""):
+            replied.setdefault(int(marker), sent["time"])
+
+    lag = [pushed_at[i][1] - scheduled[i] for i in pushed_at]
+    intake = [tg.delivered[u] - t for u, t in pushed_at.values() if u in tg.delivered]
+    dispatch = [dispatched[i] - pushed_at[i][1] for i in pushed_at if i in dispatched]
+    e2e = [replied[i] - pushed_at[i][1] for i in pushed_at if i in replied]
+
+    events = [(t, 1) for _, t in pushed_at.values()] + [(replied[i], -1) for i in replied]
+    in_flight = peak = 0
+    for _, delta in sorted(events):
+        in_flight += delta
+        peak = max(peak, in_flight)
+
+    return {
+        "messages": len(records),
+        "replies": len(replied),
+        "shed": shed,
+        "gated": gated,
+        "unanswered": len(records) - len(replied) - shed - gated,
+        "duration_s": round(elapsed, 2),
+        "offered_rate": round(len(records) / offsets[-1], 2) if offsets and offsets[-1] else None,
+        "msgs_per_sec": round(len(replied) / elapsed, 2) if elapsed else 0.0,
+        "generator_lag": latency_summary(lag),
+        "intake_delay": latency_summary(intake),
+        "dispatch_delay": latency_summary(dispatch),
+        "latency": latency_summary(e2e),
+        "peak_in_flight": peak,
+        "cpu_s": round(cpu, 3),
+        "rss_mb": round(rss_bytes() / 1e6, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded bridge traffic against local stand-ins")
+    parser.add_argument("recording", nargs="?", help="JSONL file from bridge_server.py --record")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time acceleration factor (1 = real time)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Fixed target rate in msg/s (ignores timestamps)")
+    parser.add_argument("--limit", type=int, default=0, help="Replay only the first N messages")
+    parser.add_argument("--model", default="openai/gpt-4o-mini", help="Model the stand-in agents use")
+    parser.add_argument("--agent", default=None, help="Force one agent, like bridge_server.py --agent")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stand-in provider first-token latency (s)")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Stand-in provider token rate")
+    parser.add_argument("--concurrency", type=int, default=1, help="Bridge concurrent_updates")
+    parser.add_argument("--gate", default="all", choices=["all", "addressed", "relevant"],
+                        help=f"Group gating mode (the bridge runs with {bridge_server.GROUP_GATE}; "
+                             "the replay calls the model for every message by default)")
+    parser.add_argument("--synthesize-burst", type=int, metavar="MEMBERS",
+                        help="Write a synthetic group spike recording instead of replaying")
+    parser.add_argument("-o", "--output", help="Output path for --synthesize-burst")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this JSON file")
+    args = parser.parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.synthesize_burst:
+        records = synthesize_burst(args.synthesize_burst)
+        out = args.output or "burst.jsonl"
+        with open(out, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r) + "\n")
+        print(f"Wrote {len(records)} messages to {out}")
+        return records
+    if not args.recording:
+        parser.error("a recording file is required")
+
+    records = load_recording(args.recording)
+    if args.limit:
+        records = records[:args.limit]
+    report = asyncio.run(replay(
+        records, model=args.model, speed=args.speed, rate=args.rate, latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec, concurrency=args.concurrency, forced_agent=args.agent,
+        gate=args.gate,
+    ))
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
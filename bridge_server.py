@@ -2,10 +2,19 @@ import logging
 import json
 import os
 import asyncio
-import google.generativeai as genai
 from telegram import Update
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters
+from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, TypeHandler, filters
 from dotenv import load_dotenv
+import history_store
+import history_bus
+try:
+    import memory_index  # needs numpy (optional)
+except ImportError:
+    memory_index = None
+import coalesce
+import metrics
+import providers
+import scheduler
 
 # Set up logging
 logging.basicConfig(
@@ -33,11 +42,6 @@ def load_json_config(path):
 config = load_json_config(OPENCLAW_CONFIG_PATH)
 TELEGRAM_TOKEN = config.get("channels", {}).get("telegram", {}).get("botToken") or os.getenv("TELEGRAM_TOKEN")
 
-if not TELEGRAM_TOKEN:
-    logger.error("Telegram Bot Token not found in .env or openclaw.json")
-    print("Error: No Telegram Token found.")
-    exit(1)
-
 # Agent Router Configuration
 # Agent Router Configuration
 AGENT_ROUTING = {
@@ -48,6 +52,7 @@ AGENT_ROUTING = {
     "coder": ["code", "fix", "bug", "implement", "function", "class", "viết hàm", "viết code", "sửa lỗi", "lập trình"],
 }
 DEFAULT_AGENT = "defaults" 
+FORCED_AGENT = None  # Set by --agent; None means keyword routing
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -57,146 +62,110 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='HTML'
     )
 
-def route_message(message_text: str) -> str:
-    """Determine which agent should handle the message."""
+# Routing: "keywords" (rules above) or "learned" (local classifier, falls back to the rules
+# when unsure). Train it with: python -m bench.eval_router train --data labeled.jsonl --history
+ROUTER_MODE = os.getenv("OPENCLAW_ROUTER", "keywords").lower()
+ROUTER_MODEL_PATH = os.getenv("OPENCLAW_ROUTER_MODEL") or os.path.expandvars(r"%USERPROFILE%\.openclaw\router_model.npz")
+# None: learned_router.DEFAULT_THRESHOLD (not imported here, it needs numpy)
+ROUTER_THRESHOLD = float(os.environ["OPENCLAW_ROUTER_THRESHOLD"]) if os.getenv("OPENCLAW_ROUTER_THRESHOLD") else None
+_learned_router = None  # loaded on first use; False when unavailable
+
+def route_by_keywords(message_text: str) -> str:
     message_text_lower = message_text.lower()
     for agent, keywords in AGENT_ROUTING.items():
         if any(keyword in message_text_lower for keyword in keywords):
             return agent
     return DEFAULT_AGENT
 
-def _detect_provider(model: str) -> str:
-    """Auto-detect provider from model name."""
-    m = model.lower().replace(" (free)", "").strip()
-    if m.startswith("google/") or "gemini" in m: return "google"
-    elif m.startswith("groq/") or "groq" in m or "llama" in m or "mixtral" in m: return "groq"
-    elif m.startswith("gpt-") or m.startswith("o1") or m.startswith("o3") or m.startswith("openai/"): return "openai"
-    elif m.startswith("claude") or m.startswith("anthropic/"): return "anthropic"
-    elif m.startswith("openrouter/"): return "openrouter"
-    elif m.startswith("deepseek/"): return "deepseek"
-    elif m.startswith("mistral/"): return "mistral"
-    elif m.startswith("xai/") or m.startswith("grok"): return "xai"
-    elif m.startswith("huggingface/"): return "huggingface"
-    elif m.startswith("ollama/"): return "ollama"
-    return "google"
-
-def get_api_key_for_agent(agent_name: str, config: dict, auth_profiles: dict, provided_model: str = "") -> tuple[str, str]:
-    """Retrieves (API Key, Provider) for the specific agent based on its model."""
-    provider = _detect_provider(provided_model)
-    profiles = auth_profiles.get("profiles", {})
-    api_key = None
-    
-    specific_keys = [f"{provider}:{agent_name}", f"{provider}:defaults"]
-    for candidate in specific_keys:
-        if candidate in profiles:
-            api_key = profiles[candidate].get("key") or profiles[candidate].get("apiKey")
-            if api_key: break
-            
-    if not api_key:
-        for k, v in profiles.items():
-            if isinstance(v, dict):
-                p_name = v.get("provider")
-                if p_name == provider or (":" in k and k.split(":")[0] == provider):
-                    api_key = v.get("key") or v.get("apiKey")
-                    if api_key: break
-                    
-    # Fallback cuối
-    if not api_key and provider == "google":
-        for k, v in profiles.items():
-            if isinstance(v, dict):
-                candidate_key = v.get("key") or v.get("apiKey")
-                if candidate_key:
-                    return candidate_key, provider
-                    
-    return api_key, provider
-
-async def process_with_model(agent_name: str, message_text: str, history_context: str = "") -> str:
-    """Calls the appropriate API to generate a response."""
-    current_config = load_json_config(OPENCLAW_CONFIG_PATH)
-    auth_profiles = load_json_config(AUTH_PROFILES_PATH)
-    
-    # Lấy Agent Config
-    agent_conf = current_config.get("agents", {}).get(agent_name, {})
-    if not agent_conf and agent_name == DEFAULT_AGENT:
-         agent_conf = current_config.get("agents", {}).get("defaults", {})
-         
-    model_id = agent_conf.get("model", {}).get("primary", "google/gemini-2.0-flash-thinking-exp-1219")
-    clean_model_id = model_id.replace(" (Free)", "").strip()
-    
-    api_key, provider = get_api_key_for_agent(agent_name, current_config, auth_profiles, clean_model_id)
-    
-    if provider == "ollama":
-        api_key = "dummy"
-    elif not api_key:
-        return f"[System] Lỗi: Không tìm thấy API Key cho agent '{agent_name}'. Vui lòng cấu hình trên giao diện."
+def _get_learned_router():
+    global _learned_router
+    if _learned_router is None:
+        try:
+            from learned_router import LinearRouter  # needs numpy (optional)
+            _learned_router = LinearRouter.load(ROUTER_MODEL_PATH)
+            logger.info(f"Learned router loaded from {ROUTER_MODEL_PATH} ({', '.join(_learned_router.classes)})")
+        except Exception as e:
+            logger.error(f"Learned router unavailable, using keyword routing: {e}")
+            _learned_router = False
+    return _learned_router
 
-    # Khử tiền tố model
-    if provider in ["google", "groq", "openai", "anthropic", "deepseek", "mistral", "xai", "ollama"]:
-        if "/" in clean_model_id and clean_model_id.startswith(provider + "/"):
-            clean_model_id = clean_model_id.split("/", 1)[1]
+def route_message(message_text: str) -> str:
+    """Determine which agent should handle the message."""
+    if ROUTER_MODE == "learned":
+        router = _get_learned_router()
+        if router:
+            return router.route(message_text, route_by_keywords, ROUTER_THRESHOLD)
+    return route_by_keywords(message_text)
 
-    try:
-        full_prompt = f"Context:\n{history_context}\n\nUser: {message_text}\n\nYou are {agent_name}."
-        
-        if provider == "google":
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(
-                model_name=clean_model_id, 
-                generation_config={"temperature": 0.7, "top_p": 0.95, "max_output_tokens": 8192}
-            )
-            response = await asyncio.to_thread(model.generate_content, full_prompt)
-            return response.text
-            
-        elif provider in ["openai", "groq", "openrouter", "deepseek", "mistral", "xai"]:
-            import urllib.request, json as _json
-            endpoints = {
-                "openai": "https://api.openai.com/v1/chat/completions",
-                "groq": "https://api.groq.com/openai/v1/chat/completions",
-                "openrouter": "https://openrouter.ai/api/v1/chat/completions",
-                "deepseek": "https://api.deepseek.com/chat/completions",
-                "mistral": "https://api.mistral.ai/v1/chat/completions",
-                "xai": "https://api.x.ai/v1/chat/completions"
-            }
-            data = {
-                "model": clean_model_id,
-                "messages": [{"role": "user", "content": full_prompt}],
-                "temperature": 0.7
-            }
-            headers = {
-                "Authorization": f"Bearer {api_key}", 
-                "Content-Type": "application/json",
-                "User-Agent": "OpenClawBridge/1.0"
-            }
-            if provider == "openrouter": headers["HTTP-Referer"] = "https://github.com/hoang"
-            
-            req = urllib.request.Request(endpoints[provider], data=_json.dumps(data).encode('utf-8'), headers=headers)
-            def _call():
-                with urllib.request.urlopen(req, timeout=45) as r:
-                    return _json.loads(r.read())["choices"][0]["message"]["content"]
-            
-            return await asyncio.to_thread(_call)
-            
-        elif provider == "anthropic":
-            import urllib.request, json as _json
-            data = {"model": clean_model_id, "max_tokens": 4096, "messages": [{"role": "user", "content": full_prompt}]}
-            headers = {
-                "x-api-key": api_key, 
-                "anthropic-version": "2023-06-01", 
-                "content-type": "application/json",
-                "User-Agent": "OpenClawBridge/1.0"
-            }
-            req = urllib.request.Request("https://api.anthropic.com/v1/messages", data=_json.dumps(data).encode('utf-8'), headers=headers)
-            def _call():
-                with urllib.request.urlopen(req, timeout=45) as r:
-                    return _json.loads(r.read())["content"][0]["text"]
-            return await asyncio.to_thread(_call)
-            
-        else:
-            return f"[System] Provider '{provider}' chưa được hỗ trợ trên Bridge."
+def select_agents(message_text: str, limit: int = 3) -> list:
+    """All agents whose keywords appear in the message (routing order), else the default agent."""
+    message_text_lower = message_text.lower()
+    agents = [agent for agent, keywords in AGENT_ROUTING.items() if any(k in message_text_lower for k in keywords)]
+    return agents[:limit] or [DEFAULT_AGENT]
+
+def build_prompt(agent_name: str, message_text: str, history_context: str = "", stable_context: str = ""):
+    """Splits the prompt into (system, stable, volatile) parts.
+
+    system and stable are byte-identical across consecutive requests of an
+    agent in a chat, so providers can reuse their prefix cache; everything
+    that changes per request goes into volatile, after them.
+    """
+    system = f"You are {agent_name}."
+    if stable_context:
+        stable = f"Context:\n{stable_context}"
+        volatile = f"{history_context}\n\nUser: {message_text}" if history_context else f"User: {message_text}"
+    else:
+        stable = ""
+        volatile = f"Context:\n{history_context}\n\nUser: {message_text}"
+    return system, stable, volatile
+
+def record_usage(agent_name: str, provider: str, usage: dict, latency: float):
+    labels = {"agent": agent_name, "provider": provider}
+    metrics.inc("llm.calls", **labels)
+    metrics.inc("llm.latency_ms", round(latency * 1000), **labels)
+    metrics.inc("llm.prompt_tokens", usage["prompt"], **labels)
+    metrics.inc("llm.cached_tokens", usage["cached"], **labels)
+    metrics.inc("llm.completion_tokens", usage["completion"], **labels)
+    logger.info(f"Usage {agent_name} ({provider}): prompt={usage['prompt']} cached={usage['cached']} "
+                f"completion={usage['completion']} latency={latency:.2f}s")
+
+def resolve_agent(agent_name: str, current_config: dict = None, auth_profiles: dict = None) -> providers.Target:
+    """Target(model, api_key, provider) for an agent, from openclaw.json / auth-profiles.json."""
+    if current_config is None:
+        current_config = load_json_config(OPENCLAW_CONFIG_PATH)
+    if auth_profiles is None:
+        auth_profiles = load_json_config(AUTH_PROFILES_PATH)
+    return providers.resolve(agent_name, current_config, auth_profiles)
 
+async def call_agent(agent_name: str, message_text: str, history_context: str = "", stable_context: str = "",
+                     resolved: providers.Target = None, timeout: float = None) -> providers.Completion:
+    """Calls the agent's model through the provider engine and records token usage.
+
+    Raises providers.ProviderError subclasses. `resolved` skips re-reading
+    the config. `stable_context` is history that stays identical across
+    consecutive requests (see split_context); it is sent before
+    `history_context` so provider-side prompt caching can reuse it.
+    """
+    target = resolved or resolve_agent(agent_name)
+    system, stable, volatile = build_prompt(agent_name, message_text, history_context, stable_context)
+    messages = [{"role": "user", "content": [stable, volatile] if stable else volatile}]
+    result = await providers.acomplete(target, messages, system=system, timeout=timeout)
+    record_usage(agent_name, result.provider, result.usage, result.latency)
+    return result
+
+async def process_with_model(agent_name: str, message_text: str, history_context: str = "", stable_context: str = "") -> str:
+    """Calls the appropriate API to generate a response."""
+    target = resolve_agent(agent_name)
+    try:
+        result = await call_agent(agent_name, message_text, history_context, stable_context, resolved=target)
+        return result.text
+    except providers.MissingKeyError:
+        return f"[System] Lỗi: Không tìm thấy API Key cho agent '{agent_name}'. Vui lòng cấu hình trên giao diện."
+    except providers.UnsupportedProviderError:
+        return f"[System] Provider '{target.provider}' chưa được hỗ trợ trên Bridge."
     except Exception as e:
-        logger.error(f"API Error ({provider}): {e}")
-        return f"[System] Lỗi kết nối {provider}: {str(e)}"
+        logger.error(f"API Error ({target.provider}): {e}")
+        return f"[System] Lỗi kết nối {target.provider}: {str(e)}"
 
 import argparse
 import sys
@@ -207,93 +176,457 @@ import sys
 HISTORY_DIR = os.path.expandvars(r"%USERPROFILE%\.openclaw\history")
 os.makedirs(HISTORY_DIR, exist_ok=True)
 
-def append_to_history(chat_id, sender, message):
-    """Appends a message to the shared history file."""
+# Live segment {chat_id}.txt is sealed into compressed segments by size or age
+# (in a background thread, so compressing never stalls message intake)
+HISTORY_ROTATION = {
+    "max_bytes": int(os.getenv("OPENCLAW_HISTORY_SEGMENT_BYTES", history_store.DEFAULT_MAX_BYTES)),
+    "max_age": float(os.getenv("OPENCLAW_HISTORY_SEGMENT_HOURS", 24)) * 3600,
+    "keep_segments": int(os.getenv("OPENCLAW_HISTORY_KEEP_SEGMENTS", history_store.DEFAULT_KEEP_SEGMENTS)),
+    "keep_days": float(os.getenv("OPENCLAW_HISTORY_KEEP_DAYS", history_store.DEFAULT_KEEP_DAYS)),
+    "rotate_in_background": True,
+}
+
+# History chars per prompt (see split_context), sized so that a full snapshot reaches the
+# providers' minimum cacheable prefix (OPENCLAW_CACHE_MIN_TOKENS); a smaller one is never cached
+CONTEXT_CHARS = max(2000, providers.CACHE_MIN_TOKENS * providers.CHARS_PER_TOKEN)
+
+# Recent history per chat kept in memory (write-through), bounded by a global LRU budget.
+# It always covers the 2 * CONTEXT_CHARS a prompt reads, so building one never touches the disk.
+HISTORY_CACHE = history_store.HistoryCache(
+    budget_bytes=int(os.getenv("OPENCLAW_HISTORY_CACHE_MB", 32)) * 1_000_000,
+    chat_chars=max(int(os.getenv("OPENCLAW_HISTORY_CACHE_CHARS", 0)), 2 * CONTEXT_CHARS),
+)
+
+# Retrieval memory: the prompt gets the recent history plus the top-k most similar older
+# messages (0 disables; needs numpy)
+MEMORY_TOP_K = int(os.getenv("OPENCLAW_MEMORY_TOP_K", 3))
+MEMORY_SNIPPET_CHARS = 300
+MEMORY = memory_index.MemoryIndex(
+    budget_bytes=int(os.getenv("OPENCLAW_MEMORY_MB", 64)) * 1_000_000,
+) if memory_index and MEMORY_TOP_K > 0 else None
+
+# Other bridge processes on this machine are told about appends over a localhost hub (0 disables)
+HISTORY_BUS_PORT = int(os.getenv("OPENCLAW_HISTORY_BUS_PORT", history_bus.DEFAULT_PORT))
+# Peers must prove they know this key (created on first use, readable by the owner only)
+HISTORY_BUS_KEY_PATH = os.path.expandvars(r"%USERPROFILE%\.openclaw\history_bus.key")
+HISTORY_BUS = None
+
+def _on_peer_history(record):
+    """Applies an append made by another bridge process to our cached view."""
+    if record.get("dir") != os.path.normcase(os.path.abspath(HISTORY_DIR)):
+        return
+    HISTORY_CACHE.ingest(HISTORY_DIR, record["chat_id"], record["sender"], record["message"], record.get("message_id"))
+    if MEMORY:
+        MEMORY.add(HISTORY_DIR, record["chat_id"], record["sender"], record["message"])
+
+def _on_history_resync():
+    """Appends may have been missed while the bus was down: drop in-memory views."""
+    HISTORY_CACHE.invalidate()
+    if MEMORY:
+        MEMORY.invalidate()
+
+async def start_history_bus(app=None):
+    global HISTORY_BUS
+    if not HISTORY_BUS_PORT or HISTORY_BUS:
+        return
+    HISTORY_BUS = history_bus.HistoryBus(
+        _on_peer_history, on_resync=_on_history_resync, port=HISTORY_BUS_PORT, secret_path=HISTORY_BUS_KEY_PATH
+    )
+    await HISTORY_BUS.start()
+
+async def stop_history_bus(app=None):
+    global HISTORY_BUS
+    if HISTORY_BUS:
+        await HISTORY_BUS.stop()
+        HISTORY_BUS = None
+
+def append_to_history(chat_id, sender, message, message_id=None):
+    """Appends a message to the shared history file.
+
+    With the Telegram message_id the append is recorded once however many
+    bots in the group receive the same message.
+    """
     try:
-        path = os.path.join(HISTORY_DIR, f"{chat_id}.txt")
-        timestamp = asyncio.get_event_loop().time() # Or datetime
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"[{sender}]: {message}\n")
+        written = HISTORY_CACHE.append(HISTORY_DIR, chat_id, sender, message, message_id=message_id, **HISTORY_ROTATION)
+        if written and MEMORY:
+            MEMORY.add(HISTORY_DIR, chat_id, sender, message)
+        if written and HISTORY_BUS:
+            HISTORY_BUS.publish(HISTORY_DIR, chat_id, sender, message, message_id=message_id)
     except Exception as e:
         logger.error(f"Failed to write history: {e}")
 
 def get_history(chat_id, limit=2000): # limit chars or lines? Chars for prompt context
     """Reads the last N characters of history."""
     try:
-        path = os.path.join(HISTORY_DIR, f"{chat_id}.txt")
-        if not os.path.exists(path): return ""
-        
-        with open(path, "r", encoding="utf-8") as f:
-            # Simple read all for now, maybe tail later
-            content = f.read()
-            return content[-limit:] if limit else content
+        if not limit:
+            return history_store.read_all(HISTORY_DIR, chat_id)
+        return HISTORY_CACHE.tail(HISTORY_DIR, chat_id, limit)
     except Exception as e:
         logger.error(f"Failed to read history: {e}")
         return ""
 
+# chat_id -> history snapshot sent as the cacheable prompt prefix (see split_context)
+_frozen_context = {}
+FROZEN_ANCHOR_CHARS = 200
 
+def split_context(chat_id, limit=CONTEXT_CHARS):
+    """(stable, fresh): a frozen history snapshot plus the lines appended since.
 
-# Update handle_message to use FORCED_AGENT if set
-async def handle_message_wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or not update.message.text:
-        return
+    The snapshot is replaced only once `fresh` outgrows `limit`, so over a run
+    of requests the start of the prompt stays byte-identical and providers can
+    serve it from their prompt cache. The context is limit..2*limit chars.
+    """
+    current = get_history(chat_id, limit * 2)
+    frozen = _frozen_context.get(str(chat_id))
+    if frozen:
+        anchor = frozen[-FROZEN_ANCHOR_CHARS:]
+        pos = current.rfind(anchor)
+        if pos >= 0 and len(current) - (pos + len(anchor)) <= limit:
+            return frozen, current[pos + len(anchor):]
+    start = max(0, len(current) - limit)
+    if start:  # start on a line boundary, before the limit so the snapshot is never shorter
+        start = current.rfind("\n", 0, start) + 1
+    frozen = current[start:]
+    _frozen_context[str(chat_id)] = frozen
+    return frozen, ""
 
-    chat_id = update.effective_chat.id
-    user_msg = update.message.text
-    user_name = update.effective_user.first_name
-    
-    # 1. Log incoming user message to shared history
-    append_to_history(chat_id, user_name, user_msg)
-    
+def build_context(chat_id, query, limit=CONTEXT_CHARS):
+    """(stable, volatile) prompt context: the frozen history prefix, then new lines and relevant older messages."""
+    stable, fresh = split_context(chat_id, limit)
+    if not MEMORY or not query.strip():
+        return stable, fresh
+    try:
+        hits = MEMORY.search(HISTORY_DIR, chat_id, query, k=MEMORY_TOP_K,
+                             exclude=lambda text: text in stable or text in fresh)
+    except Exception as e:
+        logger.error(f"Memory search failed: {e}")
+        return stable, fresh
+    if not hits:
+        return stable, fresh
+    snippets = "\n".join(text[:MEMORY_SNIPPET_CHARS] for _, text in hits)
+    volatile = f"Relevant earlier messages:\n{snippets}"
+    if fresh:
+        volatile += f"\n\nRecent messages:\n{fresh}"
+    return stable, volatile
+
+
+
+# Provider calls are queued per chat and served fairly (DMs/mentions first) by a fixed worker pool
+SCHEDULER_SETTINGS = {
+    "workers": int(os.getenv("OPENCLAW_SCHED_WORKERS", 4)),
+    "max_per_chat": int(os.getenv("OPENCLAW_SCHED_CHAT_QUEUE", 5)),
+    "max_total": int(os.getenv("OPENCLAW_SCHED_TOTAL_QUEUE", 200)),
+}
+SCHEDULER = None
+BUSY_MESSAGE = "⏳ Bot đang bận, vui lòng thử lại sau giây lát."
+BUSY_NOTICE_INTERVAL = 10.0  # at most one busy reply per chat in this many seconds
+_busy_notified = {}
+
+# Quick follow-up messages from one user are merged into a single request; a newer
+# message cancels that user's in-flight request (0 = dispatch without waiting)
+DEBOUNCE_SECONDS = float(os.getenv("OPENCLAW_DEBOUNCE_SECONDS", 1.0))
+DEBOUNCE_MAX_SECONDS = float(os.getenv("OPENCLAW_DEBOUNCE_MAX_SECONDS", 4.0))
+COALESCER = None
+
+# Fan-out: a message hitting several agents' keywords goes to all of them concurrently
+#   "off" (one agent per message), "each" (post answers as they finish), "merged" (one post)
+FANOUT_MODE = os.getenv("OPENCLAW_FANOUT", "off").lower()
+FANOUT_MAX_AGENTS = int(os.getenv("OPENCLAW_FANOUT_MAX_AGENTS", 3))
+FANOUT_DEADLINE = float(os.getenv("OPENCLAW_FANOUT_DEADLINE", 60))
+
+METRICS_INTERVAL = float(os.getenv("OPENCLAW_METRICS_INTERVAL", 60))
+METRICS_FILE = os.getenv("OPENCLAW_METRICS_FILE") or None
+_metrics_task = None
+
+async def on_startup(app=None):
+    global SCHEDULER, COALESCER, _metrics_task
+    GATE_COUNTS.update(passed=0, skipped=0)
+    await start_history_bus(app)
+    SCHEDULER = scheduler.FairScheduler(**SCHEDULER_SETTINGS)
+    await SCHEDULER.start()
+    COALESCER = coalesce.BurstCoalescer(
+        lambda burst: submit_burst(app.bot, burst), window=DEBOUNCE_SECONDS, max_wait=DEBOUNCE_MAX_SECONDS
+    )
+    metrics.register(COALESCER.gauges)
+    if METRICS_INTERVAL > 0:
+        _metrics_task = metrics.start_exporter(METRICS_INTERVAL, METRICS_FILE)
+
+async def on_shutdown(app=None):
+    global SCHEDULER, COALESCER, _metrics_task
+    if _metrics_task:
+        _metrics_task.cancel()
+        _metrics_task = None
+    if COALESCER:
+        COALESCER.close()
+        metrics.unregister(COALESCER.gauges)
+        COALESCER = None
+    if SCHEDULER:
+        await SCHEDULER.stop()
+        SCHEDULER = None
+    await stop_history_bus(app)
+    await asyncio.to_thread(history_store.wait_rotations, 30)
+
+# Which group messages reach the model (DMs always do):
+#   "relevant"  addressed, or the text hits this bot's routing keywords / agent name (default)
+#   "addressed" only @mentions of this bot and replies to it
+#   "all"       every text message (opt-out: one LLM call per bot per message)
+DEFAULT_GROUP_GATE = "relevant"
+GROUP_GATE = os.getenv("OPENCLAW_GROUP_GATE", DEFAULT_GROUP_GATE).lower()
+GATE_COUNTS = {"passed": 0, "skipped": 0}
+_bot_identity = {}  # bot token -> (bot id, lowercase username), filled once from get_me
+
+async def get_bot_identity(bot):
+    """This bot's (id, username), fetched with get_me at most once per Bot object."""
+    identity = _bot_identity.get(bot.token)
+    if identity is None:
+        try:
+            me = bot.bot  # cached by Application.initialize()
+        except RuntimeError:
+            me = await bot.get_me()
+        identity = _bot_identity[bot.token] = (me.id, (me.username or "").lower())
+    return identity
+
+def is_direct_message(update: Update, identity) -> bool:
+    """DMs, @mentions of this bot and replies to this bot are served before ambient group traffic."""
+    message = update.message
+    if update.effective_chat.type == "private":
+        return True
+    bot_id, username = identity
+    reply = message.reply_to_message
+    if reply and reply.from_user and reply.from_user.id == bot_id:
+        return True
+    for entity, text in message.parse_entities(["mention", "text_mention"]).items():
+        if entity.type == "text_mention" and entity.user and entity.user.id == bot_id:
+            return True
+        if username and text.lower() == f"@{username}":
+            return True
+    return False
+
+def is_relevant(message_text: str) -> bool:
+    """Cheap local check: does the text hit this bot's keywords (or, when routing, any agent's)?"""
+    text = message_text.lower()
     if FORCED_AGENT:
-        target_agent = FORCED_AGENT
+        keywords = AGENT_ROUTING.get(FORCED_AGENT, []) + [FORCED_AGENT.lower()]
     else:
-        target_agent = route_message(user_msg)
-    
-    logger.info(f"Routing message to agent: {target_agent}")
-    
+        keywords = [k for kws in AGENT_ROUTING.values() for k in kws]
+    return any(k in text for k in keywords)
+
+def passes_gate(update: Update, direct: bool) -> bool:
+    """Decides whether this bot should spend a model call on the message."""
+    if direct or GROUP_GATE == "all":
+        reason = "direct" if direct else "all"
+    elif COALESCER and COALESCER.is_open(update.effective_chat.id, update.effective_user.id):
+        reason = "continuation"  # follow-up to a burst that already passed
+    elif GROUP_GATE == "relevant" and is_relevant(update.message.text):
+        reason = "relevant"
+    else:
+        GATE_COUNTS["skipped"] += 1
+        metrics.inc("gate.skipped")
+        return False
+    GATE_COUNTS["passed"] += 1
+    metrics.inc("gate.passed", reason=reason)
+    return True
+
+async def send_busy_notice(bot, chat_id, reply_to=None):
+    now = asyncio.get_running_loop().time()
+    if now - _busy_notified.get(chat_id, -BUSY_NOTICE_INTERVAL) < BUSY_NOTICE_INTERVAL:
+        return
+    _busy_notified[chat_id] = now
+    try:
+        await bot.send_message(chat_id=chat_id, text=BUSY_MESSAGE, reply_to_message_id=reply_to)
+    except Exception as e:
+        logger.error(f"Failed to send busy notice: {e}")
+
+def format_agent_reply(agent_name, response_text):
+    if FORCED_AGENT:
+        return response_text
+    return f"<b>[{agent_name.upper()}]</b>\n{response_text}"
+
+async def send_reply(bot, chat_id, final_response):
+    try:
+        await bot.send_message(chat_id=chat_id, text=final_response, parse_mode='HTML')
+    except Exception as e:
+        await bot.send_message(chat_id=chat_id, text=final_response)
+
+async def reply_with_agent(bot, chat_id, target_agent, user_msg):
+    """Calls the agent's model with the shared history and posts the answer."""
     # Notify user we are working
-    await context.bot.send_chat_action(chat_id=chat_id, action="typing")
+    await bot.send_chat_action(chat_id=chat_id, action="typing")
     
-    # 2. Get Shared History
-    history_context = get_history(chat_id)
+    # 3. Get Shared History (recent + relevant older messages)
+    stable_context, history_context = await asyncio.to_thread(build_context, chat_id, user_msg)
     
     # Route to actual AI
-    response_text = await process_with_model(target_agent, user_msg, history_context)
+    response_text = await process_with_model(target_agent, user_msg, history_context, stable_context)
     
-    # 3. Log outgoing agent message to shared history
+    # 4. Log outgoing agent message to shared history
     append_to_history(chat_id, target_agent, response_text)
     
-    # Format response
+    await send_reply(bot, chat_id, format_agent_reply(target_agent, response_text))
+
+async def fan_out(bot, chat_id, agents, user_msg):
+    """Asks several agents concurrently under one deadline.
+
+    All agents see the same history snapshot. In "each" mode every answer is
+    posted as soon as it arrives; in "merged" mode one message is posted once
+    all have answered or the deadline passed.
+    """
+    await bot.send_chat_action(chat_id=chat_id, action="typing")
+    stable_context, history_context = await asyncio.to_thread(build_context, chat_id, user_msg)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + FANOUT_DEADLINE
+
+    async def ask(agent):
+        try:
+            response_text = await asyncio.wait_for(
+                process_with_model(agent, user_msg, history_context, stable_context), max(0.0, deadline - loop.time())
+            )
+        except asyncio.TimeoutError:
+            metrics.inc("fanout.timeouts", agent=agent)
+            response_text = f"[System] Hết thời gian chờ ({FANOUT_DEADLINE:.0f}s)."
+        else:
+            append_to_history(chat_id, agent, response_text)
+        if FANOUT_MODE != "merged":
+            try:
+                await send_reply(bot, chat_id, format_agent_reply(agent, response_text))
+            except Exception as e:  # e.g. BadRequest / flood wait: the other agents still answer
+                metrics.inc("fanout.send_errors", agent=agent)
+                logger.error(f"Fan-out: failed to send {agent}'s answer to chat {chat_id}: {e}")
+        return agent, response_text
+
+    started = loop.time()
+    results = []
+    for agent, outcome in zip(agents, await asyncio.gather(*(ask(a) for a in agents), return_exceptions=True)):
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+        if isinstance(outcome, Exception):
+            metrics.inc("fanout.errors", agent=agent)
+            logger.error(f"Fan-out: agent {agent} failed: {outcome}")
+        else:
+            results.append(outcome)
+    logger.info(f"Fan-out to {', '.join(agents)} finished in {loop.time() - started:.1f}s")
+    if FANOUT_MODE == "merged" and results:
+        await send_reply(bot, chat_id, "\n\n".join(format_agent_reply(a, text) for a, text in results))
+
+def pick_agents(user_msg):
     if FORCED_AGENT:
-         final_response = response_text 
+        return [FORCED_AGENT]
+    if FANOUT_MODE in ("each", "merged"):
+        return select_agents(user_msg, FANOUT_MAX_AGENTS)
+    return [route_message(user_msg)]
+
+async def answer_message(bot, chat_id, user_msg, agents=None):
+    """Routes a (possibly coalesced) message to one agent, or fans out to several.
+
+    `agents` skips routing when the caller already picked them for this text.
+    """
+    agents = agents or pick_agents(user_msg)
+    logger.info(f"Routing message to agent(s): {', '.join(agents)}")
+    if len(agents) == 1:
+        await reply_with_agent(bot, chat_id, agents[0], user_msg)
     else:
-         final_response = f"<b>[{target_agent.upper()}]</b>\n{response_text}"
+        metrics.inc("fanout.requests")
+        await fan_out(bot, chat_id, agents, user_msg)
+
+async def answer_burst(bot, burst):
+    if len(burst.parts) > 1:
+        logger.info(f"Answering {len(burst.parts)} coalesced messages for chat {burst.chat_id}")
+    text = burst.text
+    # Routed when queued; only route again if more messages joined the burst since
+    agents = burst.routing[1] if burst.routing and burst.routing[0] == text else None
+    await answer_message(bot, burst.chat_id, text, agents)
+
+def submit_burst(bot, burst):
+    """Queues a coalesced burst once its debounce window has closed."""
+    reply_to = burst.message_ids[-1] if burst.message_ids else None
+    text = burst.text
+    burst.routing = (text, pick_agents(text))
+
+    def on_shed():
+        COALESCER.finish(burst)
+        return send_busy_notice(bot, burst.chat_id, reply_to)
+
+    SCHEDULER.submit(scheduler.Job(
+        burst.chat_id,
+        scheduler.PRIORITY_DIRECT if burst.direct else scheduler.PRIORITY_AMBIENT,
+        run=lambda: COALESCER.run(burst, lambda b: answer_burst(bot, b)),
+        on_shed=on_shed,
+        cost=(1 + len(text) // 1000) * len(burst.routing[1]),
+    ))
+
+# Update handle_message to use FORCED_AGENT if set
+async def handle_message_wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not update.message or not update.message.text:
+        return
+
+    chat_id = update.effective_chat.id
+    user_msg = update.message.text
+    user_name = update.effective_user.first_name
     
-    try:
-        await context.bot.send_message(chat_id=chat_id, text=final_response, parse_mode='HTML')
-    except Exception as e:
-        await context.bot.send_message(chat_id=chat_id, text=final_response)
+    # 1. Log incoming user message to shared history (once per message across all bots)
+    append_to_history(chat_id, user_name, user_msg, message_id=update.message.message_id)
+
+    # 2. Only spend a model call when this bot is addressed (history above is kept either way)
+    bot = context.bot
+    direct = is_direct_message(update, await get_bot_identity(bot))
+    if not passes_gate(update, direct):
+        return
+
+    if SCHEDULER is None or COALESCER is None:
+        await answer_message(bot, chat_id, user_msg)
+        return
+
+    # Collect the message into this user's burst; the handler returns at once so intake keeps up
+    COALESCER.add(chat_id, update.effective_user.id, user_msg, message_id=update.message.message_id, direct=direct)
+
+def build_application(token, base_url=None, concurrent_updates=False, recorder=None):
+    """Builds the Telegram application with the bridge handlers registered."""
+    builder = (
+        ApplicationBuilder().token(token).concurrent_updates(concurrent_updates)
+        .post_init(on_startup).post_shutdown(on_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    app = builder.build()
+    if recorder:
+        # Group -1 runs before the bridge handlers and does not block them
+        app.add_handler(TypeHandler(Update, recorder.handle_update), group=-1)
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message_wrapper))
+    return app
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="OpenClaw Telegram Bridge")
     parser.add_argument("--agent", type=str, help="Specific agent ID to run exclusively (e.g., ap1)", default=None)
     parser.add_argument("--token", type=str, help="Telegram Bot Token", default=None)
+    parser.add_argument("--record", type=str, help="Record anonymized incoming updates to this JSONL file", default=None)
+    parser.add_argument("--fanout", choices=["off", "each", "merged"], help="Send multi-topic messages to every matching agent", default=None)
     args = parser.parse_args()
 
     # If --agent is provided, this instance will ONLY route to that agent
     FORCED_AGENT = args.agent
     if args.token:
         TELEGRAM_TOKEN = args.token
+    if args.fanout:
+        FANOUT_MODE = args.fanout
+
+    if not TELEGRAM_TOKEN:
+        logger.error("Telegram Bot Token not found in .env or openclaw.json")
+        print("Error: No Telegram Token found.")
+        exit(1)
 
     if FORCED_AGENT:
         logger.info(f"Target Agent FORCED to: {FORCED_AGENT.upper()}")
         
     print(f"[{FORCED_AGENT or 'Default Bot'}] Requesting start...")
     try:
-        app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
-        app.add_handler(CommandHandler("start", start))
-        app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message_wrapper))
+        recorder = None
+        if args.record:
+            from traffic_recorder import UpdateRecorder
+            keywords = [k for kws in AGENT_ROUTING.values() for k in kws]
+            recorder = UpdateRecorder(args.record, keywords=keywords)
+            logger.info(f"Recording incoming updates to {args.record}")
+        app = build_application(TELEGRAM_TOKEN, recorder=recorder)
         
         logger.info("Application configured. Starting polling...")
         print(f"[{FORCED_AGENT or 'Default Bot'}] Started.")
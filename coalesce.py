@@ -0,0 +1,145 @@
+"""Per-user burst coalescing in front of the scheduler.
+
+People often type one thought as several quick messages. Messages from the
+same user in the same chat are collected into a Burst; the burst is
+dispatched once nobody has added to it for `window` seconds (or `max_wait`
+after its first message), so the provider sees one request and answers the
+whole thought.
+
+A burst keeps absorbing messages while it waits in the scheduler queue, since
+its text is only read when a worker picks it up. If the user writes again
+while the request is already running, that request is superseded: its task is
+cancelled (no stale reply is posted or logged) and its messages are carried
+into the new burst.
+"""
+import asyncio
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WAITING, QUEUED, RUNNING, DONE = "waiting", "queued", "running", "done"
+
+
+class Burst:
+    __slots__ = ("chat_id", "user_id", "parts", "message_ids", "direct", "state", "task", "timer", "first_at",
+                 "routing")
+
+    def __init__(self, chat_id, user_id):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.parts = []
+        self.message_ids = []
+        self.direct = False
+        self.state = WAITING
+        self.task = None
+        self.timer = None
+        self.first_at = time.monotonic()
+        self.routing = None  # (text, agents) decided when the burst was queued; stale once text grows
+
+    @property
+    def text(self):
+        return "\n".join(self.parts)
+
+    def add(self, text, message_id=None, direct=False):
+        self.parts.append(text)
+        if message_id is not None:
+            self.message_ids.append(message_id)
+        self.direct = self.direct or direct
+
+
+class BurstCoalescer:
+    def __init__(self, dispatch, window=1.0, max_wait=None, max_parts=8):
+        self.dispatch = dispatch  # called with a Burst once its debounce window closes
+        self.window = window
+        self.max_wait = max_wait if max_wait is not None else window * 4
+        self.max_parts = max_parts
+        self._open = {}  # (chat_id, user_id) -> newest Burst
+        self.merged = 0
+        self.cancelled = 0
+
+    def add(self, chat_id, user_id, text, message_id=None, direct=False):
+        """Adds a message; returns the Burst it joined."""
+        key = (chat_id, user_id)
+        burst = self._open.get(key)
+        if burst and burst.state in (WAITING, QUEUED) and len(burst.parts) < self.max_parts:
+            burst.add(text, message_id, direct)
+            self.merged += 1
+            metrics.inc("coalesce.merged")
+            logger.info(f"Coalesced message into pending burst for chat {chat_id} ({len(burst.parts)} parts)")
+            if burst.state == WAITING:
+                self._arm(burst)
+            return burst
+
+        new = Burst(chat_id, user_id)
+        if burst and burst.state == RUNNING and burst.task and not burst.task.done():
+            # Superseded: drop the in-flight answer and answer everything together
+            burst.task.cancel()
+            burst.state = DONE
+            self.cancelled += 1
+            metrics.inc("coalesce.cancelled")
+            logger.info(f"Cancelled superseded request for chat {chat_id} ({len(burst.parts)} parts carried over)")
+            new.parts = burst.parts[-(self.max_parts - 1):]
+            new.message_ids = list(burst.message_ids)
+            new.direct = burst.direct
+        new.add(text, message_id, direct)
+        self._open[key] = new
+        self._arm(new)
+        return new
+
+    def is_open(self, chat_id, user_id):
+        """True while this user has a burst waiting, queued or running in the chat."""
+        burst = self._open.get((chat_id, user_id))
+        return burst is not None and burst.state != DONE
+
+    def _arm(self, burst):
+        if burst.timer:
+            burst.timer.cancel()
+        delay = min(self.window, max(0.0, burst.first_at + self.max_wait - time.monotonic()))
+        burst.timer = asyncio.get_running_loop().call_later(delay, self._fire, burst)
+
+    def _fire(self, burst):
+        burst.timer = None
+        if burst.state != WAITING:
+            return
+        burst.state = QUEUED
+        self.dispatch(burst)
+
+    async def run(self, burst, work):
+        """Runs `await work(burst)` as its own task so a newer message can cancel it."""
+        if burst.state != QUEUED:
+            return None
+        burst.state = RUNNING
+        task = burst.task = asyncio.create_task(work(burst))
+        try:
+            await asyncio.wait([task])
+        except asyncio.CancelledError:  # the worker itself is shutting down
+            task.cancel()
+            raise
+        finally:
+            self.finish(burst)
+        if task.cancelled():
+            return None
+        return task.result()
+
+    def finish(self, burst):
+        burst.state = DONE
+        burst.task = None
+        key = (burst.chat_id, burst.user_id)
+        if self._open.get(key) is burst:
+            del self._open[key]
+        if burst.timer:
+            burst.timer.cancel()
+            burst.timer = None
+
+    def close(self):
+        for burst in list(self._open.values()):
+            self.finish(burst)
+
+    def gauges(self):
+        return {
+            "coalesce.pending": sum(1 for b in self._open.values() if b.state in (WAITING, QUEUED)),
+            "coalesce.running": sum(1 for b in self._open.values() if b.state == RUNNING),
+        }
@@ -0,0 +1,353 @@
+"""Safe, cheap persistence for openclaw.json / auth-profiles.json.
+
+atomic_write_json() writes to a temp file in the same directory, fsyncs it
+and renames it over the target. A running bridge reading the file sees the
+old or the new version, never half of one. Content identical to what is on
+disk is not written at all.
+
+ConfigSaver coalesces rapid saves: save() marks a file dirty and the JSON is
+serialized once, `delay` seconds after the last call (or right away with
+immediate=True / flush()).
+
+BackupStore keeps the version being replaced, content-addressed: each
+distinct content is stored once, gzipped, under objects/<sha256>. index.jsonl
+records when each file had which content. Retention is time-bucketed: one
+version per minute for the last hour, per hour for a day, per day for a
+month, per week for a year. Versions outside those buckets, and objects no
+version refers to, are deleted.
+
+FileWatcher notices when another program (add-agent.js, an editor) changes
+a file, by polling its stat; content we wrote or loaded ourselves is
+recognised by hash and not reported. merge() folds such a change into the
+in-memory config against the version last seen on disk, key by key, and
+lists the keys both sides changed differently.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# (age limit in seconds, bucket size in seconds): keep the newest version per bucket
+RETENTION = [
+    (3600, 60),
+    (86400, 3600),
+    (30 * 86400, 86400),
+    (365 * 86400, 7 * 86400),
+]
+_LEGACY_BACKUP_RE = re.compile(r"^(openclaw|auth-profiles)_(\d{8}_\d{6})\.json$")
+_MISSING = object()  # merge(): key absent on that side
+
+
+def dumps(data):
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+def _sha(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def atomic_write_bytes(path, content, retries=5):
+    """Replaces `path` with `content` atomically; returns False if it already had that content."""
+    if _read(path) == content:
+        return False
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        try:  # mkstemp creates the file 0600: keep the permissions the target had
+            os.chmod(tmp, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(retries):
+            try:
+                os.replace(tmp, path)
+                break
+            except PermissionError:  # Windows: a reader has the file open right now
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def atomic_write_json(path, data):
+    return atomic_write_bytes(path, dumps(data))
+
+
+def merge(base, mine, theirs, prefer_mine=True, path=()):
+    """Three-way merge of JSON values; returns (merged, conflicts).
+
+    `base` is what was last read from / written to disk, `mine` the edited
+    copy, `theirs` the file now. Dicts are merged per key, anything else is
+    taken whole. A key changed differently on both sides is a conflict
+    (path, mine, theirs); `prefer_mine` decides which value it gets. Keys
+    missing on one side are passed as the _MISSING sentinel.
+    """
+    if mine == theirs or theirs == base:
+        return mine, []
+    if mine == base:
+        return theirs, []
+    if isinstance(mine, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged, conflicts = {}, []
+        for key in list(mine) + [k for k in theirs if k not in mine]:
+            value, sub = merge(base.get(key, _MISSING), mine.get(key, _MISSING), theirs.get(key, _MISSING),
+                               prefer_mine, path + (key,))
+            conflicts += sub
+            if value is not _MISSING:
+                merged[key] = value
+        return merged, conflicts
+    return (mine if prefer_mine else theirs), [(path, mine, theirs)]
+
+
+class FileWatcher:
+    """Reports files whose content changed since we last read or wrote them."""
+
+    def __init__(self, paths=()):
+        self._stat = {}  # path -> (mtime_ns, size, inode) last seen
+        self._sha = {path: None for path in paths}  # path -> hash of the content we know
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def remember(self, path, content):
+        """Records `content` (bytes, or None for no file) as our own view of `path`."""
+        self._sha[path] = _sha(content) if content is not None else None
+        self._stat[path] = self._signature(path)
+
+    def changed(self):
+        """[(path, content)] of files changed by someone else; content is None if the file is gone."""
+        changes = []
+        for path, known in self._sha.items():
+            signature = self._signature(path)
+            if signature == self._stat.get(path):
+                continue  # a stat per file and poll: cheap enough to run every second
+            self._stat[path] = signature
+            content = _read(path) if signature else None
+            if (_sha(content) if content is not None else None) != known:
+                changes.append((path, content))
+        return changes
+
+
+class BackupStore:
+    def __init__(self, backup_dir, retention=RETENTION):
+        self.backup_dir = backup_dir
+        self.retention = retention
+        self._objects = os.path.join(backup_dir, "objects")
+        self._index_path = os.path.join(backup_dir, "index.jsonl")
+        self._lock = threading.Lock()
+        self._entries = None  # [{"time", "name", "sha"}], oldest first
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = []
+            try:
+                with open(self._index_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self._entries.append(json.loads(line))
+                        except ValueError:  # cut short by a crash
+                            continue
+            except FileNotFoundError:
+                pass
+        return self._entries
+
+    def _object_path(self, sha):
+        return os.path.join(self._objects, sha[:2], sha + ".json.gz")
+
+    def add(self, name, content, when=None):
+        """Records `content` as a version of `name`; stores it only if this content is new."""
+        sha = _sha(content)
+        with self._lock:
+            entries = self._load()
+            last = next((e for e in reversed(entries) if e["name"] == name), None)
+            if last and last["sha"] == sha:
+                return sha
+            obj = self._object_path(sha)
+            if not os.path.exists(obj):
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                atomic_write_bytes(obj, gzip.compress(content))
+            entry = {"time": when or time.time(), "name": name, "sha": sha}
+            entries.append(entry)
+            os.makedirs(self.backup_dir, exist_ok=True)
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return sha
+
+    def versions(self, name):
+        """[(time, sha)] of a file, newest first."""
+        with self._lock:
+            return [(e["time"], e["sha"]) for e in reversed(self._load()) if e["name"] == name]
+
+    def read(self, sha):
+        with open(self._object_path(sha), "rb") as f:
+            return gzip.decompress(f.read())
+
+    def prune(self, now=None):
+        """Applies the retention buckets; returns how many versions were dropped."""
+        now = now or time.time()
+        with self._lock:
+            entries = self._load()
+            keep, seen = [], set()
+            for e in sorted(entries, key=lambda e: e["time"], reverse=True):
+                age = now - e["time"]
+                if (e["name"], "latest") not in seen:  # newest version of a file: always kept
+                    bucket = (e["name"], "latest")
+                else:
+                    tier = next((i for i, (limit, _) in enumerate(self.retention) if age < limit), None)
+                    if tier is None:
+                        continue
+                    bucket = (e["name"], tier, int(e["time"] // self.retention[tier][1]))
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.append(e)
+            dropped = len(entries) - len(keep)
+            if not dropped:
+                return 0
+            keep.reverse()
+            atomic_write_bytes(self._index_path, "".join(json.dumps(e) + "\n" for e in keep).encode("utf-8"))
+            self._entries = keep
+            live = {e["sha"] for e in keep}
+            for root, _, files in os.walk(self._objects):
+                for fname in files:
+                    if fname.endswith(".json.gz") and fname[:-8] not in live:
+                        os.remove(os.path.join(root, fname))
+        return dropped
+
+    def import_legacy(self):
+        """Moves old timestamped copies (openclaw_YYYYmmdd_HHMMSS.json) into the store."""
+        try:
+            names = sorted(os.listdir(self.backup_dir))
+        except FileNotFoundError:
+            return 0
+        moved = 0
+        for fname in names:
+            match = _LEGACY_BACKUP_RE.match(fname)
+            if not match:
+                continue
+            path = os.path.join(self.backup_dir, fname)
+            when = datetime.strptime(match.group(2), "%Y%m%d_%H%M%S").timestamp()
+            self.add(match.group(1) + ".json", _read(path), when)
+            os.remove(path)
+            moved += 1
+        return moved
+
+
+class ConfigSaver:
+    """Debounced, atomic saves of JSON files, backing up the version each write replaces.
+
+    `schedule(seconds, fn)` / `cancel(handle)` default to threading.Timer;
+    the GUI passes Tk's after() so that serialization runs on its thread.
+    """
+
+    def __init__(self, backups=None, delay=0.5, schedule=None, cancel=None, on_error=None,
+                 before_flush=None, on_saved=None):
+        self.backups = backups
+        self.delay = delay
+        self._schedule = schedule or self._timer
+        self._cancel = cancel or (lambda timer: timer.cancel())
+        self.on_error = on_error  # called with (path, exception) for failed debounced saves
+        self.before_flush = before_flush  # e.g. pick up external edits before overwriting them
+        self.on_saved = on_saved  # called with (path, content) once the file holds `content`
+        self._dirty = {}  # path -> callable returning the data to write
+        self._handle = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _timer(seconds, fn):
+        timer = threading.Timer(seconds, fn)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def save(self, path, get_data, immediate=False):
+        """Marks `path` for saving with get_data(); immediate=True writes now and raises on error."""
+        with self._lock:
+            self._dirty[path] = get_data
+            if self._handle is not None:
+                self._cancel(self._handle)
+                self._handle = None
+            if not immediate:
+                self._handle = self._schedule(self.delay, self._flush_debounced)
+        if immediate:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return list(self._dirty)
+
+    def _flush_debounced(self):
+        with self._lock:
+            self._handle = None
+        _, errors = self._write_dirty()
+        for path, e in errors:  # nobody is waiting on this write: report it here
+            if self.on_error:
+                self.on_error(path, e)
+
+    def flush(self):
+        """Writes every dirty file now; returns the paths actually changed on disk, raises the first error."""
+        written, errors = self._write_dirty()
+        if errors:
+            raise errors[0][1]
+        return written
+
+    def _write_dirty(self):
+        if self.before_flush:
+            self.before_flush()
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            if self._handle is not None:
+                self._cancel(self._handle)
+                self._handle = None
+        written, errors = [], []
+        for path, get_data in dirty.items():
+            try:
+                content = dumps(get_data())
+                if self.backups is not None:
+                    old = _read(path)
+                    if old is not None and old != content:
+                        self.backups.add(os.path.basename(path), old)
+                if atomic_write_bytes(path, content):
+                    written.append(path)
+                if self.on_saved:
+                    self.on_saved(path, content)
+            except Exception as e:
+                logger.error(f"Saving {path} failed: {e}")
+                errors.append((path, e))
+        if written and self.backups is not None:
+            try:
+                self.backups.prune()
+            except OSError as e:
+                logger.warning(f"Backup pruning failed: {e}")
+        return written, errors
@@ -0,0 +1,255 @@
+"""Local pub/sub channel for history appends between bridge processes.
+
+Every bridge process serving bots in the same Telegram group writes to the
+same `{chat_id}.txt`. Instead of re-reading the file, processes broadcast
+each appended record over a localhost TCP hub (TCP rather than a Unix
+socket so it also works on Windows):
+
+- the first process to bind 127.0.0.1:<port> becomes the hub,
+- the others connect to it as clients,
+- the hub relays every record to all other peers,
+- if the hub goes away, the survivors race to become the new hub.
+
+Any local process can reach a localhost port, so every connection starts
+with a mutual challenge-response over a shared secret (a random key in
+~/.openclaw/history_bus.key, created readable by the owner only):
+
+    client -> hub   {"hello": <client nonce>}
+    hub -> client   {"challenge": <hub nonce>, "proof": HMAC(key, "hub" + client nonce)}
+    client -> hub   {"proof": HMAC(key, "peer" + hub nonce)}
+    hub -> client   {"welcome": true}      (the client now receives every relayed record)
+
+A peer that fails it is dropped, and a client does not trust a "hub" that
+cannot prove it knows the key (e.g. another program squatting the port).
+
+Records are JSON lines:
+    {"node": ..., "dir": ..., "chat_id": ..., "sender": ..., "message": ..., "message_id": ...}
+Records may be missed while reconnecting, so `on_resync` is called after
+every (re)connection to let the caller drop cached state.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 47821
+DEFAULT_SECRET_PATH = os.path.join(os.path.expanduser("~"), ".openclaw", "history_bus.key")
+MAX_LINE = 1 << 20
+HANDSHAKE_TIMEOUT = 5.0
+
+
+def load_secret(path=DEFAULT_SECRET_PATH):
+    """The shared bus key, created (owner read/write only) by the first process that needs it."""
+    for _ in range(50):
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                key = f.read().strip()
+            if key:
+                return bytes.fromhex(key)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                continue  # another process is creating it
+            with os.fdopen(fd, "w", encoding="ascii") as f:
+                f.write(os.urandom(32).hex())
+            continue
+        time.sleep(0.02)  # created but not written yet
+    raise RuntimeError(f"Could not read history bus key {path}")
+
+
+def _proof(secret, role, nonce):
+    return hmac.new(secret, role.encode("ascii") + bytes.fromhex(nonce), hashlib.sha256).hexdigest()
+
+
+async def _read_json(reader):
+    line = await asyncio.wait_for(reader.readline(), HANDSHAKE_TIMEOUT)
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("bad handshake")
+    return data
+
+
+class HistoryBus:
+    def __init__(self, on_record, on_resync=None, host="127.0.0.1", port=DEFAULT_PORT, secret=None,
+                 secret_path=DEFAULT_SECRET_PATH):
+        self.on_record = on_record
+        self.on_resync = on_resync
+        self.host = host
+        self.port = port
+        self.secret = secret if secret is not None else load_secret(secret_path)
+        self.node = uuid.uuid4().hex
+        self.is_hub = False
+        self.published = 0
+        self.received = 0
+        self._loop = None
+        self._server = None
+        self._peers = set()  # hub: client writers
+        self._writer = None  # client: connection to the hub
+        self._task = None
+        self._closing = False
+
+    # ── lifecycle ──
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        await self._connect()
+
+    async def _connect(self):
+        while not self._closing:
+            try:
+                self._server = await asyncio.start_server(self._serve_peer, self.host, self.port, limit=MAX_LINE)
+                self.is_hub = True
+                logger.info(f"History bus: hub on {self.host}:{self.port}")
+                break
+            except OSError:
+                pass
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE)
+            except OSError:
+                await asyncio.sleep(random.uniform(0.05, 0.3))
+                continue
+            try:
+                await self._client_handshake(reader, writer)
+            except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                logger.warning(f"History bus: {self.host}:{self.port} failed authentication ({e}), retrying")
+                await asyncio.sleep(random.uniform(0.5, 2.0))
+                continue
+            else:
+                self._writer = writer
+                self.is_hub = False
+                self._task = asyncio.create_task(self._read_hub(reader))
+                logger.info(f"History bus: joined hub on {self.host}:{self.port}")
+                break
+        if self.on_resync and not self._closing:
+            self.on_resync()
+
+    async def stop(self):
+        self._closing = True
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        for w in list(self._peers):
+            w.close()
+        self._peers.clear()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self.is_hub = False
+
+    # ── publishing ──
+    def publish(self, base_dir, chat_id, sender, message, message_id=None):
+        """Broadcasts one appended record (safe to call from any thread)."""
+        if self._loop is None or self._closing:
+            return
+        line = (json.dumps({
+            "node": self.node, "dir": os.path.normcase(os.path.abspath(base_dir)),
+            "chat_id": str(chat_id), "sender": sender, "message": message, "message_id": message_id,
+        }, ensure_ascii=False) + "\n").encode("utf-8")
+        self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._send(line)
+        else:
+            self._loop.call_soon_threadsafe(self._send, line)
+
+    def _send(self, line, exclude=None):
+        if self.is_hub:
+            for w in list(self._peers):
+                if w is not exclude and not w.is_closing():
+                    w.write(line)
+        elif self._writer and not self._writer.is_closing():
+            self._writer.write(line)
+
+    # ── authentication ──
+    async def _client_handshake(self, reader, writer):
+        nonce = os.urandom(16).hex()
+        writer.write((json.dumps({"hello": nonce}) + "\n").encode("ascii"))
+        await writer.drain()
+        reply = await _read_json(reader)
+        if not hmac.compare_digest(str(reply.get("proof", "")), _proof(self.secret, "hub", nonce)):
+            raise ValueError("hub did not prove the key")
+        proof = _proof(self.secret, "peer", str(reply.get("challenge", "")))
+        writer.write((json.dumps({"proof": proof}) + "\n").encode("ascii"))
+        await writer.drain()
+        if (await _read_json(reader)).get("welcome") is not True:
+            raise ValueError("hub refused the key")
+
+    async def _hub_handshake(self, reader, writer):
+        hello = await _read_json(reader)
+        challenge = os.urandom(16).hex()
+        proof = _proof(self.secret, "hub", str(hello.get("hello", "")))
+        writer.write((json.dumps({"challenge": challenge, "proof": proof}) + "\n").encode("ascii"))
+        await writer.drain()
+        reply = await _read_json(reader)
+        if not hmac.compare_digest(str(reply.get("proof", "")), _proof(self.secret, "peer", challenge)):
+            raise ValueError("peer did not prove the key")
+        self._peers.add(writer)
+        writer.write(b'{"welcome": true}\n')
+
+    # ── receiving ──
+    def _deliver(self, line):
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            return
+        if rec.get("node") == self.node:
+            return
+        self.received += 1
+        try:
+            self.on_record(rec)
+        except Exception as e:
+            logger.error(f"History bus handler failed: {e}")
+
+    async def _serve_peer(self, reader, writer):
+        try:
+            await self._hub_handshake(reader, writer)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"History bus: rejected unauthenticated peer ({e})")
+            writer.close()
+            return
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._deliver(line)
+                self._send(line, exclude=writer)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _read_hub(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._deliver(line)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            return
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if not self._closing:
+            logger.warning("History bus: hub disconnected, reconnecting")
+            await self._connect()
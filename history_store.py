@@ -0,0 +1,654 @@
+"""Segmented on-disk storage for the shared chat history.
+
+Layout inside the history directory:
+
+    {chat_id}.txt                         live segment (appended to, as before)
+    segments/{chat_id}/index.json         per-chat segment index
+    segments/{chat_id}/000001.txt.gz      sealed, gzip-compressed segments
+    segments/{chat_id}/seen.txt           Telegram message ids already recorded
+    segments/{chat_id}/chat.lock          held while the live segment is written or swapped
+
+The live segment is sealed when it grows past `max_bytes` or gets older than
+`max_age` seconds. Each index entry records the segment's line range
+(`first_line`, `lines`) and its byte range in the uncompressed history
+stream (`first_offset`, `bytes`). Retention drops the oldest sealed
+segments beyond `keep_segments` or older than `keep_days`; segments split
+out of an oversized history file written before segmentation existed are
+flagged `migrated` and do not count against `keep_segments`.
+
+Several bridge processes may share one history directory. Every write to
+the live segment happens under the chat's lock file, so it always ends on a
+line boundary. Rotation (under the index lock) compresses the live segment up
+to that point without holding the chat lock, then briefly takes it to move
+the lines appended meanwhile into a fresh live segment. The index is
+replaced atomically.
+"""
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 1_000_000
+DEFAULT_MAX_AGE = 24 * 3600
+DEFAULT_KEEP_SEGMENTS = 50
+DEFAULT_KEEP_DAYS = 90
+
+LOCK_STALE_AFTER = 30.0  # a holder refreshes its lock's mtime more often than this (see _FileLock.refresh)
+
+# Per-chat dedupe index of Telegram message ids (segments/{chat_id}/seen.txt)
+SEEN_KEEP = 2048
+
+# (base_dir, chat_id) -> live segment start time, to avoid reading the index on every append
+_live_started = {}
+# (base_dir, chat_id) -> ((size, mtime_ns), ids) of the dedupe index
+_seen = {}
+# (base_dir, chat_id) -> rotation thread started by append_line(rotate_in_background=True)
+_rotations = {}
+_rotations_lock = threading.Lock()
+
+
+def live_path(base_dir, chat_id):
+    return os.path.join(base_dir, f"{chat_id}.txt")
+
+
+def segment_dir(base_dir, chat_id):
+    return os.path.join(base_dir, "segments", str(chat_id))
+
+
+def _index_path(base_dir, chat_id):
+    return os.path.join(segment_dir(base_dir, chat_id), "index.json")
+
+
+def _chat_lock_path(base_dir, chat_id):
+    return os.path.join(segment_dir(base_dir, chat_id), "chat.lock")
+
+
+class _FileLock:
+    """Cross-process lock via O_EXCL lock files (works on Windows and POSIX)."""
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(self._fd, str(os.getpid()).encode("ascii"))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE_AFTER:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Could not acquire {self.path}")
+                time.sleep(0.01)
+
+    def refresh(self):
+        """Marks a long-held lock as alive so other processes don't break it as stale."""
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
+
+    def __exit__(self, *exc):
+        os.close(self._fd)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def load_index(base_dir, chat_id):
+    """Returns {"segments": [...], "live_started": ts} (empty index if none)."""
+    try:
+        with open(_index_path(base_dir, chat_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"segments": [], "live_started": None}
+
+
+def _save_index(base_dir, chat_id, index):
+    path = _index_path(base_dir, chat_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _seen_path(base_dir, chat_id):
+    return os.path.join(segment_dir(base_dir, chat_id), "seen.txt")
+
+
+def _load_seen(base_dir, chat_id):
+    """Message ids already recorded for a chat (re-read only when the file changed)."""
+    path = _seen_path(base_dir, chat_id)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return set(), path
+    key = (base_dir, str(chat_id))
+    cached = _seen.get(key)
+    if cached and cached[0] == (st.st_size, st.st_mtime_ns):
+        return cached[1], path
+    with open(path, "r", encoding="utf-8") as f:
+        ids = {line.strip() for line in f if line.strip()}
+    _seen[key] = ((st.st_size, st.st_mtime_ns), ids)
+    return ids, path
+
+
+def _write_line_once(base_dir, chat_id, line, message_id):
+    """Appends `line` unless `message_id` was already recorded by any process.
+
+    Returns (written, live segment size).
+    """
+    os.makedirs(segment_dir(base_dir, chat_id), exist_ok=True)
+    with _FileLock(_chat_lock_path(base_dir, chat_id)):
+        ids, seen_path = _load_seen(base_dir, chat_id)
+        mid = str(message_id)
+        if mid in ids:
+            return False, None
+        with open(live_path(base_dir, chat_id), "a", encoding="utf-8") as f:
+            f.write(line)
+            size = f.tell()
+        ids = set(ids)
+        ids.add(mid)
+        if len(ids) > 2 * SEEN_KEEP:
+            # Telegram message ids grow per chat, so the newest ones are the ones still in flight
+            ids = set(sorted(ids, key=lambda x: (len(x), x))[-SEEN_KEEP:])
+            tmp = f"{seen_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("\n".join(ids) + "\n")
+            os.replace(tmp, seen_path)
+        else:
+            with open(seen_path, "a", encoding="utf-8") as f:
+                f.write(mid + "\n")
+        st = os.stat(seen_path)
+        _seen[(base_dir, str(chat_id))] = ((st.st_size, st.st_mtime_ns), ids)
+        return True, size
+
+
+def append_line(base_dir, chat_id, line, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE,
+                keep_segments=DEFAULT_KEEP_SEGMENTS, keep_days=DEFAULT_KEEP_DAYS, message_id=None,
+                rotate_in_background=False):
+    """Appends one line to the live segment, rotating it when the policy says so.
+
+    With a `message_id` the append is idempotent across processes: a line for
+    an id already in the chat's dedupe index is skipped. Returns False when
+    the line was skipped. With `rotate_in_background` a due rotation runs in
+    a thread (one per chat at a time) instead of delaying the caller.
+    """
+    if message_id is not None:
+        written, size = _write_line_once(base_dir, chat_id, line, message_id)
+        if not written:
+            return False
+    else:
+        os.makedirs(segment_dir(base_dir, chat_id), exist_ok=True)
+        with _FileLock(_chat_lock_path(base_dir, chat_id)):
+            with open(live_path(base_dir, chat_id), "a", encoding="utf-8") as f:
+                f.write(line)
+                size = f.tell()
+
+    key = (base_dir, str(chat_id))
+    started = _live_started.get(key)
+    if started is None:
+        started = load_index(base_dir, chat_id).get("live_started")
+        if started is None:
+            started = time.time()
+            _update_live_started(base_dir, chat_id, started)
+        _live_started[key] = started
+
+    too_big = max_bytes and size >= max_bytes
+    too_old = max_age and time.time() - started >= max_age
+    if too_big or too_old:
+        policy = dict(max_bytes=max_bytes, max_age=max_age, keep_segments=keep_segments, keep_days=keep_days)
+        if rotate_in_background:
+            _start_rotation(base_dir, chat_id, policy)
+        else:
+            rotate(base_dir, chat_id, **policy)
+    return True
+
+
+def _start_rotation(base_dir, chat_id, policy):
+    key = (base_dir, str(chat_id))
+
+    def _run():
+        try:
+            rotate(base_dir, chat_id, **policy)
+        except Exception as e:
+            logger.error(f"History rotation failed for {chat_id}: {e}")
+        finally:
+            with _rotations_lock:
+                if _rotations.get(key) is threading.current_thread():
+                    del _rotations[key]
+
+    with _rotations_lock:
+        if key in _rotations:
+            return  # already rotating; the next append re-checks the policy
+        thread = threading.Thread(target=_run, name=f"history-rotate-{chat_id}", daemon=True)
+        _rotations[key] = thread
+        thread.start()
+
+
+def wait_rotations(timeout=None):
+    """Waits for background rotations still running (e.g. before shutdown)."""
+    with _rotations_lock:
+        threads = list(_rotations.values())
+    for thread in threads:
+        thread.join(timeout)
+
+
+def _update_live_started(base_dir, chat_id, started):
+    os.makedirs(segment_dir(base_dir, chat_id), exist_ok=True)
+    try:
+        with _FileLock(_index_path(base_dir, chat_id) + ".lock"):
+            index = load_index(base_dir, chat_id)
+            if index.get("live_started") is None:
+                index["live_started"] = started
+                _save_index(base_dir, chat_id, index)
+    except (OSError, TimeoutError) as e:
+        logger.error(f"Failed to update history index for {chat_id}: {e}")
+
+
+def rotate(base_dir, chat_id, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE,
+           keep_segments=DEFAULT_KEEP_SEGMENTS, keep_days=DEFAULT_KEEP_DAYS, force=False):
+    """Seals the live segment into compressed segments (split at `max_bytes`), then applies retention."""
+    seg_dir = segment_dir(base_dir, chat_id)
+    os.makedirs(seg_dir, exist_ok=True)
+    path = live_path(base_dir, chat_id)
+    try:
+        with _FileLock(_index_path(base_dir, chat_id) + ".lock") as index_lock:
+            index = load_index(base_dir, chat_id)
+            # Another process may have rotated while we waited for the lock
+            try:
+                with _FileLock(_chat_lock_path(base_dir, chat_id)):  # no append half-written
+                    size = os.path.getsize(path)
+            except OSError:
+                return
+            started = index.get("live_started") or time.time()
+            if not force and size == 0:
+                return
+            if not force and not (max_bytes and size >= max_bytes) and not (max_age and time.time() - started >= max_age):
+                _live_started[(base_dir, str(chat_id))] = started
+                return
+
+            # Appends only add whole lines after `size`, so this part is stable while it is compressed
+            sealed = dict(index, segments=list(index.get("segments", [])))
+            # The first rotation of an oversized pre-segmentation file is a migration: its
+            # segments don't count against keep_segments (that would delete most of the history)
+            migrated = not sealed["segments"] and max_bytes and size > 2 * max_bytes
+            new_files = _seal(seg_dir, path, sealed, started, max_bytes, limit=size,
+                              heartbeat=index_lock.refresh, migrated=migrated)
+            sealed["live_started"] = time.time()
+            with _FileLock(_chat_lock_path(base_dir, chat_id)):
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(path, "rb") as src, open(tmp, "wb") as dst:
+                    src.seek(size)
+                    shutil.copyfileobj(src, dst)  # lines appended while we compressed
+                # Live file first, index second: a crash in between must not list lines twice
+                try:
+                    os.replace(tmp, path)
+                except OSError as e:  # e.g. open in another process on Windows; retry next append
+                    for name in new_files + [tmp]:
+                        try:
+                            os.remove(os.path.join(seg_dir, name))
+                        except OSError:
+                            pass
+                    logger.warning(f"History rotation postponed for {chat_id}: {e}")
+                    return
+                dropped = _apply_retention(sealed, keep_segments, keep_days)
+                _save_index(base_dir, chat_id, sealed)
+            _remove_segments(seg_dir, dropped)
+            _live_started[(base_dir, str(chat_id))] = sealed["live_started"]
+    except TimeoutError as e:
+        logger.error(f"History rotation skipped for {chat_id}: {e}")
+
+
+def _seal(seg_dir, source, index, started, max_bytes, limit=None, heartbeat=None, migrated=False):
+    """Streams the first `limit` bytes of `source` into gzip segments of at most ~max_bytes each.
+
+    `heartbeat` is called every few seconds (compressing a big file takes a
+    while). Returns the names of the segment files written.
+    """
+    segments = index.setdefault("segments", [])
+    last = segments[-1] if segments else None
+    seq = last["seq"] + 1 if last else 1
+    first_line = last["first_line"] + last["lines"] if last else 0
+    first_offset = last["first_offset"] + last["bytes"] if last else 0
+
+    out = None
+    entry = None
+    written = []
+    consumed = 0
+    next_beat = time.monotonic() + LOCK_STALE_AFTER / 3
+
+    def _close():
+        if out:
+            out.close()
+            segments.append(entry)
+
+    with open(source, "rb") as src:
+        for raw in src:
+            if limit is not None and consumed >= limit:
+                break
+            consumed += len(raw)
+            if heartbeat and time.monotonic() >= next_beat:
+                heartbeat()
+                next_beat = time.monotonic() + LOCK_STALE_AFTER / 3
+            if out is None or (max_bytes and entry["bytes"] >= max_bytes):
+                _close()
+                name = f"{seq:06d}.txt.gz"
+                out = gzip.open(os.path.join(seg_dir, name), "wb", compresslevel=6)
+                written.append(name)
+                entry = {"seq": seq, "file": name, "first_line": first_line, "lines": 0,
+                         "first_offset": first_offset, "bytes": 0,
+                         "started": started, "sealed": time.time()}
+                if migrated:
+                    entry["migrated"] = True
+                seq += 1
+            out.write(raw)
+            entry["lines"] += 1
+            entry["bytes"] += len(raw)
+            first_line += 1
+            first_offset += len(raw)
+        _close()
+    return written
+
+
+def _apply_retention(index, keep_segments, keep_days):
+    """Drops expired segments from `index`; returns them (their files are removed once the index is saved)."""
+    segments = index.get("segments", [])
+    cutoff = time.time() - keep_days * 86400 if keep_days else None
+    regular = sum(1 for seg in segments if not seg.get("migrated"))
+    excess = regular - keep_segments if keep_segments else 0
+    keep, dropped = [], []
+    for seg in segments:
+        too_many = excess > 0 and not seg.get("migrated")
+        too_old = cutoff is not None and seg.get("sealed", 0) < cutoff
+        if too_many:
+            excess -= 1
+        (dropped if too_many or too_old else keep).append(seg)
+    index["segments"] = keep
+    return dropped
+
+
+def _remove_segments(seg_dir, dropped):
+    if dropped:
+        logger.info(f"History retention dropped {len(dropped)} segment(s), "
+                    f"{sum(seg['lines'] for seg in dropped)} lines, of chat {os.path.basename(seg_dir)}")
+    for seg in dropped:
+        try:
+            os.remove(os.path.join(seg_dir, seg["file"]))
+        except OSError:
+            pass
+
+
+def apply_retention(base_dir, chat_id, keep_segments=DEFAULT_KEEP_SEGMENTS, keep_days=DEFAULT_KEEP_DAYS):
+    """Applies the retention policy without rotating."""
+    seg_dir = segment_dir(base_dir, chat_id)
+    if not os.path.isdir(seg_dir):
+        return
+    with _FileLock(_index_path(base_dir, chat_id) + ".lock"):
+        index = load_index(base_dir, chat_id)
+        dropped = _apply_retention(index, keep_segments, keep_days)
+        _save_index(base_dir, chat_id, index)
+    _remove_segments(seg_dir, dropped)
+
+
+def _read_segment(base_dir, chat_id, seg):
+    with gzip.open(os.path.join(segment_dir(base_dir, chat_id), seg["file"]), "rb") as f:
+        return f.read().decode("utf-8", errors="replace")
+
+
+def _tail_text(path, limit):
+    """Last `limit` characters of a UTF-8 file, reading only its end."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        # A character is at most 4 bytes in UTF-8 (+1 per CRLF line ending on Windows)
+        want = min(size, limit * 5)
+        f.seek(size - want)
+        data = f.read()
+    text = data.decode("utf-8", errors="ignore").replace("\r\n", "\n")
+    return text[-limit:]
+
+
+def read_tail(base_dir, chat_id, limit):
+    """Last `limit` characters of the history.
+
+    Touches only the live segment, plus the newest sealed segment when the
+    live one is shorter than `limit`.
+    """
+    path = live_path(base_dir, chat_id)
+    text = _tail_text(path, limit) if os.path.exists(path) else ""
+    if len(text) >= limit:
+        return text
+    segments = load_index(base_dir, chat_id).get("segments", [])
+    if not segments:
+        return text
+    older = _read_segment(base_dir, chat_id, segments[-1]).replace("\r\n", "\n")
+    return (older + text)[-limit:]
+
+
+def read_all(base_dir, chat_id):
+    """The full retained history (all sealed segments + live segment)."""
+    parts = [_read_segment(base_dir, chat_id, seg) for seg in load_index(base_dir, chat_id).get("segments", [])]
+    path = live_path(base_dir, chat_id)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            parts.append(f.read())
+    return "".join(parts).replace("\r\n", "\n")
+
+
+# ── In-memory cache ───────────────────────────────────────────────
+
+_RECORD_OVERHEAD = 64  # slots object + deque slot, roughly
+
+
+class HistoryRecord:
+    """One history line. sender is None for a partial line warmed from disk.
+
+    `key` is the Telegram message id for user messages appended by a bridge.
+    """
+    __slots__ = ("sender", "text", "chars", "key")
+
+    def __init__(self, sender, text, key=None):
+        self.sender = sender
+        self.text = text
+        self.key = key
+        self.chars = len(text) if sender is None else len(sender) + len(text) + 5  # "[" "]: " "\n"
+
+    @property
+    def nbytes(self):
+        return _RECORD_OVERHEAD + self.chars
+
+    def render(self):
+        return self.text if self.sender is None else f"[{self.sender}]: {self.text}\n"
+
+
+class ChatBuffer:
+    """Ring buffer holding at least the last `max_chars` characters of one chat."""
+    __slots__ = ("records", "chars", "nbytes", "max_chars", "complete")
+
+    def __init__(self, max_chars):
+        self.records = deque()
+        self.chars = 0
+        self.nbytes = 0
+        self.max_chars = max_chars
+        self.complete = True  # True while the buffer holds the entire history
+
+    def add(self, record):
+        self.records.append(record)
+        self.chars += record.chars
+        self.nbytes += record.nbytes
+        # Drop from the left while the rest still covers max_chars
+        while self.records:
+            first = self.records[0]
+            if self.chars - first.chars < self.max_chars:
+                break
+            self.records.popleft()
+            self.chars -= first.chars
+            self.nbytes -= first.nbytes
+            self.complete = False
+
+    def claim_key(self, record, window=256):
+        """Whether `record` (keyed) is already among the newest `window` records.
+
+        An unkeyed record with the same sender and text (warmed from disk after
+        another process wrote it) is adopted by giving it the key.
+        """
+        for i, existing in enumerate(reversed(self.records)):
+            if i >= window:
+                break
+            if existing.key == record.key:
+                return True
+            if existing.key is None and existing.sender == record.sender and existing.text == record.text:
+                existing.key = record.key
+                return True
+        return False
+
+    def tail(self, limit):
+        parts = []
+        total = 0
+        for record in reversed(self.records):
+            parts.append(record.render())
+            total += record.chars
+            if total >= limit:
+                break
+        return "".join(reversed(parts))[-limit:]
+
+
+def parse_lines(text):
+    """Splits history text into records; a leading fragment becomes a raw record."""
+    records = []
+    for line in text.splitlines(keepends=True):
+        if line.startswith("[") and "]: " in line and line.endswith("\n"):
+            sender, _, body = line[1:].partition("]: ")
+            records.append(HistoryRecord(sender, body[:-1]))
+        elif records and records[-1].sender is None:
+            records[-1] = HistoryRecord(None, records[-1].text + line)
+        else:
+            records.append(HistoryRecord(None, line))
+    return records
+
+
+class HistoryCache:
+    """Per-chat ring buffers under a global LRU memory budget, write-through to disk.
+
+    Chats are warmed lazily from disk on first access; after that, tail reads
+    of up to `chat_chars` characters are served from memory. The cache only
+    sees lines written through it, so processes sharing a history directory
+    forward each other's appends via `ingest()` (see history_bus.py).
+    """
+
+    def __init__(self, budget_bytes=32_000_000, chat_chars=8000):
+        self.budget_bytes = budget_bytes
+        self.chat_chars = chat_chars
+        self._chats = OrderedDict()  # (base_dir, chat_id) -> ChatBuffer
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._chats)
+
+    def _buffer(self, base_dir, chat_id):
+        """Returns the chat's buffer, warming it from disk if needed (lock held)."""
+        key = (base_dir, str(chat_id))
+        buf = self._chats.get(key)
+        if buf is not None:
+            self._chats.move_to_end(key)
+            self.hits += 1
+            return buf
+        self.misses += 1
+        buf = ChatBuffer(self.chat_chars)
+        text = read_tail(base_dir, chat_id, self.chat_chars + 1)
+        if len(text) > self.chat_chars:
+            buf.complete = False
+            text = text[1:]
+        for record in parse_lines(text):
+            buf.add(record)
+        self._chats[key] = buf
+        self._nbytes += buf.nbytes
+        return buf
+
+    def _evict(self):
+        while self._nbytes > self.budget_bytes and len(self._chats) > 1:
+            _, buf = self._chats.popitem(last=False)
+            self._nbytes -= buf.nbytes
+            self.evictions += 1
+
+    def _add(self, buf, record):
+        if record.key is not None and buf.claim_key(record):
+            return False
+        before = buf.nbytes
+        buf.add(record)
+        self._nbytes += buf.nbytes - before
+        self._evict()
+        return True
+
+    def ingest(self, base_dir, chat_id, sender, message, message_id=None):
+        """Adds a line to a cached chat without writing it (it is already on disk)."""
+        with self._lock:
+            buf = self._chats.get((base_dir, str(chat_id)))
+            if buf is None:
+                return
+            self._add(buf, HistoryRecord(sender, message, message_id))
+
+    def append(self, base_dir, chat_id, sender, message, message_id=None, **rotation):
+        """Write-through append: updates the ring buffer and the persistent store.
+
+        Returns False if `message_id` had already been recorded (by this or
+        another process); the line is then kept in memory only once.
+        """
+        if message_id is None:
+            with self._lock:
+                self._add(self._buffer(base_dir, chat_id), HistoryRecord(sender, message))
+            return append_line(base_dir, chat_id, f"[{sender}]: {message}\n", **rotation)
+
+        with self._lock:
+            self._buffer(base_dir, chat_id)  # warm before our line can reach disk
+        written = append_line(base_dir, chat_id, f"[{sender}]: {message}\n", message_id=message_id, **rotation)
+        with self._lock:
+            # Even when another process wrote it first, our view needs the line once
+            buf = self._chats.get((base_dir, str(chat_id)))
+            if buf is not None:
+                self._add(buf, HistoryRecord(sender, message, message_id))
+        return written
+
+    def tail(self, base_dir, chat_id, limit):
+        """Last `limit` characters; from memory when the buffer covers them."""
+        if limit > self.chat_chars:
+            return read_tail(base_dir, chat_id, limit)
+        with self._lock:
+            buf = self._buffer(base_dir, chat_id)
+            self._evict()
+            return buf.tail(limit)
+
+    def invalidate(self, base_dir=None, chat_id=None):
+        """Drops one chat (or everything) so the next access re-reads disk."""
+        with self._lock:
+            if chat_id is None:
+                self._chats.clear()
+                self._nbytes = 0
+                return
+            buf = self._chats.pop((base_dir, str(chat_id)), None)
+            if buf is not None:
+                self._nbytes -= buf.nbytes
@@ -0,0 +1,100 @@
+"""Health and latency of every stored API key.
+
+check_all() probes the key of each profile in auth-profiles.json at the same
+time, using the cheap authenticated endpoints behind providers.check_key
+(model lists, OpenRouter's key info). It records whether the key works, how
+long the call took and the rate-limit / quota headers that came back. A key
+shared by several profiles is probed once.
+
+Results are cached per (provider, key) for `ttl` seconds, so reopening the
+table or re-running the check does not spend quota; pass force=True to
+re-probe.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import providers
+
+OK, INVALID, ERROR, UNCHECKED, MISSING = "ok", "invalid", "error", "unchecked", "missing"
+SLOW_SECONDS = 2.0  # a working key slower than this is flagged
+
+KeyStatus = namedtuple("KeyStatus", "profile provider state latency quota detail checked_at")
+
+
+def profile_keys(auth_profiles):
+    """[(profile, provider, key or None)] for every profile, in file order."""
+    entries = []
+    for name, profile in (auth_profiles.get("profiles") or {}).items():
+        if not isinstance(profile, dict):
+            continue
+        provider = profile.get("provider") or name.split(":")[0]
+        entries.append((name, provider, profile.get("key") or profile.get("apiKey") or None))
+    return entries
+
+
+def _detail(provider, data):
+    if provider == "openrouter":
+        info = data.get("data") or {}
+        return f"label: {info.get('label', '?')}"
+    if provider in ("google", "anthropic"):  # asked for one model only
+        return "models reachable"
+    return f"{len(data.get('data') or [])} models"
+
+
+class KeyHealth:
+    def __init__(self, ttl=300.0, workers=8, timeout=10.0):
+        self.ttl = ttl
+        self.workers = workers
+        self.timeout = timeout
+        self._cache = {}  # (provider, key) -> (state, latency, quota, detail, checked_at)
+        self._lock = threading.Lock()
+
+    def _probe(self, provider, key):
+        checked_at = time.time()
+        try:
+            check = providers.check_key(provider, key, timeout=self.timeout)
+        except providers.UnsupportedProviderError:
+            return UNCHECKED, None, {}, "no key-check endpoint", checked_at
+        except providers.AuthError as e:
+            return INVALID, None, {}, str(e), checked_at
+        except providers.ProviderError as e:
+            return ERROR, None, {}, str(e), checked_at
+        except Exception as e:  # malformed answer etc.: still a row, not a crash
+            return ERROR, None, {}, f"{type(e).__name__}: {e}", checked_at
+        quota = providers.quota_headers(check.headers)
+        if provider == "openrouter":
+            remaining = (check.data.get("data") or {}).get("limit_remaining")
+            if remaining is not None:
+                quota["limit_remaining"] = remaining
+        return OK, check.latency, quota, _detail(provider, check.data), checked_at
+
+    def _cached(self, provider, key, now):
+        with self._lock:
+            hit = self._cache.get((provider, key))
+        if hit and now - hit[-1] < self.ttl:
+            return hit
+        return None
+
+    def check_all(self, auth_profiles, force=False):
+        """KeyStatus for every profile; keys not cached (or all, with force) are probed concurrently."""
+        entries = profile_keys(auth_profiles)
+        now = time.time()
+        todo = list({(provider, key) for _, provider, key in entries
+                     if key and provider not in providers.KEYLESS and (force or not self._cached(provider, key, now))})
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(todo)), thread_name_prefix="key-check") as pool:
+                results = dict(zip(todo, pool.map(lambda pk: self._probe(*pk), todo)))
+            with self._lock:
+                self._cache.update(results)
+        statuses = []
+        for profile, provider, key in entries:
+            if provider in providers.KEYLESS:
+                statuses.append(KeyStatus(profile, provider, UNCHECKED, None, {}, "no key needed", None))
+            elif not key:
+                statuses.append(KeyStatus(profile, provider, MISSING, None, {}, "profile has no key", None))
+            else:
+                with self._lock:
+                    statuses.append(KeyStatus(profile, provider, *self._cache[(provider, key)]))
+        return statuses
@@ -0,0 +1,171 @@
+"""Local learned router: hashed n-gram TF-IDF features + a softmax linear model.
+
+An alternative to the keyword rules in bridge_server.route_message. Training
+data is labeled examples ({"text": ..., "agent": ...} JSONL) plus routing
+decisions recovered from the shared history (a user line directly answered
+by an agent line). Inference hashes the message into a few hundred sparse
+features and takes one small dot product, well under a millisecond; when
+the top class is below the confidence threshold the caller's keyword rules
+decide instead.
+
+Needs NumPy (optional dependency, only imported by the bridge when
+OPENCLAW_ROUTER=learned). Train/evaluate with `python -m bench.eval_router`.
+"""
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+import history_store
+
+DEFAULT_DIM = 1 << 16
+DEFAULT_THRESHOLD = 0.5  # below this confidence the keyword rules decide
+_WORD_RE = re.compile(r"\w+")
+
+
+def _hashed_counts(text, dim):
+    counts = {}
+    words = _WORD_RE.findall(text.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f" {w} "
+        for n in (3, 4, 5):
+            grams += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+    mask = dim - 1
+    for g in grams:
+        h = zlib.crc32(g.encode("utf-8")) & mask
+        counts[h] = counts.get(h, 0) + 1
+    return counts
+
+
+class LinearRouter:
+    def __init__(self, classes, W, b, idf):
+        self.classes = list(classes)
+        self.W = W  # (dim, n_classes) float32
+        self.b = b  # (n_classes,)
+        self.idf = idf  # (dim,)
+        self.dim = len(idf)
+
+    # ── features ──
+    def featurize(self, text):
+        """Sparse TF-IDF vector as (indices, values), L2-normalized."""
+        counts = _hashed_counts(text, self.dim)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        vals = (1.0 + np.log(tf)) * self.idf[idx]
+        norm = np.sqrt(vals @ vals)
+        return idx, vals / norm if norm else vals
+
+    def _batch(self, texts):
+        rows, cols, vals = [], [], []
+        for i, text in enumerate(texts):
+            idx, v = self.featurize(text)
+            rows.append(np.full(len(idx), i, dtype=np.int64))
+            cols.append(idx)
+            vals.append(v)
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals).astype(np.float32)
+
+    # ── training ──
+    @classmethod
+    def fit(cls, texts, labels, weights=None, dim=DEFAULT_DIM, epochs=300, lr=2.0, l2=1e-5):
+        """Full-batch gradient descent on the (sparse) softmax cross-entropy."""
+        classes = sorted(set(labels))
+        y = np.array([classes.index(label) for label in labels])
+        sample_w = np.ones(len(texts), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        sample_w = sample_w / sample_w.sum()
+
+        df = np.zeros(dim, dtype=np.float32)
+        for text in texts:
+            df[list(_hashed_counts(text, dim))] += 1
+        idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+        model = cls(classes, np.zeros((dim, len(classes)), dtype=np.float32),
+                    np.zeros(len(classes), dtype=np.float32), idf)
+        rows, cols, vals = model._batch(texts)
+        onehot = np.eye(len(classes), dtype=np.float32)[y]
+        for _ in range(epochs):
+            scores = np.zeros((len(texts), len(classes)), dtype=np.float32)
+            np.add.at(scores, rows, model.W[cols] * vals[:, None])
+            probs = _softmax(scores + model.b)
+            err = (probs - onehot) * sample_w[:, None]
+            grad_W = np.zeros_like(model.W)
+            np.add.at(grad_W, cols, err[rows] * vals[:, None])
+            model.W -= lr * (grad_W + l2 * model.W)
+            model.b -= lr * err.sum(axis=0)
+        return model
+
+    # ── inference ──
+    def predict(self, text):
+        """(agent, confidence) for one message."""
+        idx, vals = self.featurize(text)
+        probs = _softmax(vals @ self.W[idx] + self.b)
+        best = int(np.argmax(probs))
+        return self.classes[best], float(probs[best])
+
+    def predict_batch(self, texts):
+        rows, cols, vals = self._batch(texts)
+        scores = np.zeros((len(texts), len(self.classes)), dtype=np.float32)
+        np.add.at(scores, rows, self.W[cols] * vals[:, None])
+        probs = _softmax(scores + self.b)
+        best = probs.argmax(axis=1)
+        return [self.classes[i] for i in best], probs[np.arange(len(texts)), best]
+
+    def route(self, text, fallback, threshold=None):
+        if threshold is None:
+            threshold = DEFAULT_THRESHOLD
+        agent, confidence = self.predict(text)
+        return agent if confidence >= threshold else fallback(text)
+
+    # ── persistence ──
+    def save(self, path):
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, W=self.W, b=self.b, idf=self.idf, classes=np.array(self.classes))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls([str(c) for c in data["classes"]], data["W"], data["b"], data["idf"])
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=-1, keepdims=True)
+    e = np.exp(scores)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def load_examples(path):
+    """Labeled examples from JSONL ({"text", "agent"}) or CSV (text,agent)."""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            import csv
+            for row in csv.DictReader(f):
+                examples.append((row["text"], row["agent"]))
+        else:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    examples.append((rec["text"], rec["agent"]))
+    return examples
+
+
+def examples_from_history(base_dir, agents):
+    """(user text, agent) pairs where an agent line directly follows a user line."""
+    agents = set(agents)
+    examples = []
+    if not os.path.isdir(base_dir):
+        return examples
+    for name in sorted(os.listdir(base_dir)):
+        if not name.endswith(".txt"):
+            continue
+        records = history_store.parse_lines(history_store.read_all(base_dir, name[:-4]))
+        for prev, cur in zip(records, records[1:]):
+            if cur.sender in agents and prev.sender and prev.sender not in agents:
+                examples.append((prev.text, cur.sender))
+    return examples
@@ -0,0 +1,266 @@
+"""Per-bot log files and a paged, indexed reader over them.
+
+Every line a bridge prints is appended to logs/<bot>.log. Files are rotated
+by size (<bot>.log.1 is the previous one, up to `backups` of them), so the
+output survives the GUI closing and disk use stays bounded.
+
+LogReader never loads a whole file. It keeps a sparse index per file: one
+entry per ~64 KB block of whole lines (byte offset, first line number, which
+levels appear in it), built incrementally as the file grows, and reads only
+the blocks a page or a search needs. Blocks without a wanted level are
+skipped without being read, and search scans block bytes before splitting
+any lines. Indexes are keyed by inode, so they survive rotation renames.
+"""
+import bisect
+import os
+import re
+import threading
+from array import array
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 5
+BLOCK_BYTES = 64 * 1024
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+_LEVEL_RE = re.compile(rb"\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b")
+_LEVEL_BITS = {name.encode(): 1 << i for i, name in enumerate(LEVELS)}
+
+
+def line_level(line):
+    """Numeric level named in a log line (bytes or str), 0 if none."""
+    if isinstance(line, str):
+        line = line.encode("utf-8", "replace")
+    match = _LEVEL_RE.search(line)
+    return LEVELS[match.group(1).decode()] if match else 0
+
+
+def _wanted_bits(min_level):
+    if not min_level:
+        return -1
+    return sum(_LEVEL_BITS[name.encode()] for name, value in LEVELS.items() if value >= min_level)
+
+
+def _block_mask(block):
+    mask = 0
+    for name in set(_LEVEL_RE.findall(block)):
+        mask |= _LEVEL_BITS[name]
+    return mask
+
+
+def _file_name(bot):
+    return re.sub(r"[^\w.-]+", "_", bot).strip("._") or "bot"
+
+
+class LogStore:
+    """Size-rotated append-only log file per bot; write() is thread-safe."""
+
+    def __init__(self, log_dir=LOG_DIR, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def path(self, bot):
+        return os.path.join(self.log_dir, _file_name(bot) + ".log")
+
+    def write(self, bot, text):
+        if not text.endswith("\n"):
+            text += "\n"
+        data = text.encode("utf-8", "replace")
+        with self._lock:
+            f = self._files.get(bot)
+            if f is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                f = self._files[bot] = open(self.path(bot), "ab")
+            if f.tell() and f.tell() + len(data) > self.max_bytes:
+                f = self._rotate(bot, f)
+            f.write(data)
+            f.flush()
+
+    def _rotate(self, bot, f):
+        f.close()
+        path = self.path(bot)
+        try:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{path}.{i}"):
+                    os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+            if self.backups:
+                os.replace(path, f"{path}.1")
+            else:
+                os.remove(path)
+        except OSError:
+            pass  # e.g. a reader holds the file on Windows: keep appending, rotate next time
+        f = self._files[bot] = open(path, "ab")
+        return f
+
+    def bots(self):
+        """Names of bots with a log file in the directory."""
+        try:
+            names = os.listdir(self.log_dir)
+        except OSError:
+            return []
+        return sorted(name[:-4] for name in names if name.endswith(".log"))
+
+    def segments(self, bot):
+        """Existing files of a bot, oldest first."""
+        path = self.path(bot)
+        paths = [f"{path}.{i}" for i in range(self.backups, 0, -1)] + [path]
+        return [p for p in paths if os.path.exists(p)]
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+class _SegmentIndex:
+    __slots__ = ("offsets", "firsts", "masks", "size", "lines")
+
+    def __init__(self):
+        self.offsets = array("Q")  # byte offset of each block
+        self.firsts = array("Q")  # line number (within the file) each block starts at
+        self.masks = array("B")  # level bits present in each block
+        self.size = 0  # bytes indexed, always at a line end
+        self.lines = 0
+
+    def update(self, f, budget):
+        """Indexes up to `budget` new bytes; returns how many were read."""
+        if self.offsets and self.size - self.offsets[-1] < min(BLOCK_BYTES, budget // 2):
+            # Grow the last, partial block rather than adding a tiny one per refresh
+            self.size = self.offsets.pop()
+            self.lines = self.firsts.pop()
+            self.masks.pop()
+        f.seek(self.size)
+        data = f.read(budget)
+        end = data.rfind(b"\n") + 1  # a line still being written waits for the next refresh
+        pos = 0
+        while pos < end:
+            cut = data.rfind(b"\n", pos, pos + BLOCK_BYTES) + 1
+            if cut <= pos:  # a single line longer than a block
+                cut = data.find(b"\n", pos + BLOCK_BYTES) + 1 or end
+            block = data[pos:cut]
+            self.offsets.append(self.size + pos)
+            self.firsts.append(self.lines)
+            self.masks.append(_block_mask(block))
+            self.lines += block.count(b"\n")
+            pos = cut
+        self.size += end
+        return len(data)
+
+    def block_end(self, i):
+        return self.offsets[i + 1] if i + 1 < len(self.offsets) else self.size
+
+
+class LogReader:
+    """Line-addressed view over one bot's rotated files.
+
+    Line numbers run across all segments, oldest first; they shift when the
+    oldest segment is dropped by rotation, so callers re-read after refresh().
+    """
+
+    def __init__(self, store, bot):
+        self.store = store
+        self.bot = bot
+        self._indexes = {}  # (st_dev, st_ino) -> _SegmentIndex
+        self._segments = []  # [(path, index)], oldest first
+        self._bases = [0]  # first global line of each segment, plus the total
+
+    def refresh(self, budget=8 * 1024 * 1024):
+        """Indexes new output, reading at most `budget` bytes; True when up to date."""
+        segments, indexes, done = [], {}, True
+        for path in self.store.segments(self.bot):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            index = self._indexes.get(key)
+            if index is None or st.st_size < index.size:  # new or truncated file
+                index = _SegmentIndex()
+            if index.size < st.st_size:
+                if budget > 0:
+                    with open(path, "rb") as f:
+                        budget -= index.update(f, budget)
+                if index.size < st.st_size and budget <= 0:
+                    done = False
+            indexes[key] = index
+            segments.append((path, index))
+        self._indexes, self._segments = indexes, segments
+        self._bases = [0]
+        for _, index in segments:
+            self._bases.append(self._bases[-1] + index.lines)
+        return done
+
+    @property
+    def total(self):
+        return self._bases[-1]
+
+    def _locate(self, line):
+        """(segment, block) holding global line `line`."""
+        seg = bisect.bisect_right(self._bases, line) - 1
+        seg = min(max(seg, 0), len(self._segments) - 1)
+        index = self._segments[seg][1]
+        block = bisect.bisect_right(index.firsts, line - self._bases[seg]) - 1
+        return seg, max(block, 0)
+
+    def _blocks(self, line, backwards=False, wanted=-1):
+        """Yields (first_line, block_bytes) from the block holding `line` onwards (or backwards)."""
+        if not self.total:
+            return
+        seg, block = self._locate(min(max(line, 0), self.total - 1))
+        while 0 <= seg < len(self._segments):
+            path, index = self._segments[seg]
+            with open(path, "rb") as f:
+                while 0 <= block < len(index.offsets):
+                    if index.masks[block] & wanted:
+                        f.seek(index.offsets[block])
+                        yield self._bases[seg] + index.firsts[block], f.read(index.block_end(block) - index.offsets[block])
+                    block += -1 if backwards else 1
+            seg += -1 if backwards else 1
+            if 0 <= seg < len(self._segments):
+                block = len(self._segments[seg][1].offsets) - 1 if backwards else 0
+
+    def lines(self, start, count, min_level=0):
+        """Up to `count` (line_no, text) at or after `start` with a level >= min_level."""
+        out = []
+        for first, block in self._blocks(start, wanted=_wanted_bits(min_level)):
+            for n, raw in enumerate(block.split(b"\n")[:-1], first):
+                if n >= start and (not min_level or line_level(raw) >= min_level):
+                    out.append((n, raw.decode("utf-8", "replace")))
+                    if len(out) == count:
+                        return out
+        return out
+
+    def lines_before(self, end, count, min_level=0):
+        """Up to `count` (line_no, text) before `end`, in file order."""
+        out = []
+        for first, block in self._blocks(end - 1, backwards=True, wanted=_wanted_bits(min_level)):
+            rows = block.split(b"\n")[:-1]
+            for n in range(first + len(rows) - 1, first - 1, -1):
+                raw = rows[n - first]
+                if n < end and (not min_level or line_level(raw) >= min_level):
+                    out.append((n, raw.decode("utf-8", "replace")))
+                    if len(out) == count:
+                        return out[::-1]
+        return out[::-1]
+
+    def search(self, needle, start, backwards=False, min_level=0):
+        """Line number of the next match after `start` (before it if backwards), or None.
+
+        Case-insensitive for ASCII; blocks are tested as a whole before any line is split.
+        """
+        needle = needle.encode("utf-8").lower()
+        if not needle:
+            return None
+        for first, block in self._blocks(start, backwards, _wanted_bits(min_level)):
+            if needle not in block.lower():
+                continue
+            rows = list(enumerate(block.split(b"\n")[:-1], first))
+            for n, raw in (reversed(rows) if backwards else rows):
+                if (n < start if backwards else n > start) and needle in raw.lower() \
+                        and (not min_level or line_level(raw) >= min_level):
+                    return n
+        return None
@@ -0,0 +1,259 @@
+"""Retrieval memory over the shared chat history.
+
+The prompt carries only the last couple of thousand characters of history.
+This index lets the bridge add the few older messages most similar to the
+current request, so memory grows without the prompt growing.
+
+Every history record is embedded as a signed hashed bag of words and
+character 3-grams (DIM floats, L2-normalized); search is a brute-force
+matrix-vector product, a few milliseconds for the default 50k records
+per chat. A chat's index is built lazily from disk on first search and then
+kept up to date as lines are appended: add() only queues the line, the next
+search (on a worker thread) embeds the queue. Vectors of sealed segments never
+change, so they are cached (as float16) next to the segment as
+`NNNNNN.vec.npy`; only the live segment is re-embedded when a chat loads.
+
+Needs NumPy (optional dependency).
+"""
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict, deque
+
+import numpy as np
+
+import history_store
+
+logger = logging.getLogger(__name__)
+
+DIM = 256
+MAX_PENDING = 100_000  # appends queued without a search before the index is dropped
+_WORD_RE = re.compile(r"\w+")
+
+
+def _grams(text):
+    words = _WORD_RE.findall(text.lower())
+    grams = words[:]
+    for w in words:
+        if len(w) > 3:
+            grams += [w[i:i + 3] for i in range(len(w) - 2)]
+    return grams
+
+
+def embed_many(texts):
+    """(len(texts), DIM) float32 matrix of L2-normalized hashed vectors."""
+    rows, cols, signs = [], [], []
+    for i, text in enumerate(texts):
+        for g in _grams(text):
+            h = zlib.crc32(g.encode("utf-8"))
+            rows.append(i)
+            cols.append(h & (DIM - 1))
+            signs.append(1.0 if h & 0x10000 else -1.0)
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    if rows:
+        np.add.at(out, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+
+def embed(text):
+    return embed_many([text])[0]
+
+
+class ChatMemory:
+    """Records of one chat with their vectors, in history order."""
+
+    def __init__(self):
+        self.texts = []
+        self.vecs = np.zeros((0, DIM), dtype=np.float32)
+        self.n = 0
+
+    def extend(self, texts, vecs):
+        if not texts:
+            return
+        need = self.n + len(texts)
+        if need > len(self.vecs):
+            grown = np.zeros((max(need, len(self.vecs) * 2, 64), DIM), dtype=np.float32)
+            grown[:self.n] = self.vecs[:self.n]
+            self.vecs = grown
+        self.vecs[self.n:need] = vecs
+        self.texts.extend(texts)
+        self.n = need
+
+    def drop_oldest(self, count):
+        count = min(count, self.n)
+        self.texts = self.texts[count:]
+        self.vecs = self.vecs[count:self.n].copy()
+        self.n -= count
+
+    @property
+    def nbytes(self):
+        return self.vecs.nbytes + sum(len(t) for t in self.texts) * 2
+
+    def search(self, query_vec, k, exclude=lambda text: False, min_score=0.15):
+        if not self.n:
+            return []
+        scores = self.vecs[:self.n] @ query_vec
+        take = min(self.n, k * 4)
+        best = np.argpartition(-scores, take - 1)[:take]
+        hits = []
+        for i in best[np.argsort(-scores[best])]:
+            if scores[i] < min_score or len(hits) >= k:
+                break
+            if not exclude(self.texts[i]):
+                hits.append((float(scores[i]), int(i)))
+        return hits
+
+
+def _vec_path(base_dir, chat_id, seg):
+    return os.path.join(history_store.segment_dir(base_dir, chat_id), f"{seg['seq']:06d}.vec.npy")
+
+
+def _records(text):
+    return [r.render().rstrip("\n") for r in history_store.parse_lines(text) if r.text.strip()]
+
+
+class MemoryIndex:
+    def __init__(self, budget_bytes=64_000_000, max_records=50_000, max_pending=MAX_PENDING):
+        self.budget_bytes = budget_bytes
+        self.max_records = max_records
+        self.max_pending = max_pending
+        self._chats = OrderedDict()  # (base_dir, chat_id) -> ChatMemory, LRU order
+        self._lock = threading.RLock()
+        self._pending = deque()  # (key, text) appended since the last search, not embedded yet
+        self._overflowed = False
+        self._loading = {}  # key -> texts appended while that chat is being loaded
+
+    def _load(self, base_dir, chat_id):
+        memory = ChatMemory()
+        index = history_store.load_index(base_dir, chat_id)
+        wanted = set()
+        for seg in index.get("segments", []):
+            texts = _records(history_store._read_segment(base_dir, chat_id, seg))
+            path = _vec_path(base_dir, chat_id, seg)
+            wanted.add(os.path.basename(path))
+            vecs = None
+            try:
+                vecs = np.load(path)
+                if vecs.shape != (len(texts), DIM):
+                    vecs = None
+            except (OSError, ValueError):
+                pass
+            if vecs is None:
+                vecs = embed_many(texts).astype(np.float16)
+                try:
+                    tmp = f"{path}.{os.getpid()}.tmp.npy"
+                    np.save(tmp, vecs)
+                    os.replace(tmp, path)
+                except OSError as e:
+                    logger.warning(f"Could not cache memory vectors for {chat_id}: {e}")
+            memory.extend(texts, vecs)
+        # Vectors of segments dropped by retention
+        seg_dir = history_store.segment_dir(base_dir, chat_id)
+        if os.path.isdir(seg_dir):
+            for name in os.listdir(seg_dir):
+                if name.endswith(".vec.npy") and name not in wanted:
+                    try:
+                        os.remove(os.path.join(seg_dir, name))
+                    except OSError:
+                        pass
+        live = history_store.live_path(base_dir, chat_id)
+        if os.path.exists(live):
+            with open(live, "r", encoding="utf-8") as f:
+                texts = _records(f.read().replace("\r\n", "\n"))
+            memory.extend(texts, embed_many(texts))
+        if memory.n > self.max_records:
+            memory.drop_oldest(memory.n - self.max_records)
+        return memory
+
+    def _drain(self):
+        """Embeds queued appends into the loaded chats (lock held)."""
+        if self._overflowed:  # nobody searched for a long time: reload from disk instead
+            self._overflowed = False
+            self._pending.clear()
+            self._chats.clear()
+            self._loading.clear()
+            return
+        batch = {}
+        while self._pending:
+            key, text = self._pending.popleft()
+            if key in self._chats:
+                batch.setdefault(key, []).append(text)
+            elif key in self._loading:
+                self._loading[key].append(text)
+        for key, texts in batch.items():
+            memory = self._chats[key]
+            memory.extend(texts, embed_many(texts))
+            if memory.n > self.max_records * 1.1:  # trim in chunks, not one copy per append
+                memory.drop_oldest(memory.n - self.max_records)
+
+    def _memory(self, base_dir, chat_id):
+        key = (base_dir, str(chat_id))
+        with self._lock:
+            self._drain()  # queued lines are already on disk: index them before loading reads it
+            memory = self._chats.get(key)
+            if memory is not None:
+                self._chats.move_to_end(key)
+                return memory
+            appended = self._loading.setdefault(key, [])
+        # Reading and embedding a whole chat takes a while: other chats keep being served meanwhile
+        memory = self._load(base_dir, chat_id)
+        with self._lock:
+            self._drain()
+            if key in self._chats:  # another thread loaded it first
+                self._chats.move_to_end(key)
+                return self._chats[key]
+            if self._loading.get(key) is not appended:  # invalidated meanwhile: use once, don't keep
+                return memory
+            del self._loading[key]
+            # Lines appended during the load may already be in it (written before the live file was read)
+            seen = next((j for j in range(min(len(appended), memory.n), 0, -1)
+                         if memory.texts[-j:] == appended[:j]), 0)
+            memory.extend(appended[seen:], embed_many(appended[seen:]))
+            if memory.n > self.max_records:
+                memory.drop_oldest(memory.n - self.max_records)
+            self._chats[key] = memory
+            self._evict(keep=key)
+        return memory
+
+    def _evict(self, keep=None):
+        total = sum(m.nbytes for m in self._chats.values())
+        while total > self.budget_bytes and len(self._chats) > 1:
+            key, memory = next(iter(self._chats.items()))
+            if key == keep:
+                break
+            total -= memory.nbytes
+            del self._chats[key]
+
+    def add(self, base_dir, chat_id, sender, message):
+        """Queues an appended line; the next search embeds it (only for chats already loaded).
+
+        Cheap and lock-free, so it can be called from the event loop.
+        """
+        if not message.strip():
+            return
+        if len(self._pending) >= self.max_pending:
+            self._overflowed = True
+            return
+        text = history_store.HistoryRecord(sender, message).render().rstrip("\n")
+        self._pending.append(((base_dir, str(chat_id)), text))
+
+    def search(self, base_dir, chat_id, query, k=3, exclude=lambda text: False):
+        """Top-k older records most similar to `query`, as (score, text), oldest first."""
+        memory = self._memory(base_dir, chat_id)
+        query_vec = embed(query)
+        with self._lock:
+            hits = memory.search(query_vec, k, exclude)
+            return [(score, memory.texts[i]) for score, i in sorted(hits, key=lambda h: h[1])]
+
+    def invalidate(self, base_dir=None, chat_id=None):
+        with self._lock:
+            if base_dir is None:
+                self._chats.clear()
+                self._loading.clear()
+            else:
+                self._chats.pop((base_dir, str(chat_id)), None)
+                self._loading.pop((base_dir, str(chat_id)), None)
@@ -0,0 +1,91 @@
+"""Process-wide counters and gauges for the bridge, exported as log lines.
+
+    metrics.inc("scheduler.shed", chat="-100123")
+    metrics.set_gauge("scheduler.queued", 12)
+
+`start_exporter()` logs a `METRICS {...}` JSON line every interval (the GUI
+shows bridge logs) and, if a path is given, rewrites that JSON file too.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_providers = []  # callables returning {name: value} merged into snapshots
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+def inc(name, n=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register(provider):
+    """Adds a callable whose dict is merged into every snapshot (e.g. queue depths)."""
+    _providers.append(provider)
+
+
+def unregister(provider):
+    if provider in _providers:
+        _providers.remove(provider)
+
+
+def snapshot():
+    with _lock:
+        data = {"time": round(time.time(), 3), "counters": dict(_counters), "gauges": dict(_gauges)}
+    for provider in _providers:
+        try:
+            data["gauges"].update(provider())
+        except Exception as e:
+            logger.error(f"Metrics provider failed: {e}")
+    return data
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+    _providers.clear()
+
+
+async def _export_loop(interval, path):
+    last = None
+    while True:
+        await asyncio.sleep(interval)
+        snap = snapshot()
+        body = {k: v for k, v in snap.items() if k != "time"}
+        if body == last:
+            continue
+        last = body
+        logger.info("METRICS " + json.dumps(snap, ensure_ascii=False))
+        if path:
+            try:
+                tmp = f"{path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(snap, f, indent=1)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.error(f"Failed to write metrics to {path}: {e}")
+
+
+def start_exporter(interval=60.0, path=None):
+    """Starts the periodic exporter on the running event loop; returns the task."""
+    return asyncio.get_running_loop().create_task(_export_loop(interval, path))
@@ -0,0 +1,234 @@
+"""Latency benchmark for the configured agents and models.
+
+    python model_bench.py --agent coder --agent writer
+    python model_bench.py --model groq/llama-3.3-70b-versatile --model "google/gemini-2.0-flash (Free)" -n 5 -c 2
+    python model_bench.py --compare model_bench_reports/a.json model_bench_reports/b.json
+
+Each target (an agent from openclaw.json or a model id, with the key from
+auth-profiles.json) answers the standard prompt set `--runs` times over a
+streaming connection, at most `--concurrency` calls at once. Targets run one
+after another so they do not slow each other down. Per target the report
+has time-to-first-token and total latency percentiles, generation speed
+(completion tokens per second after the first token) and the error rate.
+
+Reports are saved as JSON (model_bench_reports/ by default) with the prompt
+set, so runs from different days or networks can be compared with --compare.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import providers
+
+OPENCLAW_CONFIG_PATH = os.path.expandvars(r"%USERPROFILE%\.openclaw\openclaw.json")
+AUTH_PROFILES_PATH = os.path.expandvars(r"%USERPROFILE%\.openclaw\auth-profiles.json")
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_bench_reports")
+
+# Short, fixed prompts: a chat answer, a list, code, a translation and a bit of reasoning
+PROMPTS = {
+    "chat": "Trả lời trong 2 câu: tại sao bầu trời có màu xanh?",
+    "list": "List five common uses of Python, one short line each.",
+    "code": "Write a Python function that checks whether a string is a palindrome. Code only.",
+    "translate": "Translate to English: 'Chúc bạn một ngày làm việc hiệu quả và vui vẻ.'",
+    "reasoning": "A train leaves at 14:05 and arrives at 17:50. How long is the trip? Answer briefly.",
+}
+
+
+def load_json(path):
+    try:
+        with open(path, encoding="utf-8-sig") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_targets(agents=(), models=(), config=None, auth_profiles=None):
+    """[(label, Target)] for agent names and raw model ids."""
+    config = config or {}
+    auth_profiles = auth_profiles or {}
+    targets = []
+    for agent in agents:
+        targets.append((agent, providers.resolve(agent, config, auth_profiles)))
+    for model in models:
+        clean = model.replace(" (Free)", "").strip()
+        provider = providers.detect_provider(clean)
+        key = "dummy" if provider in providers.KEYLESS else providers.find_api_key(auth_profiles, provider)
+        targets.append((model, providers.Target(providers.strip_prefix(clean, provider), key, provider)))
+    return targets
+
+
+def percentile(values, p):
+    """Nearest-rank percentile (p in 0..100) of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1))]
+
+
+def run_once(target, prompt_name, prompt, timeout=None):
+    """One streamed call; returns a sample dict (error set instead of raising)."""
+    stream = providers.Stream(target, [{"role": "user", "content": prompt}], timeout=timeout)
+    started = time.monotonic()
+    sample = {"prompt": prompt_name, "ok": False, "ttft_s": None, "latency_s": None, "tokens": 0,
+              "tokens_per_s": None, "error": None}
+    try:
+        chunks = sum(1 for _ in stream)
+    except Exception as e:
+        sample["error"] = f"{type(e).__name__}: {e}"
+        sample["latency_s"] = round(time.monotonic() - started, 4)
+        return sample
+    tokens = stream.usage["completion"] or chunks  # providers that report no usage: count deltas
+    generating = stream.latency - (stream.ttft or 0.0)
+    sample.update(ok=True, ttft_s=round(stream.ttft or stream.latency, 4), latency_s=round(stream.latency, 4),
+                  tokens=tokens, tokens_per_s=round(tokens / generating, 2) if generating > 0 else None)
+    return sample
+
+
+def summarize(samples):
+    ok = [s for s in samples if s["ok"]]
+
+    def _ms(values, p):
+        value = percentile(values, p)
+        return round(value * 1000, 1) if value is not None else None
+
+    ttft = [s["ttft_s"] for s in ok]
+    latency = [s["latency_s"] for s in ok]
+    speed = [s["tokens_per_s"] for s in ok if s["tokens_per_s"]]
+    return {
+        "calls": len(samples),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 3) if samples else 0.0,
+        "ttft_p50_ms": _ms(ttft, 50), "ttft_p90_ms": _ms(ttft, 90),
+        "latency_p50_ms": _ms(latency, 50), "latency_p90_ms": _ms(latency, 90), "latency_p99_ms": _ms(latency, 99),
+        "tokens_per_s_mean": round(statistics.fmean(speed), 1) if speed else None,
+        "tokens_per_s_p50": round(percentile(speed, 50), 1) if speed else None,
+        "completion_tokens": sum(s["tokens"] for s in ok),
+    }
+
+
+def run_benchmark(targets, runs=3, concurrency=1, prompts=None, timeout=None, on_sample=None, should_stop=None):
+    """Benchmarks each (label, Target) in turn; returns the report dict.
+
+    `on_sample(label, sample)` is called after every call (from a worker
+    thread); `should_stop()` returning True skips the calls not yet started.
+    """
+    prompts = prompts or PROMPTS
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "runs": runs, "concurrency": concurrency, "prompts": prompts, "results": [],
+    }
+    for label, target in targets:
+        jobs = [(name, text) for _ in range(runs) for name, text in prompts.items()]
+
+        def _job(job, label=label, target=target):
+            if should_stop and should_stop():
+                return None
+            sample = run_once(target, job[0], job[1], timeout)
+            if on_sample:
+                on_sample(label, sample)
+            return sample
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="model-bench") as pool:
+            samples = [s for s in pool.map(_job, jobs) if s is not None]
+        report["results"].append(dict(
+            label=label, provider=target.provider, model=target.model, wall_s=round(time.monotonic() - started, 3),
+            **summarize(samples), samples=samples,
+        ))
+        if should_stop and should_stop():
+            break
+    return report
+
+
+def save_report(report, path=None):
+    """Writes the report as JSON; returns the path (a timestamped file in REPORT_DIR by default)."""
+    if path is None:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = os.path.join(REPORT_DIR, f"model_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+COLUMNS = [("ttft_p50_ms", "TTFT p50"), ("ttft_p90_ms", "TTFT p90"), ("latency_p50_ms", "lat p50"),
+           ("latency_p90_ms", "lat p90"), ("latency_p99_ms", "lat p99"), ("tokens_per_s_p50", "tok/s"),
+           ("error_rate", "err")]
+
+
+def format_report(report):
+    """Plain-text table of a report."""
+    width = max([len(r["label"]) for r in report["results"]] + [6])
+    lines = [f"{'target':<{width}}  " + "  ".join(f"{title:>9}" for _, title in COLUMNS)]
+    for r in report["results"]:
+        cells = ["-" if r[key] is None else f"{r[key]:.0%}" if key == "error_rate" else f"{r[key]:.0f}"
+                 for key, _ in COLUMNS]
+        lines.append(f"{r['label']:<{width}}  " + "  ".join(f"{c:>9}" for c in cells))
+    return "\n".join(lines)
+
+
+def compare_reports(old, new):
+    """Text table of the change per target between two reports (targets matched by label)."""
+    before = {r["label"]: r for r in old["results"]}
+    lines = [f"{old.get('created', '?')} -> {new.get('created', '?')}"]
+    if old.get("prompts") != new.get("prompts"):
+        lines.append("warning: the reports used different prompt sets")
+    for r in new["results"]:
+        prev = before.get(r["label"])
+        if prev is None:
+            lines.append(f"{r['label']}: new")
+            continue
+        cells = []
+        for key, title in COLUMNS:
+            a, b = prev.get(key), r.get(key)
+            if a is None or b is None:
+                continue
+            if key == "error_rate":
+                cells.append(f"{title} {a:.0%}->{b:.0%}")
+            else:
+                change = f" ({(b - a) / a:+.0%})" if a else ""
+                cells.append(f"{title} {a:.0f}->{b:.0f}{change}")
+        lines.append(f"{r['label']}: " + ", ".join(cells))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure TTFT, speed and latency of the configured models")
+    parser.add_argument("--agent", action="append", default=[], help="Agent from openclaw.json (repeatable)")
+    parser.add_argument("--model", action="append", default=[], help="Model id, e.g. groq/llama3 (repeatable)")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="Times the prompt set is sent to each target")
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="Calls in flight per target")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-call timeout in seconds")
+    parser.add_argument("--prompts", help="JSON file {name: prompt} replacing the standard prompt set")
+    parser.add_argument("-o", "--output", help="Report path (default: model_bench_reports/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two saved reports and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(compare_reports(load_json(args.compare[0]), load_json(args.compare[1])))
+        return 0
+    if not args.agent and not args.model:
+        parser.error("give at least one --agent or --model")
+    prompts = load_json(args.prompts) if args.prompts else None
+    if args.prompts and not prompts:
+        parser.error(f"cannot read prompts from {args.prompts}")
+
+    targets = build_targets(args.agent, args.model, load_json(OPENCLAW_CONFIG_PATH), load_json(AUTH_PROFILES_PATH))
+
+    def _progress(label, sample):
+        status = f"{sample['latency_s']:.2f}s" if sample["ok"] else sample["error"]
+        print(f"  {label} [{sample['prompt']}] {status}", file=sys.stderr)
+
+    report = run_benchmark(targets, args.runs, args.concurrency, prompts, args.timeout, on_sample=_progress)
+    print(format_report(report))
+    print(f"Report saved to {save_report(report, args.output)}", file=sys.stderr)
+    return 1 if any(r["errors"] == r["calls"] for r in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
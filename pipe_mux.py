@@ -0,0 +1,176 @@
+"""One thread that moves output from any number of subprocess pipes.
+
+PipeMux replaces a blocking readline() thread per pipe. A single thread
+waits on every registered pipe with `selectors` (non-blocking pipes, woken
+through a self-pipe when a pipe is added). It decodes each stream
+incrementally, so a multi-byte character or a line split across reads is
+reassembled. Everything read in one wake-up is handed to `on_lines` as a
+single batch of (name, line) pairs. Lines end in "\\n"; "\\r\\n" is
+normalised as text-mode pipes did. A stream's last line is delivered at EOF
+even without a newline.
+
+select() cannot wait on pipes on Windows. There the same thread polls the
+pipes with PeekNamedPipe and reads only what is available.
+"""
+import codecs
+import locale
+import logging
+import os
+import selectors
+import threading
+import time
+
+try:
+    import _winapi
+    import msvcrt
+except ImportError:  # POSIX
+    _winapi = msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 65536
+MAX_PARTIAL = 65536  # a "line" with no newline this long is delivered as is
+WINDOWS_POLL_INTERVAL = 0.05
+
+
+class _Stream:
+    __slots__ = ("name", "pipe", "fd", "decoder", "partial")
+
+    def __init__(self, name, pipe, encoding):
+        self.name = name
+        self.pipe = pipe
+        self.fd = pipe.fileno()
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.partial = ""
+
+    def feed(self, data, out):
+        """Decodes `data` (b"" at EOF) and appends complete lines to `out`."""
+        text = self.partial + self.decoder.decode(data, final=not data)
+        if data and text.endswith("\r"):  # may be the first half of \r\n
+            text, self.partial = text[:-1], "\r"
+        else:
+            self.partial = ""
+        lines = text.replace("\r\n", "\n").split("\n")
+        tail = lines.pop()
+        out.extend((self.name, line + "\n") for line in lines)
+        if not data:
+            if tail:
+                out.append((self.name, tail + "\n"))
+        elif len(tail) >= MAX_PARTIAL:
+            out.append((self.name, tail + "\n"))
+        else:
+            self.partial = tail + self.partial
+
+
+class PipeMux:
+    def __init__(self, on_lines, encoding=None):
+        self.on_lines = on_lines  # called on the mux thread with [(name, line), ...]
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self._pending = []  # streams added since the thread last looked
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self._selector = None
+        self._wake_r = self._wake_w = None
+        if _winapi is None:
+            self._selector = selectors.DefaultSelector()
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+            self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    def add(self, name, pipe):
+        """Starts relaying a binary pipe (e.g. Popen(...).stdout) under `name`."""
+        if _winapi is None:
+            os.set_blocking(pipe.fileno(), False)
+        with self._lock:
+            self._pending.append(_Stream(name, pipe, self.encoding))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pipe-mux", daemon=True)
+                self._thread.start()
+        self._wake()
+
+    def _wake(self):
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"x")
+            except (BlockingIOError, OSError):  # already signalled / closed
+                pass
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def _deliver(self, batch):
+        if batch:
+            try:
+                self.on_lines(batch)
+            except Exception as e:
+                logger.error(f"on_lines failed: {e}")
+
+    def _finish(self, stream, batch):
+        stream.feed(b"", batch)
+        try:
+            stream.pipe.close()
+        except OSError:
+            pass
+
+    def _run(self):
+        if _winapi is None:
+            self._run_select()
+        else:
+            self._run_peek()
+
+    def _run_select(self):
+        while not self._closed:
+            for stream in self._take_pending():
+                self._selector.register(stream.fd, selectors.EVENT_READ, stream)
+            batch = []
+            for key, _ in self._selector.select():
+                stream = key.data
+                if stream is None:  # wake-up pipe
+                    try:
+                        while os.read(self._wake_r, 4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                try:
+                    data = os.read(stream.fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if data:
+                    stream.feed(data, batch)
+                else:
+                    self._selector.unregister(stream.fd)
+                    self._finish(stream, batch)
+            self._deliver(batch)
+
+    def _run_peek(self):
+        streams = []
+        while not self._closed:
+            streams += self._take_pending()
+            batch = []
+            for stream in list(streams):
+                try:
+                    available, _ = _winapi.PeekNamedPipe(msvcrt.get_osfhandle(stream.fd), 0)
+                    data = os.read(stream.fd, min(available, READ_SIZE)) if available else None
+                except OSError:  # broken pipe: the process exited
+                    data = b""
+                if data is None:
+                    continue
+                if data:
+                    stream.feed(data, batch)
+                else:
+                    streams.remove(stream)
+                    self._finish(stream, batch)
+            self._deliver(batch)
+            if not batch:
+                time.sleep(WINDOWS_POLL_INTERVAL)
+
+    def close(self):
+        self._closed = True
+        self._wake()
@@ -0,0 +1,740 @@
+"""Provider engine shared by the Telegram bridge and the GUI chat.
+
+One place for everything between "agent name" and "reply text":
+
+- agent resolution: model from openclaw.json, provider detected from the
+  model name, key looked up in auth-profiles.json (resolve);
+- a provider registry (PROVIDERS) mapping each provider to its API shape
+  and endpoint (ENDPOINTS, overridable for local stand-ins);
+- pooled keep-alive HTTP connections (POOL), so consecutive calls to a
+  provider skip the TCP/TLS handshake;
+- one timeout policy (timeout_for);
+- normalized errors: RateLimitError, AuthError, NotFoundError,
+  MissingKeyError / UnsupportedProviderError, or ProviderError for the rest.
+
+`complete()` is the blocking entry point (GUI threads, tools),
+`acomplete()` the asyncio one (bridge) and `Stream` yields the reply as it
+is generated (GUI chat).
+"""
+import asyncio
+import http.client
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT = "defaults"
+DEFAULT_MODEL = "google/gemini-2.0-flash-thinking-exp-1219"
+USER_AGENT = "OpenClaw/1.0"
+
+# Endpoints (overridable, e.g. by the offline benchmark's fake servers)
+ENDPOINTS = {
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "groq": "https://api.groq.com/openai/v1/chat/completions",
+    "openrouter": "https://openrouter.ai/api/v1/chat/completions",
+    "deepseek": "https://api.deepseek.com/chat/completions",
+    "mistral": "https://api.mistral.ai/v1/chat/completions",
+    "xai": "https://api.x.ai/v1/chat/completions",
+    "anthropic": "https://api.anthropic.com/v1/messages",
+    "ollama": "http://127.0.0.1:11434/api/chat",
+}
+GOOGLE_API_ENDPOINT = None  # Base URL of a Gemini REST stand-in; None uses the SDK default
+
+# provider -> API shape. Providers whose model ids carry a "provider/" prefix
+# that the API itself does not accept are listed in STRIP_PREFIX.
+PROVIDERS = {
+    "google": "gemini",
+    "openai": "openai", "groq": "openai", "openrouter": "openai",
+    "deepseek": "openai", "mistral": "openai", "xai": "openai",
+    "anthropic": "anthropic",
+    "ollama": "ollama",
+}
+STRIP_PREFIX = {"google", "groq", "openai", "anthropic", "deepseek", "mistral", "xai", "ollama"}
+KEYLESS = {"ollama"}
+# OpenAI-shaped providers known to accept stream_options (usage in the last chunk of a
+# stream); others may reject the unknown field. A 400 removes a provider from the set.
+STREAM_USAGE = {"openai", "groq", "deepseek", "xai"}
+
+# Timeout policy: local models may need to load into memory first
+DEFAULT_TIMEOUT = 45.0
+TIMEOUTS = {"ollama": 120.0}
+
+
+def timeout_for(provider):
+    return TIMEOUTS.get(provider, DEFAULT_TIMEOUT)
+
+
+# Prompt caching: providers only cache a prefix of at least this many tokens
+# (Anthropic and OpenAI 1024; Anthropic's Haiku models 2048)
+CACHE_MIN_TOKENS = int(os.getenv("OPENCLAW_CACHE_MIN_TOKENS", 1024))
+CHARS_PER_TOKEN = 4  # rough estimate; no tokenizer needed to size a prefix
+
+
+def cache_min_tokens(model=""):
+    return max(CACHE_MIN_TOKENS, 2048 if "haiku" in model.lower() else 0)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+# ── errors ──
+
+class ProviderError(Exception):
+    """A provider call failed. `status` is the HTTP status if there was one."""
+
+    def __init__(self, message, provider=None, status=None, retry_after=None):
+        super().__init__(message)
+        self.provider = provider
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimitError(ProviderError):
+    pass
+
+
+class AuthError(ProviderError):
+    pass
+
+
+class NotFoundError(ProviderError):
+    pass
+
+
+class ConfigError(ProviderError):
+    """Nothing was sent: the call cannot be made with the current configuration."""
+
+
+class MissingKeyError(ConfigError):
+    pass
+
+
+class UnsupportedProviderError(ConfigError):
+    pass
+
+
+_STATUS_ERRORS = {429: RateLimitError, 401: AuthError, 403: AuthError, 404: NotFoundError}
+
+
+def normalize_error(error, provider=None):
+    """Maps any exception from a provider call to a ProviderError subclass."""
+    if isinstance(error, ProviderError):
+        return error
+    status = getattr(error, "code", None)
+    if not isinstance(status, int):  # grpc-style .code() methods, OSError errno, ...
+        status = None
+    text = str(error)
+    if status is None:
+        if "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower():
+            status = 429
+        elif "API_KEY_INVALID" in text or "Unauthorized" in text:
+            status = 401
+    cls = _STATUS_ERRORS.get(status, ProviderError)
+    normalized = cls(text, provider, status)
+    normalized.__cause__ = error
+    return normalized
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ── provider / key resolution ──
+
+def detect_provider(model):
+    """Provider from a model name: explicit "provider/" prefix first, then name heuristics."""
+    m = model.lower().replace(" (free)", "").strip()
+    prefix = m.split("/", 1)[0] if "/" in m else None
+    if prefix in PROVIDERS or prefix == "huggingface":
+        return prefix
+    if "gemini" in m:
+        return "google"
+    if "groq" in m or "llama" in m or "mixtral" in m:
+        return "groq"
+    if "gpt" in m or m.startswith(("o1", "o3")):
+        return "openai"
+    if "claude" in m:
+        return "anthropic"
+    if "deepseek" in m:
+        return "deepseek"
+    if "mistral" in m or "codestral" in m:
+        return "mistral"
+    if "grok" in m:
+        return "xai"
+    return "google"
+
+
+def strip_prefix(model, provider):
+    """Model id as the provider's API expects it ("groq/llama3" -> "llama3")."""
+    if provider in STRIP_PREFIX and model.startswith(provider + "/"):
+        return model.split("/", 1)[1]
+    return model
+
+
+def find_api_key(auth_profiles, provider, agent_name=DEFAULT_AGENT):
+    """Key for `provider` from auth-profiles.json: "<provider>:<agent>", "<provider>:defaults", any profile of it."""
+    profiles = auth_profiles.get("profiles", {})
+    for candidate in (f"{provider}:{agent_name}", f"{provider}:{DEFAULT_AGENT}"):
+        profile = profiles.get(candidate)
+        if isinstance(profile, dict):
+            key = profile.get("key") or profile.get("apiKey")
+            if key:
+                return key
+    for name, profile in profiles.items():
+        if isinstance(profile, dict) and (profile.get("provider") == provider or name.split(":")[0] == provider):
+            key = profile.get("key") or profile.get("apiKey")
+            if key:
+                return key
+    # Fallback cuối: Google keys are often saved under another profile name
+    if provider == "google":
+        for profile in profiles.values():
+            if isinstance(profile, dict) and (profile.get("key") or profile.get("apiKey")):
+                return profile.get("key") or profile.get("apiKey")
+    return None
+
+
+Target = namedtuple("Target", "model api_key provider")
+
+
+def resolve(agent_name, config, auth_profiles):
+    """Target(model, api_key, provider) for an agent; api_key is None when no key is configured."""
+    agents = config.get("agents", {})
+    agent_conf = agents.get(agent_name) or agents.get(DEFAULT_AGENT, {})
+    model = agent_conf.get("model", {}).get("primary", DEFAULT_MODEL).replace(" (Free)", "").strip()
+    provider = detect_provider(model)
+    api_key = "dummy" if provider in KEYLESS else find_api_key(auth_profiles, provider, agent_name)
+    return Target(strip_prefix(model, provider), api_key, provider)
+
+
+# ── pooled HTTP transport ──
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections per host, shared by all threads.
+
+    Honours the usual *_PROXY environment variables (CONNECT tunnel for https).
+    """
+
+    def __init__(self, max_idle_per_host=8):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}  # (scheme, host, port) -> [HTTPConnection]
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _new(self, scheme, host, port, timeout):
+        proxy = urllib.request.getproxies().get(scheme)
+        if proxy and not urllib.request.proxy_bypass(host):
+            p = urllib.parse.urlsplit(proxy)
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(p.hostname, p.port or 80, timeout=timeout)
+                conn.set_tunnel(host, port)
+            else:
+                conn = http.client.HTTPConnection(p.hostname, p.port or 80, timeout=timeout)
+                conn._via_proxy = True
+        elif scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        self.opened += 1
+        return conn
+
+    def _acquire(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()
+                conn.timeout = timeout
+                if conn.sock:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+        return self._new(*key, timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def open(self, method, url, body=None, headers=None, timeout=DEFAULT_TIMEOUT):
+        """Sends a request; returns (response, release). Call release() once the body is read."""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        while True:
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, url if getattr(conn, "_via_proxy", False) else path, body=body,
+                             headers=headers or {})
+                response = conn.getresponse()
+                response.sock = conn.sock  # lets another thread abort a blocked read
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused:  # the server closed an idle keep-alive connection; try a fresh one
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+
+            def release(conn=conn, response=response):
+                if response.will_close or not response.isclosed():
+                    conn.close()
+                else:
+                    self._release(key, conn)
+            return response, release
+
+    def request(self, method, url, body=None, headers=None, timeout=DEFAULT_TIMEOUT):
+        """(status, headers, body bytes)."""
+        response, release = self.open(method, url, body, headers, timeout)
+        try:
+            data = response.read()
+        finally:
+            release()
+        return response.status, response.headers, data
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+POOL = ConnectionPool()
+
+
+def _http_error(provider, status, headers, data):
+    try:
+        detail = json.loads(data).get("error", {})
+        detail = detail.get("message", detail) if isinstance(detail, dict) else detail
+    except (ValueError, AttributeError):
+        detail = data[:200].decode("utf-8", "replace")
+    cls = _STATUS_ERRORS.get(status, ProviderError)
+    if "API_KEY_INVALID" in data.decode("utf-8", "replace"):  # Gemini answers a bad key with 400
+        cls = AuthError
+    return cls(f"HTTP {status}: {detail}", provider, status, _retry_after(headers))
+
+
+def _request_json(provider, method, url, payload, headers, timeout):
+    headers = dict(headers, **{"Content-Type": "application/json", "User-Agent": USER_AGENT})
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    try:
+        status, resp_headers, data = POOL.request(method, url, body, headers, timeout)
+    except OSError as e:  # includes socket timeouts
+        raise ProviderError(f"{type(e).__name__}: {e}", provider) from e
+    if status >= 400:
+        raise _http_error(provider, status, resp_headers, data)
+    return json.loads(data), resp_headers
+
+
+def post_json(provider, url, payload, headers, timeout):
+    """POSTs JSON through the pool; returns the decoded body or raises a normalized error."""
+    return _request_json(provider, "POST", url, payload, headers, timeout)[0]
+
+
+# Cheap authenticated endpoints that tell whether a key works (model list / key info)
+KEY_CHECK_ENDPOINTS = {
+    "google": "https://generativelanguage.googleapis.com/v1beta/models?pageSize=1",
+    "groq": "https://api.groq.com/openai/v1/models",
+    "openrouter": "https://openrouter.ai/api/v1/auth/key",
+    "openai": "https://api.openai.com/v1/models",
+    "anthropic": "https://api.anthropic.com/v1/models?limit=1",
+    "deepseek": "https://api.deepseek.com/models",
+    "mistral": "https://api.mistral.ai/v1/models",
+    "xai": "https://api.x.ai/v1/models",
+}
+
+# Response headers worth showing next to a key check (remaining requests / tokens, reset times)
+QUOTA_HEADER_PREFIXES = ("x-ratelimit-", "anthropic-ratelimit-", "ratelimit-", "retry-after")
+
+KeyCheck = namedtuple("KeyCheck", "provider data latency headers")
+
+
+def quota_headers(headers):
+    """Rate-limit / quota headers of a response, lower-cased."""
+    return {k.lower(): v for k, v in headers.items() if k.lower().startswith(QUOTA_HEADER_PREFIXES)}
+
+
+def check_key(provider, api_key, timeout=10.0):
+    """Calls the provider's key-check endpoint. Returns a KeyCheck; a rejected key raises AuthError."""
+    url = KEY_CHECK_ENDPOINTS.get(provider)
+    if url is None:
+        raise UnsupportedProviderError(f"No key check for provider '{provider}'", provider)
+    if provider == "google":
+        # REST instead of the SDK: genai.configure() would swap the process-wide key
+        if GOOGLE_API_ENDPOINT:
+            url = GOOGLE_API_ENDPOINT.rstrip("/") + "/v1beta/models?pageSize=1"
+        headers = {"x-goog-api-key": api_key}
+    elif provider == "anthropic":
+        headers = {"x-api-key": api_key, "anthropic-version": "2023-06-01"}
+    else:
+        headers = {"Authorization": f"Bearer {api_key}"}
+        if provider == "openrouter":
+            headers["HTTP-Referer"] = "https://github.com/hoang"
+    started = time.monotonic()
+    data, resp_headers = _request_json(provider, "GET", url, None, headers, timeout)
+    return KeyCheck(provider, data, time.monotonic() - started, dict(resp_headers))
+
+
+def _post_lines(provider, url, payload, headers, timeout, on_open=None):
+    """POSTs JSON and yields the response body line by line (SSE / NDJSON streams)."""
+    headers = dict(headers, **{"Content-Type": "application/json", "User-Agent": USER_AGENT})
+    try:
+        response, release = POOL.open("POST", url, json.dumps(payload).encode("utf-8"), headers, timeout)
+    except OSError as e:
+        raise ProviderError(f"{type(e).__name__}: {e}", provider) from e
+    if on_open:
+        on_open(response)
+    try:
+        if response.status >= 400:
+            raise _http_error(provider, response.status, response.headers, response.read())
+        for line in response:
+            line = line.strip()
+            if line:
+                yield line.decode("utf-8")
+    except OSError as e:
+        raise ProviderError(f"{type(e).__name__}: {e}", provider) from e
+    finally:
+        release()  # closes the connection if the caller stopped early
+
+
+# ── requests ──
+
+Completion = namedtuple("Completion", "text usage provider model latency")
+
+
+def _flatten(content):
+    return "\n\n".join(p for p in content if p) if isinstance(content, list) else content
+
+
+def _openai_request(target, system, messages, temperature):
+    msgs = [{"role": "system", "content": system}] if system else []
+    msgs += [{"role": m["role"], "content": _flatten(m["content"])} for m in messages]
+    headers = {"Authorization": f"Bearer {target.api_key}"}
+    if target.provider == "openrouter":
+        headers["HTTP-Referer"] = "https://github.com/hoang"
+    return {"model": target.model, "messages": msgs, "temperature": temperature}, headers
+
+
+def _anthropic_request(target, system, messages, temperature):
+    msgs = []
+    for m in messages:
+        content = m["content"]
+        if isinstance(content, list):
+            # Explicit cache breakpoint after the stable leading parts, if they are long
+            # enough to be cached at all (shorter prefixes are silently not cached)
+            blocks = [{"type": "text", "text": p} for p in content if p]
+            prefix = estimate_tokens((system or "") + "".join(b["text"] for b in blocks[:-1]))
+            if len(blocks) > 1 and prefix >= cache_min_tokens(target.model):
+                blocks[-2]["cache_control"] = {"type": "ephemeral"}
+            content = blocks
+        msgs.append({"role": m["role"], "content": content})
+    data = {"model": target.model, "max_tokens": 4096, "messages": msgs, "temperature": temperature}
+    if system:
+        data["system"] = system
+    return data, {"x-api-key": target.api_key, "anthropic-version": "2023-06-01"}
+
+
+def _ollama_request(target, system, messages, temperature):
+    msgs = [{"role": "system", "content": system}] if system else []
+    msgs += [{"role": m["role"], "content": _flatten(m["content"])} for m in messages]
+    return {"model": target.model, "messages": msgs, "stream": False, "options": {"temperature": temperature}}, {}
+
+
+_google_lock = threading.Lock()
+_google_configured = None
+
+
+def _google_model(target, system, temperature):
+    import google.generativeai as genai  # optional for the GUI
+    global _google_configured
+    with _google_lock:
+        # configure() is process-wide; only redo it when the key or endpoint changes
+        if _google_configured != (target.api_key, GOOGLE_API_ENDPOINT):
+            if GOOGLE_API_ENDPOINT:
+                genai.configure(api_key=target.api_key, transport="rest",
+                                client_options={"api_endpoint": GOOGLE_API_ENDPOINT})
+            else:
+                genai.configure(api_key=target.api_key)
+            _google_configured = (target.api_key, GOOGLE_API_ENDPOINT)
+    return genai.GenerativeModel(
+        model_name=target.model,
+        system_instruction=system or None,
+        generation_config={"temperature": temperature, "top_p": 0.95, "max_output_tokens": 8192},
+    )
+
+
+def _google_contents(messages):
+    return [{"role": "model" if m["role"] == "assistant" else "user",
+             "parts": [p for p in m["content"] if p] if isinstance(m["content"], list) else [m["content"]]}
+            for m in messages]
+
+
+def extract_usage(provider, payload):
+    """Prompt / cached-prompt / completion token counts from a provider response."""
+    usage = {"prompt": 0, "cached": 0, "completion": 0}
+    try:
+        if provider == "google":
+            meta = payload.usage_metadata
+            usage.update(prompt=meta.prompt_token_count or 0, cached=getattr(meta, "cached_content_token_count", 0) or 0,
+                         completion=meta.candidates_token_count or 0)
+        elif provider == "anthropic":
+            u = payload.get("usage", {})
+            read, created = u.get("cache_read_input_tokens") or 0, u.get("cache_creation_input_tokens") or 0
+            usage.update(prompt=(u.get("input_tokens") or 0) + read + created, cached=read,
+                         completion=u.get("output_tokens") or 0)
+        elif provider == "ollama":
+            usage.update(prompt=payload.get("prompt_eval_count") or 0, completion=payload.get("eval_count") or 0)
+        else:
+            u = payload.get("usage") or {}
+            cached = (u.get("prompt_tokens_details") or {}).get("cached_tokens") or u.get("prompt_cache_hit_tokens") or 0
+            usage.update(prompt=u.get("prompt_tokens") or 0, cached=cached, completion=u.get("completion_tokens") or 0)
+    except (AttributeError, TypeError):
+        pass
+    return usage
+
+
+def complete(target, messages, system=None, timeout=None, temperature=0.7):
+    """Blocking call. Returns a Completion or raises a ProviderError subclass.
+
+    `messages` is [{"role": "user"|"assistant", "content": str | [str, ...]}];
+    a list content is sent as separate parts where the API allows it (the
+    leading parts form a cacheable prefix), joined otherwise.
+    """
+    shape = PROVIDERS.get(target.provider)
+    if shape is None:
+        raise UnsupportedProviderError(f"Provider '{target.provider}' is not supported", target.provider)
+    if not target.api_key:
+        raise MissingKeyError(f"No API key for provider '{target.provider}'", target.provider)
+    timeout = timeout or timeout_for(target.provider)
+    started = time.monotonic()
+    try:
+        if shape == "gemini":
+            model = _google_model(target, system, temperature)
+            response = model.generate_content(_google_contents(messages), request_options={"timeout": timeout})
+            text, usage = response.text, extract_usage("google", response)
+        elif shape == "anthropic":
+            data, headers = _anthropic_request(target, system, messages, temperature)
+            result = post_json(target.provider, ENDPOINTS["anthropic"], data, headers, timeout)
+            text, usage = result["content"][0]["text"], extract_usage("anthropic", result)
+        elif shape == "ollama":
+            data, headers = _ollama_request(target, system, messages, temperature)
+            result = post_json(target.provider, ENDPOINTS["ollama"], data, headers, timeout)
+            text, usage = result["message"]["content"], extract_usage("ollama", result)
+        else:
+            data, headers = _openai_request(target, system, messages, temperature)
+            result = post_json(target.provider, ENDPOINTS[target.provider], data, headers, timeout)
+            text, usage = result["choices"][0]["message"]["content"], extract_usage(target.provider, result)
+    except ProviderError:
+        raise
+    except ImportError:
+        raise
+    except Exception as e:
+        raise normalize_error(e, target.provider) from e
+    return Completion(text, usage, target.provider, target.model, time.monotonic() - started)
+
+
+async def acomplete(target, messages, system=None, timeout=None, temperature=0.7):
+    """complete() for asyncio callers.
+
+    The reply is streamed in the default thread pool. Cancelling the caller
+    aborts the stream, so the provider stops generating (and billing) it
+    instead of finishing the request in the background.
+    """
+    stream = Stream(target, messages, system, timeout, temperature)
+    try:
+        return await asyncio.to_thread(_read_stream, stream)
+    except asyncio.CancelledError:
+        stream.abort()
+        raise
+
+
+def _read_stream(stream):
+    for _ in stream:
+        pass
+    return Completion(stream.text, stream.usage, stream.target.provider, stream.target.model, stream.latency)
+
+
+def _sse_data(lines):
+    for line in lines:
+        if line.startswith("data:"):
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+
+
+def _sdk_socket(sdk_stream):
+    """Socket under a REST-transport stream of the Gemini SDK (requests/urllib3), if reachable."""
+    raw = getattr(getattr(sdk_stream, "_response", None), "raw", None)
+    reader = getattr(getattr(raw, "_fp", None), "fp", None)  # http.client response -> socket file
+    return getattr(getattr(reader, "raw", None), "_sock", None)
+
+
+class Stream:
+    """Iterates over the text deltas of a reply as the provider generates it.
+
+    After iteration `text`, `usage`, `ttft` (seconds to the first delta) and
+    `latency` are set. Breaking out early (or close()) drops the connection.
+
+        stream = providers.Stream(target, messages)
+        for delta in stream:
+            ...
+    """
+
+    def __init__(self, target, messages, system=None, timeout=None, temperature=0.7):
+        self.target = target
+        self.messages = messages
+        self.system = system
+        self.timeout = timeout or timeout_for(target.provider)
+        self.temperature = temperature
+        self.parts = []
+        self.usage = {"prompt": 0, "cached": 0, "completion": 0}
+        self.ttft = None
+        self.latency = None
+        self._gen = None
+        self._response = None  # HTTP response being read (raw-HTTP providers)
+        self._sdk_stream = None  # chunk iterator of the Gemini SDK response
+        self.aborted = False
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def __iter__(self):
+        shape = PROVIDERS.get(self.target.provider)
+        if shape is None:
+            raise UnsupportedProviderError(f"Provider '{self.target.provider}' is not supported", self.target.provider)
+        if not self.target.api_key:
+            raise MissingKeyError(f"No API key for provider '{self.target.provider}'", self.target.provider)
+        started = time.monotonic()
+        self._gen = getattr(self, f"_{shape}")()
+        try:
+            for delta in self._gen:
+                if self.aborted:
+                    raise ProviderError("Stream aborted", self.target.provider)
+                if not delta:
+                    continue
+                if self.ttft is None:
+                    self.ttft = time.monotonic() - started
+                self.parts.append(delta)
+                yield delta
+        except (ProviderError, ImportError, GeneratorExit):
+            raise
+        except Exception as e:
+            if self.aborted:  # whatever the SDK raised when its connection was cut
+                raise ProviderError("Stream aborted", self.target.provider) from e
+            raise normalize_error(e, self.target.provider) from e
+        finally:
+            self._gen.close()
+            self.latency = time.monotonic() - started
+
+    def close(self):
+        if self._gen:
+            self._gen.close()
+
+    def abort(self):
+        """Stops the stream from another thread; a blocked read fails at once."""
+        self.aborted = True
+        for sock in (getattr(self._response, "sock", None), _sdk_socket(self._sdk_stream)):
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        # gRPC streams of the SDK stop on cancel(); REST ones just close (a blocked read
+        # in another thread only notices the shutdown above)
+        cancel = getattr(self._sdk_stream, "cancel", None)
+        if cancel is not None:
+            try:
+                cancel()
+            except Exception:
+                pass
+
+    def _opened(self, response):
+        self._response = response
+        if self.aborted:
+            self.abort()
+
+    def _openai(self):
+        provider = self.target.provider
+        data, headers = _openai_request(self.target, self.system, self.messages, self.temperature)
+        data["stream"] = True
+        if provider in STREAM_USAGE:
+            data["stream_options"] = {"include_usage": True}
+
+        def post():
+            lines = _post_lines(provider, ENDPOINTS[provider], data, headers, self.timeout, self._opened)
+            first = next(lines, None)  # a rejected request raises here, before anything is yielded
+            return itertools.chain(() if first is None else (first,), lines)
+
+        try:
+            lines = post()
+        except ProviderError as e:
+            if e.status != 400 or "stream_options" not in data:
+                raise
+            del data["stream_options"]
+            lines = post()
+            # e.g. an older OpenAI-compatible server behind an endpoint override
+            logger.warning(f"{provider} rejected stream_options, streaming without usage")
+            STREAM_USAGE.discard(provider)
+        for event in _sse_data(lines):
+            if event.get("usage"):
+                self.usage = extract_usage(self.target.provider, event)
+            for choice in event.get("choices") or ():
+                yield (choice.get("delta") or {}).get("content")
+
+    def _anthropic(self):
+        data, headers = _anthropic_request(self.target, self.system, self.messages, self.temperature)
+        data["stream"] = True
+        usage = {}
+        for event in _sse_data(_post_lines("anthropic", ENDPOINTS["anthropic"], data, headers, self.timeout,
+                                             self._opened)):
+            kind = event.get("type")
+            if kind == "message_start":
+                usage.update(event.get("message", {}).get("usage") or {})
+            elif kind == "message_delta":
+                usage.update(event.get("usage") or {})
+            elif kind == "content_block_delta":
+                yield event.get("delta", {}).get("text")
+            elif kind == "error":
+                raise ProviderError(event.get("error", {}).get("message", "stream error"), "anthropic")
+            self.usage = extract_usage("anthropic", {"usage": usage})
+
+    def _ollama(self):
+        data, headers = _ollama_request(self.target, self.system, self.messages, self.temperature)
+        data["stream"] = True
+        for line in _post_lines("ollama", ENDPOINTS["ollama"], data, headers, self.timeout, self._opened):
+            event = json.loads(line)
+            if event.get("error"):
+                raise ProviderError(event["error"], "ollama")
+            yield (event.get("message") or {}).get("content")
+            if event.get("done"):
+                self.usage = extract_usage("ollama", event)
+
+    def _gemini(self):
+        model = _google_model(self.target, self.system, self.temperature)
+        response = model.generate_content(_google_contents(self.messages), stream=True,
+                                          request_options={"timeout": self.timeout})
+        self._sdk_stream = getattr(response, "_iterator", None)
+        if self.aborted:
+            self.abort()
+        for chunk in response:
+            if self.aborted:  # the SDK may have buffered chunks: stop between them
+                raise ProviderError("Stream aborted", "google")
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield chunk.text
+            self.usage = extract_usage("google", chunk)
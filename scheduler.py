@@ -0,0 +1,194 @@
+"""Fair scheduling of provider calls across chats.
+
+Sits between update intake and the provider call. Jobs are queued per chat
+and dispatched to a fixed number of workers by deficit round-robin, so one
+noisy group cannot starve other chats. Two classes are served strictly in
+order: PRIORITY_DIRECT (DMs, @mentions, replies to the bot) before
+PRIORITY_AMBIENT (other group traffic).
+
+Queues are bounded per chat and in total. A job that does not fit is shed
+(its `on_shed` callback runs, typically a quick "busy" reply) instead of
+letting latency grow without limit. When the total limit is hit by a direct
+job, the newest ambient job of the longest ambient queue is shed to make room.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_DIRECT = 0
+PRIORITY_AMBIENT = 1
+PRIORITY_NAMES = {PRIORITY_DIRECT: "direct", PRIORITY_AMBIENT: "ambient"}
+
+
+class Job:
+    __slots__ = ("chat_id", "priority", "cost", "run", "on_shed", "enqueued")
+
+    def __init__(self, chat_id, priority, run, on_shed=None, cost=1):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.cost = cost
+        self.run = run  # async callable, no arguments
+        self.on_shed = on_shed  # async callable, no arguments
+        self.enqueued = time.monotonic()
+
+
+class _Class:
+    """Deficit round-robin over the per-chat queues of one priority class."""
+
+    def __init__(self, quantum):
+        self.quantum = quantum
+        self.queues = {}  # chat_id -> deque[Job]
+        self.deficit = {}
+        self.ring = deque()  # chats with queued jobs, in service order
+
+    def push(self, job):
+        q = self.queues.get(job.chat_id)
+        if q is None:
+            q = self.queues[job.chat_id] = deque()
+        if not q:
+            self.ring.append(job.chat_id)
+            self.deficit[job.chat_id] = 0
+        q.append(job)
+
+    def pop(self):
+        while self.ring:
+            chat_id = self.ring[0]
+            q = self.queues[chat_id]
+            if self.deficit[chat_id] < q[0].cost:
+                self.deficit[chat_id] += self.quantum
+                self.ring.rotate(-1)
+                continue
+            job = q.popleft()
+            self.deficit[chat_id] -= job.cost
+            if not q:
+                self.ring.popleft()
+                del self.queues[chat_id]
+                del self.deficit[chat_id]
+            return job
+        return None
+
+    def drop_newest_from_longest(self):
+        if not self.queues:
+            return None
+        chat_id = max(self.queues, key=lambda c: len(self.queues[c]))
+        q = self.queues[chat_id]
+        job = q.pop()
+        if not q:
+            self.ring.remove(chat_id)
+            del self.queues[chat_id]
+            del self.deficit[chat_id]
+        return job
+
+    def depth(self, chat_id=None):
+        if chat_id is None:
+            return sum(len(q) for q in self.queues.values())
+        return len(self.queues.get(chat_id, ()))
+
+
+class FairScheduler:
+    def __init__(self, workers=4, max_per_chat=5, max_total=200, quantum=1):
+        self.workers = workers
+        self.max_per_chat = max_per_chat
+        self.max_total = max_total
+        self._classes = {p: _Class(quantum) for p in PRIORITY_NAMES}
+        self._wakeup = None
+        self._tasks = []
+        self.running = 0
+        self.served = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.shed = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_total = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.wait_max = {name: 0.0 for name in PRIORITY_NAMES.values()}
+
+    # ── lifecycle ──
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        metrics.register(self.gauges)
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        metrics.unregister(self.gauges)
+
+    # ── intake ──
+    def depth(self, chat_id=None):
+        return sum(c.depth(chat_id) for c in self._classes.values())
+
+    def submit(self, job):
+        """Queues a job; returns False (after scheduling on_shed) if it was shed."""
+        if self.depth(job.chat_id) >= self.max_per_chat:
+            self._shed(job)
+            return False
+        if self.depth() >= self.max_total:
+            victim = None
+            if job.priority == PRIORITY_DIRECT:
+                victim = self._classes[PRIORITY_AMBIENT].drop_newest_from_longest()
+            if victim is None:
+                self._shed(job)
+                return False
+            self._shed(victim)
+        self._classes[job.priority].push(job)
+        if self._wakeup:
+            self._wakeup.set()
+        return True
+
+    def _shed(self, job):
+        name = PRIORITY_NAMES[job.priority]
+        self.shed[name] += 1
+        metrics.inc("scheduler.shed", priority=name)
+        logger.warning(f"Scheduler: shed {name} job for chat {job.chat_id} (queue {self.depth(job.chat_id)})")
+        if job.on_shed:
+            asyncio.get_running_loop().create_task(job.on_shed())
+
+    def _next(self):
+        for p in sorted(self._classes):
+            job = self._classes[p].pop()
+            if job:
+                return job
+        return None
+
+    # ── workers ──
+    async def _worker(self, n):
+        while True:
+            job = self._next()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            name = PRIORITY_NAMES[job.priority]
+            waited = time.monotonic() - job.enqueued
+            self.served[name] += 1
+            self.wait_total[name] += waited
+            self.wait_max[name] = max(self.wait_max[name], waited)
+            self.running += 1
+            try:
+                await job.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler job for chat {job.chat_id} failed: {e}")
+            finally:
+                self.running -= 1
+
+    def gauges(self):
+        out = {"scheduler.running": self.running, "scheduler.queued": self.depth()}
+        for p, name in PRIORITY_NAMES.items():
+            cls = self._classes[p]
+            out[f"scheduler.queued.{name}"] = cls.depth()
+            out[f"scheduler.chats.{name}"] = len(cls.queues)
+            out[f"scheduler.served.{name}"] = self.served[name]
+            out[f"scheduler.shed.{name}"] = self.shed[name]
+            if self.served[name]:
+                out[f"scheduler.wait_avg_ms.{name}"] = round(self.wait_total[name] / self.served[name] * 1000, 1)
+            out[f"scheduler.wait_max_ms.{name}"] = round(self.wait_max[name] * 1000, 1)
+        if self._classes[PRIORITY_AMBIENT].queues:
+            busiest = max(self._classes[PRIORITY_AMBIENT].queues.items(), key=lambda kv: len(kv[1]))
+            out["scheduler.busiest_chat"] = f"{busiest[0]}:{len(busiest[1])}"
+        return out
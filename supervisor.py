@@ -0,0 +1,195 @@
+"""Keeps the GUI's bridge processes alive and measures them.
+
+Supervisor owns every bridge subprocess. poll(), called from the Tk loop,
+notices exits, restarts crashed processes after an exponential backoff
+(reset once a process has stayed up for `stable_after` seconds) and samples
+each process's RSS and CPU use. A process stopped through stop() is never
+restarted.
+
+Resource figures come from /proc on Linux, from psutil if it is installed
+elsewhere, and are None when neither is available.
+"""
+import logging
+import os
+import subprocess
+import time
+
+try:
+    import psutil  # optional; only used where /proc is missing
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+RUNNING, BACKOFF, STOPPED, FAILED = "running", "backoff", "stopped", "failed"
+
+
+def _proc_sample(pid):
+    """(rss_bytes, cpu_seconds) for a pid, or (None, None)."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            resident = int(f.read().split()[1])
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+        return resident * os.sysconf("SC_PAGE_SIZE"), cpu
+    except (OSError, IndexError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        try:
+            p = psutil.Process(pid)
+            times = p.cpu_times()
+            return p.memory_info().rss, times.user + times.system
+        except Exception:
+            pass
+    return None, None
+
+
+class Supervised:
+    """One bridge: its command, current process and counters."""
+
+    def __init__(self, name, cmd, popen_kwargs):
+        self.name = name
+        self.cmd = cmd
+        self.popen_kwargs = popen_kwargs
+        self.proc = None
+        self.state = STOPPED
+        self.started_at = None
+        self.restarts = 0
+        self.failures = 0  # consecutive crashes, drives the backoff
+        self.last_exit = None
+        self.next_start = None
+        self.rss = None
+        self.cpu_percent = None
+        self._cpu_prev = None  # (monotonic, cpu_seconds)
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc else None
+
+    @property
+    def uptime(self):
+        if self.state != RUNNING or self.started_at is None:
+            return None
+        return time.monotonic() - self.started_at
+
+
+class Supervisor:
+    def __init__(self, on_start=None, backoff_base=1.0, backoff_max=60.0, stable_after=60.0, max_restarts=None):
+        self.on_start = on_start  # called with (entry) after every (re)start, e.g. to attach log readers
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.max_restarts = max_restarts
+        self.entries = {}
+
+    def start(self, name, cmd, **popen_kwargs):
+        """Starts (or replaces the command of) a bridge; raises OSError if it cannot be spawned."""
+        entry = self.entries.get(name)
+        if entry is None or entry.state in (STOPPED, FAILED):
+            entry = self.entries[name] = Supervised(name, cmd, popen_kwargs)
+        elif self.running(name):
+            return entry
+        self._spawn(entry)
+        return entry
+
+    def _spawn(self, entry):
+        entry.proc = subprocess.Popen(entry.cmd, **entry.popen_kwargs)
+        entry.state = RUNNING
+        entry.started_at = time.monotonic()
+        entry.next_start = None
+        entry.rss = entry.cpu_percent = entry._cpu_prev = None
+        if self.on_start:
+            self.on_start(entry)
+
+    def stop(self, name):
+        """Terminates a bridge for good; False if it was not running."""
+        entry = self.entries.get(name)
+        if entry is None or entry.state in (STOPPED, FAILED):
+            return False
+        was_running = entry.state == RUNNING
+        entry.state = STOPPED
+        entry.next_start = None
+        if entry.proc and entry.proc.poll() is None:
+            entry.proc.terminate()
+        return was_running
+
+    def running(self, name):
+        entry = self.entries.get(name)
+        return bool(entry and entry.state == RUNNING and entry.proc.poll() is None)
+
+    def active(self, name):
+        """Running or waiting to be restarted."""
+        entry = self.entries.get(name)
+        return bool(entry and entry.state in (RUNNING, BACKOFF))
+
+    def remove(self, name):
+        self.stop(name)
+        self.entries.pop(name, None)
+
+    def _delay(self, entry):
+        return min(self.backoff_base * 2 ** (entry.failures - 1), self.backoff_max)
+
+    def poll(self, now=None):
+        """Reaps exits, runs due restarts and samples resources.
+
+        Returns events for the caller to report: ("exited", entry, delay or None)
+        when a running process ended, ("restarted", entry, None) and
+        ("restart_failed", entry, error).
+        """
+        now = time.monotonic() if now is None else now
+        events = []
+        for entry in list(self.entries.values()):
+            if entry.state == RUNNING:
+                code = entry.proc.poll()
+                if code is None:
+                    self._sample(entry, now)
+                    continue
+                entry.last_exit = code
+                entry.rss = entry.cpu_percent = None
+                if now - entry.started_at >= self.stable_after:
+                    entry.failures = 0
+                entry.failures += 1
+                if self.max_restarts is not None and entry.restarts >= self.max_restarts:
+                    entry.state = FAILED
+                    events.append(("exited", entry, None))
+                    continue
+                delay = self._delay(entry)
+                entry.state = BACKOFF
+                entry.next_start = now + delay
+                events.append(("exited", entry, delay))
+            elif entry.state == BACKOFF and now >= entry.next_start:
+                entry.restarts += 1
+                try:
+                    self._spawn(entry)
+                    events.append(("restarted", entry, None))
+                except OSError as e:
+                    entry.failures += 1
+                    entry.next_start = now + self._delay(entry)
+                    events.append(("restart_failed", entry, e))
+        return events
+
+    def _sample(self, entry, now):
+        rss, cpu = _proc_sample(entry.proc.pid)
+        entry.rss = rss
+        if cpu is None:
+            entry.cpu_percent = None
+            return
+        if entry._cpu_prev is not None:
+            elapsed = now - entry._cpu_prev[0]
+            if elapsed > 0:
+                entry.cpu_percent = max(cpu - entry._cpu_prev[1], 0.0) / elapsed * 100
+        entry._cpu_prev = (now, cpu)
+
+    def rows(self):
+        """Snapshot of every bridge for display, sorted by name."""
+        return [{
+            "name": e.name, "state": e.state, "pid": e.pid if e.state == RUNNING else None,
+            "rss": e.rss, "cpu_percent": e.cpu_percent, "uptime": e.uptime, "restarts": e.restarts,
+            "last_exit": e.last_exit,
+            "restart_in": max(e.next_start - time.monotonic(), 0.0) if e.state == BACKOFF else None,
+        } for e in sorted(self.entries.values(), key=lambda e: e.name)]
+
+    def shutdown(self):
+        for name in list(self.entries):
+            self.stop(name)
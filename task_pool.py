@@ -0,0 +1,164 @@
+"""Bounded background execution for the GUI's network calls.
+
+Tk may only be touched from its own thread, and nothing slow may run on it.
+TaskPool runs callables on a fixed number of worker threads, refuses new work
+past `max_pending` tasks, and gives every task a CancelToken. A Stop button
+or the per-task timeout cancels the token; cancelling runs the callbacks the
+task registered with on_cancel() (e.g. aborting an HTTP stream), so a blocked
+read ends right away instead of when the provider finishes.
+
+Completions are queued and handed to their `on_done(task, result, error)`
+callback by poll(), which the UI thread calls from its `after` loop.
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    """The task was cancelled (Stop, timeout or shutdown); str() is the reason."""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+
+    def on_cancel(self, callback):
+        """Runs `callback` on cancellation (immediately if already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+
+class Task:
+    __slots__ = ("id", "name", "group", "token", "timeout", "on_done", "future", "submitted", "started")
+
+    def __init__(self, task_id, name, group, timeout, on_done):
+        self.id = task_id
+        self.name = name
+        self.group = group
+        self.token = CancelToken()
+        self.timeout = timeout
+        self.on_done = on_done
+        self.future = None
+        self.submitted = time.monotonic()
+        self.started = None
+
+
+class TaskPool:
+    def __init__(self, workers=4, max_pending=16):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gui-net")
+        self._tasks = {}  # id -> Task, queued or running
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._done = queue.Queue()
+
+    def submit(self, fn, *args, name="", group=None, timeout=None, on_done=None):
+        """Runs fn(token, *args) on a worker; returns the Task, or None if too many are pending.
+
+        `timeout` counts from when the task starts running.
+        """
+        with self._lock:
+            if len(self._tasks) >= self.max_pending:
+                return None
+            task = Task(next(self._ids), name, group, timeout, on_done)
+            self._tasks[task.id] = task
+        task.future = self._executor.submit(self._run, task, fn, args)
+        return task
+
+    def _run(self, task, fn, args):
+        task.started = time.monotonic()
+        timer = None
+        if task.timeout:
+            timer = threading.Timer(task.timeout, task.token.cancel, args=("timeout",))
+            timer.daemon = True
+            timer.start()
+        result, error = None, None
+        try:
+            task.token.check()
+            result = fn(task.token, *args)
+        except BaseException as e:
+            error = e
+        finally:
+            if timer:
+                timer.cancel()
+        if task.token.cancelled:  # whatever fn returned, the user no longer wants it
+            result, error = None, Cancelled(task.token.reason)
+        self._finish(task, result, error)
+
+    def _finish(self, task, result, error):
+        with self._lock:
+            if self._tasks.pop(task.id, None) is None:
+                return
+        self._done.put((task, result, error))
+
+    # ── cancellation ──
+    def cancel(self, task, reason="cancelled"):
+        task.token.cancel(reason)
+        if task.future is not None and task.future.cancel():  # still queued: it will never run
+            self._finish(task, None, Cancelled(reason))
+
+    def cancel_group(self, group, reason="cancelled"):
+        for task in self.tasks(group):
+            self.cancel(task, reason)
+
+    def tasks(self, group=None):
+        with self._lock:
+            return [t for t in self._tasks.values() if group is None or t.group == group]
+
+    def pending(self, group=None):
+        return len(self.tasks(group))
+
+    # ── UI thread ──
+    def poll(self, limit=100):
+        """Delivers up to `limit` completions to their on_done callbacks; returns how many."""
+        n = 0
+        while n < limit:
+            try:
+                task, result, error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            n += 1
+            if task.on_done:
+                try:
+                    task.on_done(task, result, error)
+                except Exception as e:
+                    logger.error(f"on_done for task '{task.name}' failed: {e}")
+        return n
+
+    def shutdown(self):
+        for task in self.tasks():
+            self.cancel(task, "shutdown")
+        self._executor.shutdown(wait=False, cancel_futures=True)
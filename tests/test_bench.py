@@ -0,0 +1,216 @@
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path to import bridge_server / bench
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.bench_bridge import BridgeSandbox, run_e2e, percentile, start_polling_app, stop_polling_app
+from bench.fake_servers import FakeProviderServer, FakeTelegramServer
+from bench.replay import replay, schedule
+from traffic_recorder import UpdateRecorder, load_recording
+import batch_runner
+from telegram import Update
+import bridge_server
+import metrics
+
+class TestFakeProviders(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = FakeProviderServer(reply_tokens=3).start()
+
+    def tearDown(self):
+        self.provider.stop()
+
+    def _ask(self, model):
+        with BridgeSandbox(model, self.provider):
+            return asyncio.run(bridge_server.process_with_model("defaults", "hi [bench:7]", "ctx"))
+
+    def test_openai_compatible(self):
+        self.assertTrue(self._ask("openai/gpt-4o-mini").startswith("[bench:7]"))
+        self.assertEqual(self.provider.requests[-1]["path"], "/v1/chat/completions")
+
+    def test_anthropic(self):
+        self.assertTrue(self._ask("anthropic/claude-3-5-haiku-20241022").startswith("[bench:7]"))
+        self.assertEqual(self.provider.requests[-1]["body"]["model"], "claude-3-5-haiku-20241022")
+
+    def test_ollama(self):
+        self.assertTrue(self._ask("ollama/llama3").startswith("[bench:7]"))
+        self.assertEqual(self.provider.requests[-1]["path"], "/api/chat")
+
+    def test_prompt_cache_usage_is_recorded(self):
+        """The stable prefix is sent first and cache-hit tokens are counted per agent."""
+        metrics.reset()
+        stable = "long stable shared history line " * 260  # over the 2048-token minimum of Haiku
+        for model, provider in [("anthropic/claude-3-5-haiku-20241022", "anthropic"),
+                                ("openai/gpt-4o-mini", "openai"), ("google/gemini-2.0-flash", "google")]:
+            with BridgeSandbox(model, self.provider):
+                for q in ("first [bench:1]", "second [bench:2]"):
+                    asyncio.run(bridge_server.process_with_model("defaults", q, "a new line", stable_context=stable))
+            counters = metrics.snapshot()["counters"]
+            self.assertEqual(counters[f"llm.calls{{agent=defaults,provider={provider}}}"], 2)
+            self.assertGreaterEqual(counters[f"llm.cached_tokens{{agent=defaults,provider={provider}}}"], 200, provider)
+        body = next(r["body"] for r in self.provider.requests if r["path"] == "/v1/messages")
+        self.assertEqual(body["system"], "You are defaults.")
+        self.assertEqual(body["messages"][0]["content"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertTrue(body["messages"][0]["content"][0]["text"].startswith("Context:\nlong stable"))
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = FakeProviderServer(reply_tokens=3, latency=0.2).start()
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "prompts.jsonl")
+        self.output = os.path.join(self.dir, "results.jsonl")
+        with open(self.input, "w", encoding="utf-8") as f:
+            for i in range(6):
+                f.write(json.dumps({"id": f"p{i}", "prompt": f"question [bench:{i}]"}) + "\n")
+
+    def tearDown(self):
+        self.provider.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _results(self):
+        with open(self.output, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.startswith("{") and line.rstrip().endswith("}")]
+
+    def test_results_and_resume(self):
+        """Each item gets a line with output, latency and usage; a second run skips finished ids."""
+        with BridgeSandbox("openai/gpt-4o-mini", self.provider):
+            with open(self.output, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"id": "p0", "status": "ok"}) + "\n" + '{"id": "p1", "sta')  # interrupted run
+            self.assertEqual(batch_runner.main([self.input, "-o", self.output, "--agent", "defaults"]), 0)
+            results = self._results()
+            self.assertEqual(sorted(r["id"] for r in results[1:]), ["p1", "p2", "p3", "p4", "p5"])
+            rec = next(r for r in results if r["id"] == "p3")
+            self.assertTrue(rec["output"].startswith("[bench:3]"))
+            self.assertEqual((rec["provider"], rec["model"], rec["attempts"]), ("openai", "gpt-4o-mini", 1))
+            self.assertGreater(rec["usage"]["prompt"], 0)
+            self.assertGreaterEqual(rec["latency_s"], 0.2)
+            requests = len(self.provider.requests)
+            batch_runner.main([self.input, "-o", self.output])
+            self.assertEqual(len(self.provider.requests), requests)
+
+    def test_per_provider_concurrency(self):
+        """--provider-limit bounds calls in flight for that provider."""
+        with BridgeSandbox("openai/gpt-4o-mini", self.provider):
+            start = time.monotonic()
+            batch_runner.main([self.input, "-o", self.output, "--agent", "defaults", "--provider-limit", "openai=2"])
+            elapsed = time.monotonic() - start
+        self.assertEqual(len(self._results()), 6)
+        self.assertGreaterEqual(elapsed, 0.6)  # 6 calls of 0.2s, two at a time
+
+    def test_errors_are_recorded(self):
+        """A non-retryable HTTP error is written as an error line and retried with --retry-errors."""
+        self.provider.fail_status = 401
+        with BridgeSandbox("openai/gpt-4o-mini", self.provider):
+            self.assertEqual(batch_runner.main([self.input, "-o", self.output, "--agent", "defaults"]), 1)
+            self.assertTrue(all(r["status"] == "error" and r["attempts"] == 1 for r in self._results()))
+            self.provider.fail_status = None
+            self.assertEqual(batch_runner.main([self.input, "-o", self.output, "--retry-errors"]), 0)
+        self.assertEqual(sum(r["status"] == "ok" for r in self._results()), 6)
+
+class TestEndToEnd(unittest.TestCase):
+
+    def test_bridge_round_trip(self):
+        """Messages pushed into the fake Bot API come back as sendMessage replies."""
+        cfg = {"name": "t", "model": "openai/gpt-4o-mini", "latency": 0.0, "tokens_per_sec": 0, "concurrency": 4}
+        result = asyncio.run(run_e2e(cfg, messages=8, chats=2))
+        self.assertTrue(result["complete"])
+        self.assertEqual(result["replies"], 8)
+        self.assertEqual(result["errors"], 0)
+
+    def test_fan_out_is_concurrent(self):
+        """A multi-agent message costs the slowest agent's time, not the sum."""
+        provider = FakeProviderServer(latency=0.6).start()
+        tg = FakeTelegramServer().start()
+        saved = bridge_server.FANOUT_MODE, bridge_server.DEBOUNCE_SECONDS
+
+        async def scenario():
+            app = await start_polling_app(tg, 1)
+            update_id = tg.push_message(7, "write this function and review it [bench:0]", chat_type="private")
+            ok = await asyncio.to_thread(tg.wait_for_sent, 2, 10)
+            await stop_polling_app(app)
+            return ok, update_id
+
+        try:
+            bridge_server.FANOUT_MODE, bridge_server.DEBOUNCE_SECONDS = "each", 0.0
+            with BridgeSandbox("openai/gpt-4o-mini", provider):
+                ok, update_id = asyncio.run(scenario())
+        finally:
+            bridge_server.FANOUT_MODE, bridge_server.DEBOUNCE_SECONDS = saved
+            tg.stop()
+            provider.stop()
+        self.assertTrue(ok)
+        self.assertEqual(sorted(s["text"].split("]")[0] for s in tg.sent), ["<b>[CODER", "<b>[REVIEWER"])
+        self.assertLess(max(s["time"] for s in tg.sent) - tg.pushed[update_id], 1.1)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+class TestTrafficRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "traffic.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _update(self, text, chat_id=-100123, user_id=42):
+        return Update.de_json({
+            "update_id": 9,
+            "message": {"message_id": 77, "date": 0, "text": text,
+                        "chat": {"id": chat_id, "type": "group"},
+                        "from": {"id": user_id, "is_bot": False, "first_name": "Alice"}},
+        }, None)
+
+    def test_record_is_anonymized(self):
+        recorder = UpdateRecorder(self.path, keywords=["review"], salt=b"s", bot_usernames=["coder_bot"])
+        recorder.record(self._update("Alice asks @coder_bot to review 42 files, cc @Bob_77 @bob_77"))
+        recorder.close()
+        rec = load_recording(self.path)[0]
+        human = f"@u{recorder._hash('bob_77')}"
+        self.assertEqual(rec["text"], f"xxxxx xxxx @coder_bot xx review 00 xxxxxx xx {human} {human}")
+        self.assertNotIn("bob", rec["text"].lower())
+        self.assertNotEqual(rec["chat_id"], -100123)
+        self.assertLess(rec["chat_id"], 0)
+        self.assertNotEqual(rec["user_id"], 42)
+        self.assertNotIn("Alice", json.dumps(rec))
+        self.assertEqual(rec["message_id"], 77)
+
+    def test_salt_survives_restart(self):
+        first = UpdateRecorder(self.path)
+        first.record(self._update("hi"))
+        first.close()
+        second = UpdateRecorder(self.path)  # bridge restarted, appending to the same recording
+        second.record(self._update("hi again"))
+        second.close()
+        a, b = load_recording(self.path)
+        self.assertEqual((a["chat_id"], a["user_id"]), (b["chat_id"], b["user_id"]))
+        if os.name == "posix":
+            self.assertEqual(os.stat(self.path + ".salt").st_mode & 0o777, 0o600)
+
+    def test_schedule_modes(self):
+        records = [{"t": 100.0}, {"t": 101.0}, {"t": 104.0}]
+        self.assertEqual(schedule(records, speed=1.0), [0.0, 1.0, 4.0])
+        self.assertEqual(schedule(records, speed=2.0), [0.0, 0.5, 2.0])
+        self.assertEqual(schedule(records, rate=10.0), [0.0, 0.1, 0.2])
+
+    def test_replay_reports_delays(self):
+        records = [{"t": i * 0.01, "chat_id": -5, "chat_type": "group", "user_id": i, "message_id": i + 1,
+                    "text": "xxx xx", "reply_to_bot": False} for i in range(5)]
+        report = asyncio.run(replay(records, latency=0.0, concurrency=2))
+        self.assertEqual(report["replies"], 5)
+        self.assertIn("p99_ms", report["dispatch_delay"])
+
+if __name__ == '__main__':
+    unittest.main()
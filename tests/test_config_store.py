@@ -0,0 +1,137 @@
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path to import config_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_store
+
+class TestConfigStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "openclaw.json")
+        self.backups = config_store.BackupStore(os.path.join(self.dir, "backups"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_debounced_atomic_saves_and_dedup_backups(self):
+        data = {"agents": {}}
+        saver = config_store.ConfigSaver(self.backups, delay=0.1)
+        for i in range(50):  # a burst of edits: one write at the end
+            data["agents"][f"a{i}"] = {"model": {"primary": "groq/llama"}}
+            saver.save(self.path, lambda: data)
+        self.assertFalse(os.path.exists(self.path))
+        deadline = time.monotonic() + 5
+        while saver.pending() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        time.sleep(0.1)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["agents"]), 50)
+        self.assertEqual(self.backups.versions("openclaw.json"), [])  # nothing replaced yet
+
+        self.assertEqual(saver.flush(), [])
+        saver.save(self.path, lambda: data, immediate=True)  # same content: not rewritten or backed up
+        self.assertEqual(self.backups.versions("openclaw.json"), [])
+
+        data["agents"]["new"] = {}
+        saver.save(self.path, lambda: data, immediate=True)
+        versions = self.backups.versions("openclaw.json")
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(len(json.loads(self.backups.read(versions[0][1]))["agents"]), 50)
+        self.assertEqual([f for f in os.listdir(self.dir) if f.endswith(".tmp")], [])
+
+        with self.assertRaises(TypeError):  # not serialisable: the file on disk is left intact
+            saver.save(self.path, lambda: {"bad": object()}, immediate=True)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertIn("new", json.load(f)["agents"])
+
+    @unittest.skipUnless(os.name == "posix", "POSIX permissions")
+    def test_replace_keeps_file_mode(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{}")
+        os.chmod(self.path, 0o644)
+        self.assertTrue(config_store.atomic_write_json(self.path, {"agents": {}}))
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+
+    def test_errors_are_raised_by_flush_and_reported_for_debounced_saves(self):
+        reported = []
+        saver = config_store.ConfigSaver(delay=0.05, on_error=lambda path, e: reported.append(path))
+        saver.save(self.path, lambda: {"ok": True})
+        saver.save(os.path.join(self.dir, "bad.json"), lambda: {"bad": object()})
+        with self.assertRaises(TypeError):  # an explicit flush raises to its caller
+            saver.flush()
+        self.assertEqual(reported, [])
+        self.assertTrue(os.path.exists(self.path))  # the other file was still written
+
+        saver.save(self.path, lambda: {"bad": object()})
+        deadline = time.monotonic() + 5
+        while not reported and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(reported, [self.path])
+
+    def test_retention_buckets(self):
+        now = 1_000_000_000.0
+        # A version every 10 minutes for 60 days, plus two alternating contents
+        for i in range(60 * 24 * 6, 0, -1):
+            self.backups.add("openclaw.json", f"v{i % 3}".encode(), when=now - i * 600)
+        before = len(self.backups.versions("openclaw.json"))
+        dropped = self.backups.prune(now=now)
+        kept = self.backups.versions("openclaw.json")
+        self.assertEqual(before - dropped, len(kept))
+        ages = [now - t for t, _ in kept]
+        self.assertEqual(len([a for a in ages if a < 3600]), 5)  # every version of the last hour
+        self.assertIn(len([a for a in ages if 3600 <= a < 86400]), (23, 24))  # hourly (buckets are clock-aligned)
+        self.assertLessEqual(len([a for a in ages if 86400 <= a < 30 * 86400]), 30)  # daily
+        self.assertLessEqual(len([a for a in ages if a >= 30 * 86400]), 6)  # weekly
+        objects = [f for _, _, files in os.walk(os.path.join(self.backups.backup_dir, "objects")) for f in files]
+        self.assertEqual(len(objects), 3)  # content-addressed: one object per distinct content
+
+        reopened = config_store.BackupStore(self.backups.backup_dir)
+        self.assertEqual(reopened.versions("openclaw.json"), kept)
+        self.assertEqual(reopened.prune(now=now), 0)
+
+    def test_three_way_merge(self):
+        base = {"agents": {"coder": {"model": "a"}, "writer": {"model": "b"}, "old": {}}, "port": 1}
+        mine = {"agents": {"coder": {"model": "mine"}, "writer": {"model": "b"}, "old": {}, "local": {}}, "port": 1}
+        theirs = {"agents": {"coder": {"model": "a"}, "writer": {"model": "w2"}, "js": {}}, "port": 2}
+        merged, conflicts = config_store.merge(base, mine, theirs)
+        self.assertEqual(merged, {"agents": {"coder": {"model": "mine"}, "writer": {"model": "w2"}, "local": {},
+                                             "js": {}}, "port": 2})
+        self.assertEqual(list(merged["agents"]), ["coder", "writer", "local", "js"])  # our order, new keys last
+        self.assertEqual(conflicts, [])
+
+        theirs["agents"]["coder"] = {"model": "theirs"}
+        merged, conflicts = config_store.merge(base, mine, theirs)
+        self.assertEqual(conflicts, [(("agents", "coder", "model"), "mine", "theirs")])
+        self.assertEqual(merged["agents"]["coder"], {"model": "mine"})
+        merged, _ = config_store.merge(base, mine, theirs, prefer_mine=False)
+        self.assertEqual(merged["agents"]["coder"], {"model": "theirs"})
+        self.assertEqual(merged["agents"]["local"], {})  # non-conflicting edits survive either way
+
+    def test_watcher_ignores_own_writes(self):
+        other = os.path.join(self.dir, "auth-profiles.json")
+        watcher = config_store.FileWatcher([self.path, other])
+        saver = config_store.ConfigSaver(on_saved=watcher.remember)
+        saver.save(self.path, lambda: {"agents": {}}, immediate=True)
+        watcher.remember(other, None)
+        self.assertEqual(watcher.changed(), [])
+
+        content = config_store.dumps({"agents": {"js": {}}})
+        with open(self.path, "wb") as f:  # an external tool rewrites the file
+            f.write(content)
+        os.utime(self.path, ns=(0, 12345))  # coarse-mtime filesystems: make sure the stat differs
+        self.assertEqual(watcher.changed(), [(self.path, content)])
+        self.assertEqual(watcher.changed(), [])
+        with open(other, "w", encoding="utf-8") as f:
+            f.write("{}")
+        self.assertEqual(watcher.changed(), [(other, b"{}")])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,293 @@
+import unittest
+import asyncio
+import os
+import socket
+import shutil
+import tempfile
+import sys
+import time
+
+# Add parent directory to path to import history_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history_store
+import history_bus
+
+class TestHistorySegments(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _append(self, n, start=0, **policy):
+        policy.setdefault("max_bytes", 200)
+        policy.setdefault("max_age", 0)
+        for i in range(start, start + n):
+            history_store.append_line(self.test_dir, "42", f"[User]: message number {i:04d}\n", **policy)
+
+    def test_rotation_by_size(self):
+        """Live segment is sealed into gzip segments with line/offset ranges."""
+        self._append(43)
+        index = history_store.load_index(self.test_dir, "42")
+        self.assertGreater(len(index["segments"]), 1)
+        expected_line = expected_offset = 0
+        for seg in index["segments"]:
+            self.assertTrue(seg["file"].endswith(".txt.gz"))
+            self.assertEqual(seg["first_line"], expected_line)
+            self.assertEqual(seg["first_offset"], expected_offset)
+            expected_line += seg["lines"]
+            expected_offset += seg["bytes"]
+        self.assertLess(os.path.getsize(history_store.live_path(self.test_dir, "42")), 200)
+
+    def test_read_all_is_complete_and_ordered(self):
+        self._append(43)
+        lines = history_store.read_all(self.test_dir, "42").splitlines()
+        self.assertEqual(lines, [f"[User]: message number {i:04d}" for i in range(43)])
+
+    def test_background_rotation_loses_no_lines(self):
+        """Appends racing a background rotation all end up in the history exactly once."""
+        import threading
+
+        def writer(tag):
+            for i in range(300):
+                history_store.append_line(self.test_dir, "9", f"[{tag}]: line {i:04d}\n", max_bytes=2000,
+                                          max_age=0, message_id=f"{tag}{i}" if tag == "A" else None,
+                                          rotate_in_background=True)
+
+        threads = [threading.Thread(target=writer, args=(tag,)) for tag in "AB"]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        history_store.wait_rotations(10)
+        self.assertGreater(len(history_store.load_index(self.test_dir, "9")["segments"]), 1)
+        records = history_store.parse_lines(history_store.read_all(self.test_dir, "9"))
+        for tag in "AB":
+            self.assertEqual([r.text for r in records if r.sender == tag], [f"line {i:04d}" for i in range(300)])
+
+    def test_tail_spans_newest_sealed_segment(self):
+        self._append(43)
+        full = history_store.read_all(self.test_dir, "42")
+        with open(history_store.live_path(self.test_dir, "42"), encoding="utf-8") as f:
+            live = f.read()
+        self.assertEqual(history_store.read_tail(self.test_dir, "42", 10), full[-10:])
+        self.assertEqual(history_store.read_tail(self.test_dir, "42", len(live) + 50), full[-(len(live) + 50):])
+
+    def test_retention_keeps_newest_segments(self):
+        self._append(80, keep_segments=2)
+        index = history_store.load_index(self.test_dir, "42")
+        self.assertEqual(len(index["segments"]), 2)
+        files = os.listdir(history_store.segment_dir(self.test_dir, "42"))
+        self.assertEqual(sorted(f for f in files if f.endswith(".gz")), [s["file"] for s in index["segments"]])
+        self.assertTrue(history_store.read_all(self.test_dir, "42").endswith("message number 0079\n"))
+
+    def test_legacy_file_is_split(self):
+        """An oversized pre-existing file is sealed into several bounded segments."""
+        with open(history_store.live_path(self.test_dir, "42"), "w", encoding="utf-8") as f:
+            for i in range(100):
+                f.write(f"[Old]: legacy line {i}\n")
+        self._append(1, start=100)
+        index = history_store.load_index(self.test_dir, "42")
+        self.assertGreater(len(index["segments"]), 5)
+        self.assertEqual(sum(s["lines"] for s in index["segments"]), 101)
+
+    def test_migration_is_not_cut_by_retention(self):
+        """A big legacy file keeps all its lines; only later regular segments count against keep_segments."""
+        with open(history_store.live_path(self.test_dir, "42"), "w", encoding="utf-8") as f:
+            for i in range(100):
+                f.write(f"[Old]: legacy line {i}\n")
+        self._append(1, start=100, keep_segments=2)
+        index = history_store.load_index(self.test_dir, "42")
+        self.assertGreater(len(index["segments"]), 2)
+        self.assertTrue(all(seg.get("migrated") for seg in index["segments"]))
+        self._append(60, start=101, keep_segments=2)
+        segments = history_store.load_index(self.test_dir, "42")["segments"]
+        self.assertEqual(len([seg for seg in segments if not seg.get("migrated")]), 2)
+        self.assertTrue(history_store.read_all(self.test_dir, "42").startswith("[Old]: legacy line 0\n"))
+
+    def test_long_rotation_keeps_its_lock_fresh(self):
+        """Compressing a big file refreshes the index lock so other processes don't break it as stale."""
+        with open(history_store.live_path(self.test_dir, "42"), "w", encoding="utf-8") as f:
+            for i in range(2000):
+                f.write(f"[Old]: legacy line {i}\n")
+        beats = []
+        original = history_store.LOCK_STALE_AFTER
+        history_store.LOCK_STALE_AFTER = 0.0  # beat on every line
+        try:
+            seg_dir = history_store.segment_dir(self.test_dir, "42")
+            os.makedirs(seg_dir)
+            history_store._seal(seg_dir, history_store.live_path(self.test_dir, "42"), {}, time.time(), 10_000,
+                                heartbeat=lambda: beats.append(1))
+        finally:
+            history_store.LOCK_STALE_AFTER = original
+        self.assertEqual(len(beats), 2000)
+
+    def test_unicode_tail(self):
+        history_store.append_line(self.test_dir, "7", "[User]: xin chào các bạn 👋\n", max_bytes=0, max_age=0)
+        self.assertEqual(history_store.read_tail(self.test_dir, "7", 6), "bạn 👋\n")
+
+class TestHistoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = history_store.HistoryCache(budget_bytes=10_000, chat_chars=300)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_write_through_and_memory_reads(self):
+        for i in range(50):
+            self.cache.append(self.test_dir, "1", "User", f"hello {i}")
+        on_disk = history_store.read_all(self.test_dir, "1")
+        original = history_store.read_tail
+        history_store.read_tail = lambda *a: self.fail("hot chat touched the filesystem")
+        try:
+            self.assertEqual(self.cache.tail(self.test_dir, "1", 250), on_disk[-250:])
+        finally:
+            history_store.read_tail = original
+        self.assertLessEqual(self.cache._chats[(self.test_dir, "1")].chars, 300 + 20)
+
+    def test_lazy_warm_from_disk(self):
+        """Existing files (incl. multi-line messages) are warmed and render identically."""
+        history_store.append_line(self.test_dir, "2", "[A]: line one\ncontinued\n", max_age=0)
+        history_store.append_line(self.test_dir, "2", "[B]: line two\n", max_age=0)
+        self.assertEqual(self.cache.tail(self.test_dir, "2", 200), "[A]: line one\ncontinued\n[B]: line two\n")
+        self.cache.append(self.test_dir, "2", "C", "three", max_age=0)
+        self.assertEqual(self.cache.tail(self.test_dir, "2", 200), history_store.read_all(self.test_dir, "2"))
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_lru_budget(self):
+        for chat in range(40):
+            self.cache.append(self.test_dir, str(chat), "User", "x" * 200, max_age=0)
+        self.assertLessEqual(self.cache.nbytes, 10_000)
+        self.assertGreater(self.cache.evictions, 0)
+        self.assertNotIn((self.test_dir, "0"), self.cache._chats)
+        self.assertIn((self.test_dir, "39"), self.cache._chats)
+        # Evicted chats are re-read from disk
+        self.assertIn("x" * 200, self.cache.tail(self.test_dir, "0", 250))
+
+class TestIdempotentAppends(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_same_message_recorded_once_across_caches(self):
+        """Two bridge processes (separate caches) seeing one Telegram message write it once."""
+        bot_a = history_store.HistoryCache()
+        bot_b = history_store.HistoryCache()
+        self.assertTrue(bot_a.append(self.test_dir, "-9", "Alice", "hi all", message_id=101, max_age=0))
+        history_store._seen.clear()  # the other process has no in-memory view of the index
+        self.assertFalse(bot_b.append(self.test_dir, "-9", "Alice", "hi all", message_id=101, max_age=0))
+        self.assertEqual(history_store.read_all(self.test_dir, "-9"), "[Alice]: hi all\n")
+        self.assertEqual(bot_b.tail(self.test_dir, "-9", 100), "[Alice]: hi all\n")
+        bot_b.ingest(self.test_dir, "-9", "Alice", "hi all", 101)  # late bus delivery
+        self.assertEqual(bot_b.tail(self.test_dir, "-9", 100), "[Alice]: hi all\n")
+
+    def test_unkeyed_lines_still_append(self):
+        self.assertTrue(history_store.append_line(self.test_dir, "3", "[bot]: a\n", max_age=0))
+        self.assertTrue(history_store.append_line(self.test_dir, "3", "[bot]: a\n", max_age=0))
+        self.assertEqual(history_store.read_all(self.test_dir, "3").count("[bot]: a"), 2)
+
+    def test_dedupe_index_is_compacted(self):
+        original = history_store.SEEN_KEEP
+        history_store.SEEN_KEEP = 10
+        try:
+            for mid in range(30):
+                history_store.append_line(self.test_dir, "4", f"[U]: m{mid}\n", message_id=mid, max_age=0)
+            ids, _ = history_store._load_seen(self.test_dir, "4")
+            self.assertLessEqual(len(ids), 20)
+            self.assertIn("29", ids)
+            self.assertFalse(history_store.append_line(self.test_dir, "4", "[U]: m29\n", message_id=29, max_age=0))
+        finally:
+            history_store.SEEN_KEEP = original
+
+KEY = b"test bus key"
+
+class TestHistoryBus(unittest.TestCase):
+
+    def _free_port(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def test_unauthenticated_peers_are_rejected(self):
+        port = self._free_port()
+
+        async def scenario():
+            got = []
+            hub = history_bus.HistoryBus(got.append, port=port, secret=KEY)
+            await hub.start()
+            # A local process that skips the handshake and just writes a record
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            record = b'{"node": "x", "dir": "/h", "chat_id": "1", "sender": "evil", "message": "hi"}\n'
+            writer.write(record * 3)
+            await writer.drain()
+            self.assertNotIn(b"welcome", await asyncio.wait_for(reader.read(), 2))  # dropped
+            writer.close()
+            # A peer with the wrong key never joins the relay
+            intruder = history_bus.HistoryBus(got.append, port=port, secret=b"wrong")
+            task = asyncio.create_task(intruder.start())
+            await asyncio.sleep(0.3)
+            hub.publish("/h", "1", "A", "private")
+            await asyncio.sleep(0.2)
+            self.assertEqual(got, [])
+            self.assertEqual(intruder.received, 0)
+            await intruder.stop()
+            task.cancel()
+            await hub.stop()
+
+        asyncio.run(scenario())
+
+    def test_secret_file_is_private(self):
+        path = os.path.join(tempfile.mkdtemp(), "bus.key")
+        try:
+            key = history_bus.load_secret(path)
+            self.assertEqual(history_bus.load_secret(path), key)
+            if os.name == "posix":
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+
+    def test_broadcast_and_hub_failover(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+        async def scenario():
+            got = {"a": [], "b": [], "c": []}
+            a = history_bus.HistoryBus(got["a"].append, port=port, secret=KEY)
+            b = history_bus.HistoryBus(got["b"].append, port=port, secret=KEY)
+            await a.start()
+            await b.start()
+            self.assertTrue(a.is_hub)
+            self.assertFalse(b.is_hub)
+            a.publish("/h", "1", "A", "from a")
+            b.publish("/h", "1", "B", "from b")
+            await asyncio.sleep(0.2)
+            self.assertEqual([r["message"] for r in got["b"]], ["from a"])
+            self.assertEqual([r["message"] for r in got["a"]], ["from b"])
+
+            # Hub goes away: b takes over and a new peer can join
+            await a.stop()
+            for _ in range(50):
+                if b.is_hub:
+                    break
+                await asyncio.sleep(0.05)
+            self.assertTrue(b.is_hub)
+            c = history_bus.HistoryBus(got["c"].append, port=port, secret=KEY)
+            await c.start()
+            c.publish("/h", "2", "C", "from c")
+            await asyncio.sleep(0.2)
+            self.assertEqual(got["b"][-1]["message"], "from c")
+            await c.stop()
+            await b.stop()
+
+        asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import os
+import sys
+import time
+
+# Add parent directory to path to import key_health / providers / bench
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_servers import FakeProviderServer
+import key_health
+import providers
+
+class TestKeyHealth(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeProviderServer(latency=0.3).start()
+        self.saved = providers.KEY_CHECK_ENDPOINTS, providers.GOOGLE_API_ENDPOINT
+        providers.KEY_CHECK_ENDPOINTS = self.server.key_check_endpoints()
+        providers.GOOGLE_API_ENDPOINT = self.server.google_endpoint
+
+    def tearDown(self):
+        providers.KEY_CHECK_ENDPOINTS, providers.GOOGLE_API_ENDPOINT = self.saved
+        self.server.stop()
+
+    def test_check_all(self):
+        auth = {"profiles": {
+            "openai:defaults": {"key": "sk-good"}, "anthropic:coder": {"apiKey": "bad-key"},
+            "google:defaults": {"key": "g"}, "openrouter:x": {"key": "or"}, "mistral:a": {"key": "m"},
+            "mistral:b": {"key": "m"}, "deepseek:defaults": {}, "ollama:local": {"key": "dummy"},
+            "huggingface:hf": {"key": "hf_x"},
+        }}
+        health = key_health.KeyHealth(ttl=60)
+        started = time.monotonic()
+        rows = {s.profile: s for s in health.check_all(auth)}
+        self.assertLess(time.monotonic() - started, 1.5)  # 5 probes x 0.3s, probed concurrently
+        self.assertEqual(len(self.server.requests), 5)  # the shared mistral key is probed once
+
+        self.assertEqual(rows["openai:defaults"].state, key_health.OK)
+        self.assertGreaterEqual(rows["openai:defaults"].latency, 0.3)
+        self.assertEqual(rows["openai:defaults"].quota, {"x-ratelimit-remaining-requests": "999"})
+        self.assertEqual(rows["anthropic:coder"].state, key_health.INVALID)
+        self.assertEqual(rows["google:defaults"].state, key_health.OK)
+        self.assertEqual(rows["openrouter:x"].quota, {"limit_remaining": 42.0})
+        self.assertEqual(rows["mistral:b"].state, key_health.OK)
+        self.assertEqual(rows["deepseek:defaults"].state, key_health.MISSING)
+        self.assertEqual(rows["ollama:local"].state, key_health.UNCHECKED)
+        self.assertEqual(rows["huggingface:hf"].state, key_health.UNCHECKED)
+        self.assertTrue(all(r["path"].startswith(("/v1/", "/v1beta/", "/api/v1/")) for r in self.server.requests))
+
+        health.check_all(auth)  # cached
+        self.assertEqual(len(self.server.requests), 5)
+        health.check_all(auth, force=True)
+        self.assertEqual(len(self.server.requests), 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# Add parent directory to path to import learned_router / bench
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy  # noqa: F401  (optional dependency)
+except ImportError:
+    numpy = None
+
+EXAMPLES = {
+    "coder": ["please fix this bug in my python script", "implement a function that sorts a list",
+              "write code to parse json", "sửa lỗi hàm này giúp mình", "the class throws an exception",
+              "refactor this method", "why does my loop crash", "viết code đọc file csv"],
+    "reviewer": ["can you review my pull request", "check this essay for mistakes",
+                 "audit the security of this config", "đánh giá bài viết này",
+                 "kiểm tra giúp mình đoạn này", "assess the quality of the design"],
+    "writer": ["write a blog post about travel", "draft a newsletter for customers",
+               "soạn thảo email cho khách hàng", "viết bài giới thiệu sản phẩm",
+               "create content for instagram", "write a poem about autumn"],
+}
+
+@unittest.skipUnless(numpy, "numpy not installed")
+class TestLearnedRouter(unittest.TestCase):
+
+    def setUp(self):
+        from learned_router import LinearRouter
+        self.test_dir = tempfile.mkdtemp()
+        texts = [t for ts in EXAMPLES.values() for t in ts]
+        labels = [a for a, ts in EXAMPLES.items() for _ in ts]
+        self.model = LinearRouter.fit(texts, labels)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_predict_and_round_trip(self):
+        from learned_router import LinearRouter
+        self.assertEqual(self.model.predict("fix the crash in my function")[0], "coder")
+        self.assertEqual(self.model.predict("write a blog about food")[0], "writer")
+        path = os.path.join(self.test_dir, "router.npz")
+        self.model.save(path)
+        loaded = LinearRouter.load(path)
+        self.assertEqual(loaded.classes, self.model.classes)
+        agent, conf = loaded.predict("review my pull request please")
+        self.assertEqual(agent, "reviewer")
+        self.assertAlmostEqual(conf, self.model.predict("review my pull request please")[1], places=5)
+        agents, confs = loaded.predict_batch(["review my pull request please", "fix the crash in my function"])
+        self.assertEqual(agents, ["reviewer", "coder"])
+
+    def test_low_confidence_falls_back(self):
+        self.assertEqual(self.model.route("zzz", lambda t: "defaults", threshold=0.99), "defaults")
+        self.assertEqual(self.model.route("fix the crash in my function", lambda t: "defaults", threshold=0.0), "coder")
+
+    def test_examples_from_history(self):
+        from learned_router import examples_from_history
+        with open(os.path.join(self.test_dir, "-100.txt"), "w", encoding="utf-8") as f:
+            f.write("[An]: fix my loop\n[coder]: done\n[Binh]: hi\n[An]: review it\n[reviewer]: ok\n")
+        self.assertEqual(examples_from_history(self.test_dir, ["coder", "reviewer"]),
+                         [("fix my loop", "coder"), ("review it", "reviewer")])
+
+    def test_eval_command(self):
+        from bench import eval_router
+        from learned_router import DEFAULT_THRESHOLD
+        path = os.path.join(self.test_dir, "labeled.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for agent, texts in EXAMPLES.items():
+                for t in texts:
+                    f.write(json.dumps({"text": t, "agent": agent}) + "\n")
+        model_path = os.path.join(self.test_dir, "router.npz")
+        with contextlib.redirect_stdout(io.StringIO()):
+            eval_router.main(["train", "--data", path, "-o", model_path])
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            eval_router.main(["eval", "--data", path, "--model", model_path])
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["threshold"], DEFAULT_THRESHOLD)
+        self.assertEqual(report["examples"], 20)
+        self.assertGreaterEqual(report["accuracy_learned"], report["accuracy_keywords"])
+        self.assertLess(report["latency_us"]["p50"], 1000)
+
+        # The bridge loads the saved model when OPENCLAW_ROUTER=learned
+        import bridge_server
+        saved = bridge_server.ROUTER_MODE, bridge_server.ROUTER_MODEL_PATH, bridge_server._learned_router
+        try:
+            bridge_server.ROUTER_MODE, bridge_server.ROUTER_MODEL_PATH = "learned", model_path
+            bridge_server._learned_router = None
+            self.assertEqual(bridge_server.route_message("draft a newsletter about autumn"), "writer")
+        finally:
+            bridge_server.ROUTER_MODE, bridge_server.ROUTER_MODEL_PATH, bridge_server._learned_router = saved
+
+if __name__ == '__main__':
+    unittest.main()
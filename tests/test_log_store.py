@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add parent directory to path to import log_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_store
+
+class TestLogStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = log_store.LogStore(self.tmp.name, max_bytes=40 * 1024, backups=2)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def _write(self, bot, count, start=0):
+        for i in range(start, start + count):
+            level = "ERROR" if i % 100 == 0 else "INFO"
+            self.store.write(bot, f"2026-01-01 00:00:00 - bridge - {level} - line {i:06d}\n")
+
+    def test_rotation_and_paging(self):
+        """Files rotate by size; the reader pages across segments and follows growth incrementally."""
+        self._write("Bot A", 3000)
+        self._write("other", 10)
+        self.assertEqual(self.store.bots(), ["Bot_A", "other"])
+        self.assertEqual(len(self.store.segments("Bot A")), 3)
+        self.assertTrue(all(os.path.getsize(p) <= 40 * 1024 for p in self.store.segments("Bot A")))
+
+        reader = log_store.LogReader(self.store, "Bot A")
+        self.assertFalse(reader.refresh(budget=16 * 1024))  # indexing is spread over several calls
+        while not reader.refresh(budget=16 * 1024):
+            pass
+        total = reader.total
+        self.assertLess(total, 3000)  # the oldest segment was dropped
+        last = reader.lines_before(total, 3)
+        self.assertEqual([text[-6:] for _, text in last], ["002997", "002998", "002999"])
+        self.assertEqual([n for n, _ in last], [total - 3, total - 2, total - 1])
+        first_no = int(reader.lines(0, 1)[0][1][-6:])
+        self.assertEqual(reader.lines(500, 2)[1][1][-6:], f"{first_no + 501:06d}")
+
+        self._write("Bot A", 5, start=3000)
+        reader.refresh()
+        self.assertEqual(reader.lines_before(reader.total, 1)[0][1][-6:], "003004")
+
+    def test_level_filter_and_search(self):
+        self._write("bot", 1000)
+        reader = log_store.LogReader(self.store, "bot")
+        reader.refresh()
+        errors = reader.lines(0, 100, min_level=log_store.LEVELS["ERROR"])
+        self.assertTrue(all("ERROR" in text for _, text in errors))
+        self.assertEqual(len(errors), len([n for n in range(1000) if n % 100 == 0 and n >= 1000 - reader.total]))
+        tail = reader.lines_before(reader.total, 2, min_level=log_store.LEVELS["WARNING"])
+        self.assertEqual([text[-6:] for _, text in tail], ["000800", "000900"])
+
+        hit = reader.search("LINE 000750", -1)
+        self.assertTrue(reader.lines(hit, 1)[0][1].endswith("000750"))
+        self.assertEqual(reader.search("line 000750", hit), None)
+        self.assertEqual(reader.search("line 000750", reader.total, backwards=True), hit)
+        self.assertEqual(log_store.line_level("x - WARNING - y"), 30)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+# Add parent directory to path to import memory_index
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history_store
+
+try:
+    import numpy  # noqa: F401  (optional dependency)
+except ImportError:
+    numpy = None
+
+FILLER = ["good morning all", "lunch at noon?", "see you later", "nice weather today", "ok thanks"]
+
+@unittest.skipUnless(numpy, "numpy not installed")
+class TestMemoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _append(self, chat_id, sender, message, **policy):
+        history_store.append_line(self.test_dir, chat_id, f"[{sender}]: {message}\n", **policy)
+
+    def test_search_finds_old_relevant_message(self):
+        import memory_index
+        self._append("1", "An", "our postgres password rotation runs every friday at 3am")
+        for i in range(200):
+            self._append("1", "Binh", f"{FILLER[i % len(FILLER)]} {i}")
+        index = memory_index.MemoryIndex()
+        hits = index.search(self.test_dir, "1", "when does the postgres password rotation run?")
+        self.assertTrue(hits)
+        self.assertIn("postgres password rotation", hits[0][1])
+
+        # Appends after loading are indexed incrementally
+        index.add(self.test_dir, "1", "An", "the kubernetes ingress certificate expires in june")
+        hits = index.search(self.test_dir, "1", "kubernetes certificate expiry", k=1)
+        self.assertIn("kubernetes ingress certificate", hits[0][1])
+
+        # Excluded texts (already in the recent window) are skipped
+        hits = index.search(self.test_dir, "1", "kubernetes certificate expiry", k=1,
+                            exclude=lambda text: "kubernetes" in text)
+        self.assertNotIn("kubernetes", hits[0][1] if hits else "")
+
+    def test_appends_are_queued_and_survive_a_concurrent_load(self):
+        import memory_index
+        index = memory_index.MemoryIndex()
+        self._append("4", "An", "first line")
+        index.search(self.test_dir, "4", "first")
+        original = memory_index.embed_many
+        memory_index.embed_many = lambda texts: self.fail("add() embedded on the caller's thread")
+        try:
+            self._append("4", "An", "second line")
+            index.add(self.test_dir, "4", "An", "second line")
+        finally:
+            memory_index.embed_many = original
+        self.assertEqual(index.search(self.test_dir, "4", "second line", k=1)[0][1], "[An]: second line")
+
+        # Lines appended while another chat is loading (outside the lock) are neither lost nor doubled
+        self._append("5", "Binh", "written before the load")
+        load = index._load
+
+        def racing_load(base_dir, chat_id):
+            index.add(base_dir, chat_id, "Binh", "written before the load")  # already on disk
+            memory = load(base_dir, chat_id)
+            self._append(chat_id, "Binh", "written during the load")
+            index.add(base_dir, chat_id, "Binh", "written during the load")
+            return memory
+
+        index._load = racing_load
+        index.search(self.test_dir, "5", "load")
+        self.assertEqual(index._chats[(self.test_dir, "5")].texts,
+                         ["[Binh]: written before the load", "[Binh]: written during the load"])
+
+    def test_sealed_segment_vectors_are_cached(self):
+        import memory_index
+        for i in range(60):
+            self._append("2", "U", f"message number {i} about topic {i % 7}", max_bytes=500)
+        segments = history_store.load_index(self.test_dir, "2")["segments"]
+        self.assertGreater(len(segments), 1)
+        first = memory_index.MemoryIndex()._load(self.test_dir, "2")
+        seg_dir = history_store.segment_dir(self.test_dir, "2")
+        cached = [n for n in os.listdir(seg_dir) if n.endswith(".vec.npy")]
+        self.assertEqual(len(cached), len(segments))
+        second = memory_index.MemoryIndex()._load(self.test_dir, "2")
+        self.assertEqual(second.texts, first.texts)
+        self.assertEqual(second.n, 60)
+
+        # Retention drops a segment: its cached vectors go too
+        history_store.apply_retention(self.test_dir, "2", keep_segments=1, keep_days=0)
+        memory_index.MemoryIndex()._load(self.test_dir, "2")
+        self.assertEqual(len([n for n in os.listdir(seg_dir) if n.endswith(".vec.npy")]), 1)
+
+    def test_bridge_context_includes_relevant_snippets(self):
+        os.environ.setdefault("TELEGRAM_TOKEN", "123456:TEST")
+        import bridge_server
+        import memory_index
+        saved = bridge_server.HISTORY_DIR, bridge_server.MEMORY
+        try:
+            bridge_server.HISTORY_DIR = self.test_dir
+            bridge_server.MEMORY = memory_index.MemoryIndex()
+            bridge_server.append_to_history("3", "An", "the staging database lives on host db-stage-7")
+            for i in range(400):
+                bridge_server.append_to_history("3", "Binh", f"{FILLER[i % len(FILLER)]} {i}")
+            stable, volatile = bridge_server.build_context("3", "which host is the staging database on?")
+            self.assertTrue(volatile.startswith("Relevant earlier messages:\n[An]: the staging database"))
+            self.assertTrue(bridge_server.get_history("3", 3 * bridge_server.CONTEXT_CHARS).endswith(stable))
+        finally:
+            bridge_server.HISTORY_DIR, bridge_server.MEMORY = saved
+
+if __name__ == '__main__':
+    unittest.main()
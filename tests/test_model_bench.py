@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to path to import model_bench / providers / bench
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_servers import FakeProviderServer
+import model_bench
+import providers
+
+class TestModelBench(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeProviderServer(latency=0.05, tokens_per_sec=200, reply_tokens=10).start()
+        self.failing = FakeProviderServer(fail_status=503).start()
+        self.saved = providers.ENDPOINTS
+        providers.ENDPOINTS = dict(providers.ENDPOINTS, **self.server.endpoints())
+        providers.ENDPOINTS["mistral"] = self.failing.endpoints()["mistral"]
+
+    def tearDown(self):
+        providers.ENDPOINTS = self.saved
+        self.server.stop()
+        self.failing.stop()
+
+    def test_benchmark_report(self):
+        config = {"agents": {"coder": {"model": {"primary": "anthropic/claude-3-5-haiku-20241022"}}}}
+        auth = {"profiles": {"anthropic:coder": {"key": "a"}, "openai:defaults": {"key": "o"},
+                             "mistral:defaults": {"key": "m"}}}
+        targets = model_bench.build_targets(["coder"], ["gpt-4o-mini", "mistral/mistral-small", "groq/llama3"],
+                                            config, auth)
+        self.assertEqual([t.provider for _, t in targets], ["anthropic", "openai", "mistral", "groq"])
+        prompts = {"a": "hello", "b": "world"}
+        seen = []
+        started = time.monotonic()
+        report = model_bench.run_benchmark(targets, runs=3, concurrency=3, prompts=prompts,
+                                           on_sample=lambda label, s: seen.append(label))
+        # 6 calls of ~0.1s per target at concurrency 3: about 0.2s each, not 0.6s
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(len(seen), 4 * 6)
+        results = {r["label"]: r for r in report["results"]}
+
+        coder = results["coder"]
+        self.assertEqual((coder["calls"], coder["errors"]), (6, 0))
+        self.assertGreaterEqual(coder["ttft_p50_ms"], 50)
+        self.assertGreater(coder["latency_p90_ms"], coder["ttft_p50_ms"])
+        self.assertTrue(100 < coder["tokens_per_s_p50"] < 400)  # the stand-in streams 200 tok/s
+        self.assertEqual(coder["completion_tokens"], 60)
+        self.assertEqual(results["mistral/mistral-small"]["error_rate"], 1.0)
+        self.assertIn("MissingKeyError", results["groq/llama3"]["samples"][0]["error"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = model_bench.save_report(report, os.path.join(tmp, "r.json"))
+            saved = model_bench.load_json(path)
+        self.assertEqual(saved["prompts"], prompts)
+        self.assertIn("coder", model_bench.format_report(saved))
+        self.assertIn("gpt-4o-mini: TTFT p50", model_bench.compare_reports(saved, report))
+
+    def test_stop(self):
+        targets = model_bench.build_targets([], ["gpt-4o-mini", "gpt-4o"], {}, {"profiles": {"openai:x": {"key": "o"}}})
+        calls = []
+        report = model_bench.run_benchmark(targets, runs=5, prompts={"a": "x"},
+                                           on_sample=lambda label, s: calls.append(s),
+                                           should_stop=lambda: len(calls) >= 2)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(report["results"]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
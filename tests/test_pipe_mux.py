@@ -0,0 +1,76 @@
+import unittest
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Add parent directory to path to import pipe_mux
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipe_mux
+
+CHILD = r"""
+import sys, time
+out = sys.stdout.buffer
+name = sys.argv[1]
+out.write(f"{name} hello\r\n".encode()); out.flush()
+out.write(b"split "); out.flush(); time.sleep(0.05)
+out.write(b"line\n"); out.flush()
+for byte in "tiếng Việt\n".encode("utf-8"):  # one byte per read: multi-byte chars arrive in pieces
+    out.write(bytes([byte])); out.flush(); time.sleep(0.002)
+sys.stderr.write("to stderr\n"); sys.stderr.flush()
+out.write(b"no newline at exit")
+"""
+
+class TestPipeMux(unittest.TestCase):
+
+    def test_many_pipes_one_thread(self):
+        batches = []
+        done = threading.Event()
+        lines = {}
+
+        def on_lines(batch):
+            batches.append(batch)
+            for name, line in batch:
+                lines.setdefault(name, []).append(line)
+            if sum(len(v) for v in lines.values()) == 5 * 5:
+                done.set()
+
+        mux = pipe_mux.PipeMux(on_lines, encoding="utf-8")
+        threads_before = threading.active_count()
+        procs = []
+        for i in range(5):
+            proc = subprocess.Popen([sys.executable, "-c", CHILD, f"bot{i}"],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            mux.add(f"bot{i}", proc.stdout)
+            mux.add(f"bot{i}", proc.stderr)
+            procs.append(proc)
+        self.assertLessEqual(threading.active_count(), threads_before + 1)
+        self.assertTrue(done.wait(10))
+        for proc in procs:
+            proc.wait(5)
+        mux.close()
+
+        for i in range(5):
+            got = lines[f"bot{i}"]
+            self.assertEqual([l for l in got if l != "to stderr\n"],
+                             [f"bot{i} hello\n", "split line\n", "tiếng Việt\n", "no newline at exit\n"])
+            self.assertIn("to stderr\n", got)
+
+    def test_bulk_output_is_batched(self):
+        batches = []
+        mux = pipe_mux.PipeMux(batches.append, encoding="utf-8")
+        child = "import sys; sys.stdout.write(''.join(f'{i}\\n' for i in range(5000)))"
+        proc = subprocess.Popen([sys.executable, "-c", child], stdout=subprocess.PIPE)
+        mux.add("bulk", proc.stdout)
+        proc.wait(5)
+        deadline = time.monotonic() + 5
+        while sum(map(len, batches)) < 5000 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        mux.close()
+        self.assertEqual([line for batch in batches for _, line in batch], [f"{i}\n" for i in range(5000)])
+        self.assertLess(len(batches), 20)  # delivered per read, not per line
+
+if __name__ == '__main__':
+    unittest.main()
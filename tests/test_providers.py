@@ -0,0 +1,138 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path to import providers / bench
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_servers import FakeProviderServer
+import providers
+
+class TestResolution(unittest.TestCase):
+
+    def test_detect_provider(self):
+        cases = {
+            "ollama/llama3": "ollama",
+            "openrouter/meta-llama/llama-3.1-8b-instruct": "openrouter",
+            "groq/llama-3.3-70b-versatile": "groq",
+            "llama-3.3-70b-versatile": "groq",
+            "gpt-4o-mini": "openai",
+            "claude-3-5-haiku-20241022": "anthropic",
+            "grok-2": "xai",
+            "gemini-2.0-flash (Free)": "google",
+        }
+        for model, provider in cases.items():
+            self.assertEqual(providers.detect_provider(model), provider, model)
+
+    def test_resolve(self):
+        config = {"agents": {"defaults": {"model": {"primary": "groq/llama3"}},
+                             "coder": {"model": {"primary": "anthropic/claude-3-5-haiku-20241022"}}}}
+        auth = {"profiles": {"groq:defaults": {"key": "g"}, "anthropic:coder": {"apiKey": "a"}}}
+        self.assertEqual(providers.resolve("coder", config, auth),
+                         providers.Target("claude-3-5-haiku-20241022", "a", "anthropic"))
+        # Unconfigured agents use the defaults agent's model
+        self.assertEqual(providers.resolve("writer", config, auth), providers.Target("llama3", "g", "groq"))
+        self.assertIsNone(providers.resolve("coder", config, {}).api_key)
+
+class TestEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeProviderServer(reply_tokens=2, keep_alive=True).start()
+        self.saved = providers.ENDPOINTS
+        providers.ENDPOINTS = dict(providers.ENDPOINTS, **self.server.endpoints())
+
+    def tearDown(self):
+        providers.ENDPOINTS = self.saved
+        self.server.stop()
+
+    def test_connections_are_reused(self):
+        target = providers.Target("gpt-4o-mini", "k", "openai")
+        for i in range(3):
+            result = providers.complete(target, [{"role": "user", "content": f"hi [bench:{i}]"}], system="s")
+            self.assertTrue(result.text.startswith(f"[bench:{i}]"))
+            self.assertEqual(result.usage["completion"], 2)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.requests[-1]["body"]["messages"][0], {"role": "system", "content": "s"})
+
+    def test_errors_are_normalized(self):
+        target = providers.Target("claude-3-5-haiku-20241022", "k", "anthropic")
+        for status, cls in [(429, providers.RateLimitError), (401, providers.AuthError),
+                            (404, providers.NotFoundError), (500, providers.ProviderError)]:
+            self.server.fail_status = status
+            with self.assertRaises(cls) as ctx:
+                providers.complete(target, [{"role": "user", "content": "hi"}])
+            self.assertEqual((ctx.exception.status, ctx.exception.provider), (status, "anthropic"))
+        with self.assertRaises(providers.MissingKeyError):
+            providers.complete(providers.Target("gpt-4o", None, "openai"), [])
+        with self.assertRaises(providers.UnsupportedProviderError):
+            providers.complete(providers.Target("x", "k", "huggingface"), [])
+
+    def test_stream(self):
+        """Deltas arrive incrementally with usage and timing; multi-turn messages are sent as given."""
+        self.server.tokens_per_sec = 100
+        turns = [{"role": "user", "content": "one [bench:1]"}, {"role": "assistant", "content": "ok"},
+                 {"role": "user", "content": "two [bench:2]"}]
+        for target in [providers.Target("gpt-4o-mini", "k", "openai"),
+                       providers.Target("claude-3-5-haiku-20241022", "k", "anthropic"),
+                       providers.Target("llama3", "dummy", "ollama")]:
+            stream = providers.Stream(target, turns)
+            deltas = list(stream)
+            self.assertEqual(len(deltas), 2, target.provider)
+            self.assertIn("[bench:2]", stream.text)
+            self.assertEqual(stream.usage["completion"], 2)
+            self.assertLess(stream.ttft, stream.latency)
+            self.assertEqual(len(self.server.requests[-1]["body"]["messages"]), 3)
+
+    def test_stream_stopped_early(self):
+        self.server.reply_tokens = 50
+        stream = providers.Stream(providers.Target("gpt-4o-mini", "k", "openai"), [{"role": "user", "content": "x"}])
+        for _ in stream:
+            break
+        self.assertEqual(len(stream.parts), 1)
+        self.assertIsNotNone(stream.latency)
+        # The half-read connection is dropped, not returned to the pool
+        self.assertTrue(providers.complete(stream.target, [{"role": "user", "content": "y"}]).text)
+
+    def test_stream_options_only_where_supported(self):
+        """stream_options goes to providers known to accept it; a 400 for it is retried once without."""
+        saved = set(providers.STREAM_USAGE)
+        try:
+            for target, sent in [(providers.Target("gpt-4o-mini", "k", "openai"), True),
+                                 (providers.Target("mistral-small", "k", "mistral"), False)]:
+                list(providers.Stream(target, [{"role": "user", "content": "hi"}]))
+                self.assertEqual("stream_options" in self.server.requests[-1]["body"], sent, target.provider)
+
+            self.server.reject_fields = {"stream_options"}
+            target = providers.Target("deepseek-chat", "k", "deepseek")
+            before = len(self.server.requests)
+            stream = providers.Stream(target, [{"role": "user", "content": "hi [bench:3]"}])
+            self.assertIn("[bench:3]", "".join(stream))
+            self.assertEqual(len(self.server.requests), before + 2)
+            self.assertNotIn("deepseek", providers.STREAM_USAGE)  # not sent again
+            list(providers.Stream(target, [{"role": "user", "content": "hi"}]))
+            self.assertEqual(len(self.server.requests), before + 3)
+        finally:
+            providers.STREAM_USAGE.clear()
+            providers.STREAM_USAGE.update(saved)
+
+    def test_gemini_stream_abort(self):
+        """abort() from another thread also stops a Gemini SDK stream blocked on its next chunk."""
+        self.server.reply_tokens, self.server.tokens_per_sec = 5, 0.5  # a chunk every 2s
+        saved = providers.GOOGLE_API_ENDPOINT
+        providers.GOOGLE_API_ENDPOINT = self.server.google_endpoint
+        try:
+            stream = providers.Stream(providers.Target("gemini-2.0-flash", "k", "google"),
+                                      [{"role": "user", "content": "hi"}])
+            with self.assertRaisesRegex(providers.ProviderError, "aborted"):
+                for _ in stream:
+                    start = time.monotonic()
+                    threading.Timer(0.3, stream.abort).start()  # while the SDK waits for the next chunk
+            self.assertLess(time.monotonic() - start, 1.0)
+            self.assertEqual(len(stream.parts), 1)
+        finally:
+            providers.GOOGLE_API_ENDPOINT = saved
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import unittest
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path to import scheduler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_servers import FakeProviderServer
+import coalesce
+import metrics
+import providers
+import scheduler
+
+class TestFairScheduler(unittest.TestCase):
+
+    def _drain(self, sched):
+        order = []
+        while True:
+            job = sched._next()
+            if job is None:
+                return order
+            order.append(job.chat_id)
+
+    def _job(self, chat_id, priority=scheduler.PRIORITY_AMBIENT, shed=None, cost=1):
+        async def run():
+            pass
+        async def on_shed():
+            if shed is not None:
+                shed.append(chat_id)
+        return scheduler.Job(chat_id, priority, run, on_shed=on_shed, cost=cost)
+
+    def test_round_robin_across_chats(self):
+        sched = scheduler.FairScheduler(max_per_chat=10)
+        for _ in range(6):
+            sched.submit(self._job("noisy"))
+        sched.submit(self._job("a"))
+        sched.submit(self._job("b"))
+        order = self._drain(sched)
+        # The quiet chats are served within the first round, not after the noisy backlog
+        self.assertLess(order.index("a"), 3)
+        self.assertLess(order.index("b"), 3)
+        self.assertEqual(order.count("noisy"), 6)
+
+    def test_deficit_charges_expensive_jobs(self):
+        sched = scheduler.FairScheduler(max_per_chat=10)
+        for _ in range(2):
+            sched.submit(self._job("long", cost=3))
+        for _ in range(6):
+            sched.submit(self._job("short"))
+        order = self._drain(sched)
+        # A cost-3 job uses three rounds of quantum; the cheap chat gets ~3 jobs per expensive one
+        self.assertEqual(order[:4].count("short"), 3)
+        self.assertEqual(order[4:8].count("short"), 3)
+
+    def test_direct_before_ambient(self):
+        sched = scheduler.FairScheduler(max_per_chat=10)
+        for _ in range(3):
+            sched.submit(self._job("group"))
+        sched.submit(self._job("dm", scheduler.PRIORITY_DIRECT))
+        self.assertEqual(self._drain(sched)[0], "dm")
+
+    def test_shedding_and_metrics(self):
+        async def scenario():
+            metrics.reset()
+            shed = []
+            sched = scheduler.FairScheduler(max_per_chat=2, max_total=3)
+            self.assertTrue(sched.submit(self._job("g1", shed=shed)))
+            self.assertTrue(sched.submit(self._job("g1", shed=shed)))
+            self.assertFalse(sched.submit(self._job("g1", shed=shed)))  # per-chat limit
+            self.assertTrue(sched.submit(self._job("g2", shed=shed)))
+            self.assertFalse(sched.submit(self._job("g3", shed=shed)))  # total limit, ambient
+            # A direct job displaces the newest ambient job of the longest queue
+            self.assertTrue(sched.submit(self._job("dm", scheduler.PRIORITY_DIRECT, shed=shed)))
+            await asyncio.sleep(0)
+            self.assertEqual(shed, ["g1", "g3", "g1"])
+            self.assertEqual(sched.depth(), 3)
+            gauges = sched.gauges()
+            self.assertEqual(gauges["scheduler.shed.ambient"], 3)
+            self.assertEqual(gauges["scheduler.queued.direct"], 1)
+            self.assertEqual(metrics.snapshot()["counters"]["scheduler.shed{priority=ambient}"], 3)
+
+        asyncio.run(scenario())
+
+    def test_workers_run_jobs(self):
+        async def scenario():
+            done = []
+            sched = scheduler.FairScheduler(workers=2, max_per_chat=10)
+            await sched.start()
+            for i in range(5):
+                async def run(i=i):
+                    await asyncio.sleep(0.01)
+                    done.append(i)
+                sched.submit(scheduler.Job(i % 2, scheduler.PRIORITY_AMBIENT, run))
+            for _ in range(100):
+                if len(done) == 5:
+                    break
+                await asyncio.sleep(0.01)
+            await sched.stop()
+            self.assertEqual(sorted(done), list(range(5)))
+            self.assertEqual(sched.served["ambient"], 5)
+
+        asyncio.run(scenario())
+
+class TestBurstCoalescer(unittest.TestCase):
+
+    def test_quick_messages_are_merged(self):
+        async def scenario():
+            dispatched = []
+            co = coalesce.BurstCoalescer(dispatched.append, window=0.05)
+            co.add(1, 7, "first", message_id=1)
+            co.add(1, 7, "second", message_id=2)
+            co.add(1, 8, "someone else", message_id=3)
+            await asyncio.sleep(0.02)
+            co.add(1, 7, "third", message_id=4, direct=True)
+            await asyncio.sleep(0.15)
+            self.assertEqual(len(dispatched), 2)
+            mine = next(b for b in dispatched if b.user_id == 7)
+            self.assertEqual(mine.text, "first\nsecond\nthird")
+            self.assertEqual(mine.message_ids, [1, 2, 4])
+            self.assertTrue(mine.direct)
+            self.assertEqual(co.merged, 2)
+
+        asyncio.run(scenario())
+
+    def test_newer_message_cancels_running_request(self):
+        async def scenario():
+            dispatched, answered, runs = [], [], []
+            co = coalesce.BurstCoalescer(dispatched.append, window=0.01)
+
+            async def work(burst):
+                await asyncio.sleep(0.2)
+                answered.append(burst.text)
+
+            co.add(1, 7, "question")
+            await asyncio.sleep(0.05)
+            runs.append(asyncio.create_task(co.run(dispatched[0], work)))
+            await asyncio.sleep(0.05)
+            co.add(1, 7, "more detail")
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(dispatched), 2)
+            runs.append(asyncio.create_task(co.run(dispatched[1], work)))
+            await asyncio.gather(*runs)
+            self.assertEqual(answered, ["question\nmore detail"])
+            self.assertEqual(co.cancelled, 1)
+            self.assertEqual(co.gauges()["coalesce.pending"], 0)
+
+        asyncio.run(scenario())
+
+    def test_superseded_request_is_cut_upstream(self):
+        """Cancelling a burst's provider call closes the HTTP stream instead of letting it finish (and bill)."""
+        server = FakeProviderServer(reply_tokens=200, tokens_per_sec=20).start()
+        saved = providers.ENDPOINTS
+        providers.ENDPOINTS = dict(providers.ENDPOINTS, **server.endpoints())
+        target = providers.Target("gpt-4o-mini", "k", "openai")
+        try:
+            async def scenario():
+                dispatched, answered = [], []
+                co = coalesce.BurstCoalescer(dispatched.append, window=0.01)
+
+                async def work(burst):
+                    result = await providers.acomplete(target, [{"role": "user", "content": burst.text}])
+                    answered.append(result.text)
+
+                co.add(1, 7, "question")
+                await asyncio.sleep(0.05)
+                first = asyncio.create_task(co.run(dispatched[0], work))
+                await asyncio.sleep(0.3)  # the reply is streaming now
+                co.add(1, 7, "more detail")
+                await first
+                self.assertEqual(answered, [])
+
+            started = time.monotonic()
+            asyncio.run(scenario())  # also waits for the worker thread of the cut request
+            self.assertLess(time.monotonic() - started, 3.0)  # the full reply would take 10s
+            deadline = time.monotonic() + 2
+            while not server.streams_cut and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(server.streams_cut, 1)
+            self.assertEqual(len(server.requests), 1)
+        finally:
+            providers.ENDPOINTS = saved
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main()
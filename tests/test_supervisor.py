@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+import time
+
+# Add parent directory to path to import supervisor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import supervisor
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.started = []
+        self.sup = supervisor.Supervisor(on_start=self.started.append, backoff_base=0.05, backoff_max=0.1)
+
+    def tearDown(self):
+        self.sup.shutdown()
+        for entry in self.sup.entries.values():
+            if entry.proc:
+                entry.proc.wait(5)
+
+    def _poll_until(self, predicate, timeout=10.0):
+        events = []
+        deadline = time.monotonic() + timeout
+        while not predicate(events) and time.monotonic() < deadline:
+            events += self.sup.poll()
+            time.sleep(0.02)
+        return events
+
+    def test_crash_restarts_with_backoff(self):
+        self.sup.start("crashy", [sys.executable, "-c", "import sys; sys.exit(3)"])
+        events = self._poll_until(lambda ev: sum(kind == "restarted" for kind, _, _ in ev) >= 3)
+        delays = [info for kind, _, info in events if kind == "exited"]
+        self.assertEqual(delays[:3], [0.05, 0.1, 0.1])  # doubles up to backoff_max
+        entry = self.sup.entries["crashy"]
+        self.assertGreaterEqual(entry.restarts, 3)
+        self.assertEqual(entry.last_exit, 3)
+        self.assertEqual(len(self.started), entry.restarts + 1)
+
+        self.sup.stop("crashy")
+        self.assertEqual(self._poll_until(lambda ev: False, timeout=0.3), [])
+        self.assertEqual(self.sup.rows()[0]["state"], supervisor.STOPPED)
+
+    @unittest.skipUnless(os.path.exists("/proc/self/stat"), "needs /proc")
+    def test_resource_sampling(self):
+        busy = "import time\nend = time.time() + 30\nwhile time.time() < end: pass"
+        self.sup.start("busy", [sys.executable, "-c", busy])
+        self._poll_until(lambda ev: self.sup.entries["busy"].cpu_percent is not None)
+        time.sleep(0.3)
+        self.sup.poll()
+        row = self.sup.rows()[0]
+        self.assertEqual(row["state"], supervisor.RUNNING)
+        self.assertGreater(row["rss"], 1024 * 1024)
+        self.assertGreater(row["cpu_percent"], 20)
+        self.assertGreater(row["uptime"], 0)
+        self.assertTrue(self.sup.stop("busy"))
+        self.sup.entries["busy"].proc.wait(5)
+        self.assertEqual(self.sup.poll(), [])  # a deliberate stop is not a crash
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path to import task_pool / providers / bench
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_servers import FakeProviderServer
+import providers
+import task_pool
+
+class TestTaskPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = task_pool.TaskPool(workers=1, max_pending=3)
+        self.done = []
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def _on_done(self, task, result, error):
+        self.done.append((task.name, result, error))
+
+    def _drain(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.done) < count and time.monotonic() < deadline:
+            self.pool.poll()
+            time.sleep(0.01)
+
+    def test_bounded_and_cancellable(self):
+        release = threading.Event()
+        started = threading.Event()
+        aborted = threading.Event()
+
+        def blocking(token):
+            token.on_cancel(aborted.set)
+            started.set()
+            release.wait(5)
+            return "late"
+
+        running = self.pool.submit(blocking, name="running", group="chat", on_done=self._on_done)
+        queued = self.pool.submit(lambda token: "never", name="queued", group="chat", on_done=self._on_done)
+        self.pool.submit(lambda token: "ok", name="other", on_done=self._on_done)
+        self.assertIsNone(self.pool.submit(lambda token: None))  # max_pending reached
+        self.assertEqual(self.pool.pending("chat"), 2)
+
+        started.wait(5)
+        self.pool.cancel_group("chat")
+        self.assertTrue(aborted.is_set())  # the running task's abort hook ran right away
+        release.set()
+        self._drain(3)
+        by_name = {name: (result, error) for name, result, error in self.done}
+        self.assertIsInstance(by_name["queued"][1], task_pool.Cancelled)
+        self.assertIsNone(by_name["running"][0])
+        self.assertIsInstance(by_name["running"][1], task_pool.Cancelled)
+        self.assertEqual(by_name["other"], ("ok", None))
+        self.assertEqual(self.pool.pending(), 0)
+        self.assertTrue(running.token.cancelled and queued.token.cancelled)
+        self.assertIsNotNone(running.started)
+        self.assertIsNone(queued.started)  # cancelled before a worker picked it up
+
+    def test_timeout_aborts_stream(self):
+        """A per-task timeout cancels the token, which aborts a blocked provider stream."""
+        server = FakeProviderServer(reply_tokens=500, tokens_per_sec=20).start()
+        saved = providers.ENDPOINTS
+        providers.ENDPOINTS = dict(providers.ENDPOINTS, **server.endpoints())
+        try:
+            def chat(token):
+                stream = providers.Stream(providers.Target("gpt-4o-mini", "k", "openai"),
+                                          [{"role": "user", "content": "hi"}])
+                token.on_cancel(stream.abort)
+                return list(stream)
+
+            start = time.monotonic()
+            self.pool.submit(chat, name="chat", timeout=0.3, on_done=self._on_done)
+            self._drain(1)
+            self.assertLess(time.monotonic() - start, 2.0)
+            self.assertEqual(str(self.done[0][2]), "timeout")
+        finally:
+            providers.ENDPOINTS = saved
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main()
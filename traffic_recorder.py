@@ -0,0 +1,149 @@
+"""Records incoming Telegram updates (anonymized) for later replay.
+
+One JSON object per line:
+    {"t": 1718000000.123, "update_id": 5, "chat_id": -4711, "chat_type": "group",
+     "user_id": 912, "message_id": 88, "text": "xxxx review xxx", "reply_to_bot": false}
+
+Chat/user ids and @mentions of people are replaced by salted hashes, names
+are dropped, and message text is masked character by character except for
+whitespace, the bots' own @usernames and routing keywords, so replays keep
+the length, shape and routing behaviour of real traffic without its content.
+
+The salt is kept next to the recording (<path>.salt, readable by the owner
+only), so ids stay stable when a restarted bridge appends to the same file.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MENTION_RE = re.compile(r"@\w+")
+
+
+class UpdateRecorder:
+    """Appends anonymized updates to a JSONL file."""
+
+    def __init__(self, path, keywords=(), salt=None, keep_text=False, bot_usernames=()):
+        self.path = path
+        self.keywords = sorted({k.lower() for k in keywords}, key=len, reverse=True)
+        self.salt = salt if salt is not None else self._load_salt(path + ".salt")
+        self.keep_text = keep_text
+        # Mentions kept verbatim; the recording bot's own name is added on the first update
+        self.bot_usernames = {u.lower().lstrip("@") for u in bot_usernames}
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    @staticmethod
+    def _load_salt(salt_path):
+        """The salt of an existing recording, or a new one saved with owner-only permissions."""
+        try:
+            with open(salt_path, "r", encoding="ascii") as f:
+                return bytes.fromhex(f.read().strip())
+        except FileNotFoundError:
+            pass
+        salt = os.urandom(16)
+        fd = os.open(salt_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="ascii") as f:
+            f.write(salt.hex())
+        return salt
+
+    def _hash(self, value):
+        digest = hmac.new(self.salt, str(value).encode("utf-8"), hashlib.sha256).hexdigest()
+        return int(digest[:12], 16) % 10**12 + 1
+
+    def _hash_id(self, value):
+        if value is None:
+            return None
+        hashed = self._hash(value)
+        return -hashed if int(value) < 0 else hashed
+
+    def mask_text(self, text):
+        """Masks letters/digits, keeping whitespace, bot @mentions and routing keywords.
+
+        Other @mentions become "@u<hash>", the same for a name everywhere in the recording.
+        """
+        if self.keep_text or not text:
+            return text
+        out = []
+        lower = text.lower()
+        i = 0
+        while i < len(text):
+            m = _MENTION_RE.match(text, i) if text[i] == "@" else None
+            if m:
+                name = m.group(0)[1:].lower()
+                keep = name in self.bot_usernames or name in self.keywords
+                out.append(m.group(0) if keep else f"@u{self._hash(name)}")
+                i = m.end()
+                continue
+            kw = next((k for k in self.keywords if lower.startswith(k, i)), None)
+            if kw:
+                out.append(text[i:i + len(kw)])
+                i += len(kw)
+                continue
+            ch = text[i]
+            out.append(ch if ch.isspace() else ("0" if ch.isdigit() else "x"))
+            i += 1
+        return "".join(out)
+
+    def to_record(self, update):
+        """Builds the anonymized record for a telegram.Update (None if not a text message)."""
+        message = getattr(update, "message", None)
+        if not message or not message.text:
+            return None
+        reply = message.reply_to_message
+        reply_user = getattr(reply, "from_user", None) if reply else None
+        if reply_user and reply_user.is_bot and reply_user.username:
+            self.bot_usernames.add(reply_user.username.lower())
+        return {
+            "t": round(time.time(), 3),
+            "update_id": update.update_id,
+            "chat_id": self._hash_id(message.chat.id),
+            "chat_type": message.chat.type,
+            "user_id": self._hash_id(message.from_user.id) if message.from_user else None,
+            "message_id": message.message_id,
+            "text": self.mask_text(message.text),
+            "reply_to_bot": bool(reply_user and reply_user.is_bot),
+        }
+
+    def record(self, update):
+        try:
+            rec = self.to_record(update)
+            if rec is None:
+                return
+            line = json.dumps(rec, ensure_ascii=False)
+            with self._lock:
+                self._file.write(line + "\n")
+        except Exception as e:
+            logger.error(f"Failed to record update: {e}")
+
+    async def handle_update(self, update, context):
+        """python-telegram-bot callback (registered in a group before the bridge handlers)."""
+        try:
+            username = context.bot.username  # cached by Application.initialize()
+        except RuntimeError:
+            username = None
+        if username:
+            self.bot_usernames.add(username.lower())
+        self.record(update)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_recording(path):
+    """Reads a recording, sorted by timestamp."""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda r: r["t"])
+    return records